@@ -0,0 +1,131 @@
+"""
+ANN benchmark: IVF vs exact search in NumpyVectorIndex
+- Base vectors: embedded chunks of data/corpus_eval (or synthetic clusters)
+- Each index size is sampled from the base vectors plus noise, so the
+  cluster structure of real embeddings is kept at any scale
+- For every size: exact query latency, then recall@k and latency per nprobe
+- Saves a JSON summary next to the evaluation results
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from statistics import mean, median
+
+import numpy as np
+
+# ----- Make project root importable -----
+CUR_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = CUR_DIR.parent.resolve()
+sys.path.append(str(ROOT_DIR))
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+from core.embeddings import VectorStore  # noqa: E402
+from core.vector_index import NumpyVectorIndex  # noqa: E402
+from bench_vector_index import _load_chunks  # noqa: E402
+
+
+class _RowEmbeddings(Embeddings):
+    """Texts are row numbers of a prepared matrix."""
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def embed_documents(self, texts):
+        return self.matrix[[int(t) for t in texts]]
+
+    def embed_query(self, text):
+        return self.matrix[int(text)]
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _base_vectors(corpus_dir: Path, synthetic: bool, dim: int, rng):
+    if synthetic:
+        return _normalize(rng.randn(500, dim))
+    chunks = _load_chunks(corpus_dir, 1)
+    if not chunks:
+        raise RuntimeError(f"No files in {corpus_dir}")
+    return _normalize(np.asarray(VectorStore().embeddings.embed_documents([c[1] for c in chunks])))
+
+
+def _sample(base: np.ndarray, n: int, noise: float, rng) -> np.ndarray:
+    picks = base[rng.randint(0, len(base), n)]
+    return _normalize(picks + noise * rng.randn(n, base.shape[1]) / np.sqrt(base.shape[1]))
+
+
+def _latency(index, queries, k, **kw):
+    lat, tops = [], []
+    for q in queries:
+        t = time.perf_counter()
+        docs = index.similarity_search_by_vector(q, k=k, **kw)
+        lat.append((time.perf_counter() - t) * 1000)
+        tops.append([d.id for d in docs])
+    return round(median(lat), 3), tops
+
+
+def run_bench(corpus_dir: Path, out_json: Path, sizes, nprobes, k: int,
+              n_queries: int, noise: float, synthetic: bool, dim: int):
+    rng = np.random.RandomState(0)
+    base = _base_vectors(corpus_dir, synthetic, dim, rng)
+    queries = _sample(base, n_queries, noise, rng)
+
+    results = []
+    for n in sizes:
+        vectors = _sample(base, n, noise, rng)
+        emb = _RowEmbeddings(vectors)
+        ids = [str(i) for i in range(n)]
+
+        exact = NumpyVectorIndex(emb)
+        exact.add_texts(ids, ids=ids)
+        exact_ms, reference = _latency(exact, queries, k)
+
+        t0 = time.perf_counter()
+        ivf = NumpyVectorIndex(emb, ann="ivf")
+        for start in range(0, n, 10000):   # incremental inserts, as at ingest
+            ivf.add_texts(ids[start:start + 10000], ids=ids[start:start + 10000])
+        build_s = time.perf_counter() - t0
+
+        row = {"rows": n, "exact_p50_ms": exact_ms, "ivf_build_s": round(build_s, 2),
+               "nlist": len(ivf._ivf.centroids) if ivf._ivf.trained else 0, "ivf": []}
+        for nprobe in nprobes:
+            ms, tops = _latency(ivf, queries, k, nprobe=nprobe)
+            recall = mean(len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(tops, reference))
+            row["ivf"].append({"nprobe": nprobe, "p50_ms": ms, f"recall@{k}": round(recall, 4)})
+        results.append(row)
+        print(json.dumps(row))
+
+    summary = {
+        "base": "synthetic" if synthetic else str(corpus_dir),
+        "dim": int(base.shape[1]),
+        "k": k,
+        "queries": n_queries,
+        "noise": noise,
+        "results": results,
+    }
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    out_json.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+# ------ CLI ------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus",   type=str, default=str(ROOT_DIR / "data/corpus_eval"))
+    ap.add_argument("--out",      type=str, default=str(CUR_DIR / "results/bench_ann.json"))
+    ap.add_argument("--sizes",    type=str, default="10000,50000,200000")
+    ap.add_argument("--nprobe",   type=str, default="1,4,8,16,32")
+    ap.add_argument("--k",        type=int, default=3)
+    ap.add_argument("--queries",  type=int, default=200)
+    ap.add_argument("--noise",    type=float, default=0.5, help="spread around base vectors")
+    ap.add_argument("--synthetic", action="store_true", help="no Ollama: random cluster centres")
+    ap.add_argument("--dim",      type=int, default=768, help="dimension of synthetic vectors")
+    args = ap.parse_args()
+
+    run_bench(Path(args.corpus), Path(args.out),
+              [int(s) for s in args.sizes.split(",")], [int(p) for p in args.nprobe.split(",")],
+              args.k, args.queries, args.noise, args.synthetic, args.dim)
@@ -0,0 +1,124 @@
+"""
+Quantization benchmark for NumpyVectorIndex
+- Same chunks and vectors as bench_vector_index.py (data/corpus_eval)
+- Compares the exact float32 scan with float16 storage and int8 codes
+  re-scored over shortlists of 1x, 2x, 4x and 8x k
+- Reports resident vector memory, disk size, query latency, recall of the
+  exact top-k, and P@k / R@k / MRR from run_eval.py on data/eval
+- Saves a JSON summary next to the evaluation results
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from statistics import mean, median
+
+# ----- Make project root importable -----
+CUR_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = CUR_DIR.parent.resolve()
+sys.path.append(str(ROOT_DIR))
+
+from core.embeddings import VectorStore  # noqa: E402
+from core.vector_index import NumpyVectorIndex  # noqa: E402
+from run_eval import precision_at_k, recall_at_k, mrr  # noqa: E402
+from bench_vector_index import _FakeEmbeddings, _Precomputed, _dir_mb, _load_chunks  # noqa: E402
+
+
+def _evaluate(index, query_vectors, items, k, repeat, reference=None):
+    lat, tops, quality = [], [], {"p": [], "r": [], "mrr": []}
+    for i, qv in enumerate(query_vectors):
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            docs = index.similarity_search_by_vector(qv, k=k)
+            best = min(best, time.perf_counter() - t)
+        lat.append(best * 1000)
+        tops.append([d.id for d in docs])
+        if i < len(items):
+            rel = items[i].get("relevant_sources", []) or []
+            srcs = [(d.metadata or {}).get("source") for d in docs]
+            quality["p"].append(precision_at_k(srcs, rel, k))
+            quality["r"].append(recall_at_k(srcs, rel, k))
+            quality["mrr"].append(mrr(srcs, rel))
+    result = {
+        "resident_mb": round(index.memory_bytes() / 1e6, 2),
+        "query_p50_ms": round(median(lat), 3),
+        f"mean_precision@{k}": round(mean(quality["p"]), 4) if quality["p"] else 0.0,
+        f"mean_recall@{k}": round(mean(quality["r"]), 4) if quality["r"] else 0.0,
+        "mean_mrr": round(mean(quality["mrr"]), 4) if quality["mrr"] else 0.0,
+    }
+    if reference is not None:
+        result[f"recall_vs_exact@{k}"] = round(
+            mean(len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(tops, reference)), 4
+        )
+    return result, tops
+
+
+def run_bench(corpus_dir: Path, dataset_path: Path, out_json: Path, k: int,
+              repeat: int, scale: int, fake: bool):
+    chunks = _load_chunks(corpus_dir, scale)
+    if not chunks:
+        raise RuntimeError(f"No files in {corpus_dir}")
+    items = json.loads(dataset_path.read_text(encoding="utf-8")) if dataset_path.exists() else []
+    questions = [it["question"] for it in items] or [c[1][:200] for c in chunks[:50]]
+
+    base = _FakeEmbeddings() if fake else VectorStore().embeddings
+    vectors = base.embed_documents([c[1] for c in chunks])
+    emb = _Precomputed(dict(zip((c[1] for c in chunks), vectors)), base)
+    query_vectors = [base.embed_query(q) for q in questions]
+
+    ids = [c[0] for c in chunks]
+    texts = [c[1] for c in chunks]
+    metas = [c[2] for c in chunks]
+    configs = [("float32", None, 1), ("float16", None, 1)] + [
+        ("float32", "int8", f) for f in (1, 2, 4, 8)
+    ]
+    results, reference = [], None
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (dtype, quantization, factor) in enumerate(configs):
+            path = Path(tmp) / f"index{n}"
+            index = NumpyVectorIndex.from_texts(
+                texts, emb, metadatas=metas, ids=ids, persist_dir=str(path),
+                dtype=dtype, quantization=quantization, rescore_factor=factor
+            )
+            res, tops = _evaluate(index, query_vectors, items, k, repeat, reference)
+            if reference is None:
+                reference = tops
+            res.update(
+                dtype=dtype,
+                quantization=quantization or "none",
+                rescore_factor=factor if quantization else None,
+                disk_mb=_dir_mb(path),
+            )
+            results.append(res)
+
+    summary = {
+        "corpus": str(corpus_dir),
+        "chunks": len(chunks),
+        "dim": len(vectors[0]),
+        "k": k,
+        "fake_embeddings": fake,
+        "results": results,
+    }
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    out_json.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+# ------ CLI ------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus",  type=str, default=str(ROOT_DIR / "data/corpus_eval"))
+    ap.add_argument("--dataset", type=str, default=str(ROOT_DIR / "data/eval/evaluation_set.json"))
+    ap.add_argument("--out",     type=str, default=str(CUR_DIR / "results/bench_quantization.json"))
+    ap.add_argument("--k",       type=int, default=3)
+    ap.add_argument("--repeat",  type=int, default=5)
+    ap.add_argument("--scale",   type=int, default=1, help="repeat the corpus N times")
+    ap.add_argument("--fake-embeddings", action="store_true", help="no Ollama: random vectors")
+    args = ap.parse_args()
+
+    run_bench(Path(args.corpus), Path(args.dataset), Path(args.out), args.k,
+              args.repeat, args.scale, args.fake_embeddings)
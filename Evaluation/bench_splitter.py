@@ -0,0 +1,88 @@
+"""
+Splitter benchmark: TokenTextSplitter vs RecursiveCharacterTextSplitter
+- Splits every text file of data/corpus_eval with both splitters
+- Same budget for both: tokens for ours, tokens * chars-per-token for the baseline
+- Reports split time, chunk counts, token sizes and chunks over budget
+- Saves a JSON summary next to the evaluation results
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from statistics import mean
+
+# ----- Make project root importable -----
+CUR_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = CUR_DIR.parent.resolve()
+sys.path.append(str(ROOT_DIR))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+from core.document import default_chunk_tokens  # noqa: E402
+from core.tokens import TokenTextSplitter, count_tokens  # noqa: E402
+
+
+def _measure(name: str, split, texts, budget: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = [c for t in texts for c in split(t)]
+        best = min(best, time.perf_counter() - t0)
+    sizes = [count_tokens(c) for c in chunks] or [0]
+    n_chars = sum(len(t) for t in texts)
+    return {
+        "splitter": name,
+        "seconds": round(best, 4),
+        "mb_per_s": round(n_chars / 1e6 / best, 2) if best else None,
+        "chunks": len(chunks),
+        "mean_tokens": round(mean(sizes), 1),
+        "max_tokens": max(sizes),
+        "over_budget": sum(1 for s in sizes if s > budget),
+    }
+
+
+def run_bench(corpus_dir: Path, out_json: Path, chunk_tokens: int, repeat: int):
+    texts = [
+        fp.read_text(encoding="utf-8", errors="ignore")
+        for fp in sorted(corpus_dir.glob("*")) if fp.is_file()
+    ]
+    if not texts:
+        raise RuntimeError(f"No files in {corpus_dir}")
+
+    # Calibrate the character baseline on the corpus itself
+    chars_per_token = sum(len(t) for t in texts) / max(1, sum(count_tokens(t) for t in texts))
+    overlap = chunk_tokens // 10
+
+    ours = TokenTextSplitter(chunk_size=chunk_tokens, chunk_overlap=overlap)
+    baseline = RecursiveCharacterTextSplitter(
+        chunk_size=int(chunk_tokens * chars_per_token),
+        chunk_overlap=int(overlap * chars_per_token),
+        add_start_index=True
+    )
+
+    summary = {
+        "corpus": str(corpus_dir),
+        "files": len(texts),
+        "chunk_tokens": chunk_tokens,
+        "chars_per_token": round(chars_per_token, 2),
+        "results": [
+            _measure("TokenTextSplitter", ours.split_text, texts, chunk_tokens, repeat),
+            _measure("RecursiveCharacterTextSplitter", baseline.split_text, texts, chunk_tokens, repeat),
+        ],
+    }
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    out_json.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+# ------ CLI ------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", type=str, default=str(ROOT_DIR / "data/corpus_eval"))
+    ap.add_argument("--out",    type=str, default=str(CUR_DIR / "results/bench_splitter.json"))
+    ap.add_argument("--tokens", type=int, default=default_chunk_tokens(), help="chunk budget in tokens")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    run_bench(Path(args.corpus), Path(args.out), args.tokens, args.repeat)
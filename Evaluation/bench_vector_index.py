@@ -0,0 +1,210 @@
+"""
+Vector backend benchmark: NumpyVectorIndex vs Chroma
+- Splits data/corpus_eval like run_eval.py and embeds every chunk once
+- Builds both backends from the same vectors, persisted in a temp directory
+- Reports build time, reopen time, query latency (p50/p95), RSS growth, disk size
+- Checks retrieval quality (P@k, R@k, MRR on data/eval) and top-k agreement
+- Saves a JSON summary next to the evaluation results
+
+--fake-embeddings replaces Ollama with deterministic random vectors (latency
+and memory stay meaningful, retrieval metrics do not); --scale repeats the
+corpus to simulate larger libraries.
+"""
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import resource
+import tempfile
+from pathlib import Path
+from statistics import mean, median
+
+import numpy as np
+
+# ----- Make project root importable -----
+CUR_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = CUR_DIR.parent.resolve()
+sys.path.append(str(ROOT_DIR))
+
+from langchain_community.vectorstores import Chroma  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+from core.embeddings import VectorStore  # noqa: E402
+from core.vector_index import NumpyVectorIndex  # noqa: E402
+from run_eval import precision_at_k, recall_at_k, mrr  # noqa: E402
+
+try:
+    import psutil
+except ImportError:  # optional: fall back to peak RSS
+    psutil = None
+
+
+class _Precomputed(Embeddings):
+    """Serves vectors computed once, so both backends index the same data."""
+
+    def __init__(self, table: dict, fallback: Embeddings):
+        self.table = table
+        self.fallback = fallback
+
+    def embed_documents(self, texts):
+        return [self.table[t] if t in self.table else self.fallback.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class _FakeEmbeddings(Embeddings):
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        out = []
+        for t in texts:
+            seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:4], "little")
+            v = np.random.RandomState(seed).randn(self.dim).astype(np.float32)
+            # Unit length like nomic-embed-text, so L2 (Chroma) and cosine rank alike
+            out.append((v / np.linalg.norm(v)).tolist())
+        return out
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _rss_mb() -> float:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1e6
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _dir_mb(path: Path) -> float:
+    return round(sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6, 2)
+
+
+def _load_chunks(corpus_dir: Path, scale: int):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=700, chunk_overlap=100)
+    docs = []
+    for fp in sorted(corpus_dir.glob("*")):
+        if fp.is_file():
+            text = fp.read_text(encoding="utf-8", errors="ignore")
+            docs.extend(splitter.create_documents([text], metadatas=[{"source": fp.name}]))
+    chunks = []
+    for copy in range(scale):
+        for i, d in enumerate(docs):
+            # Copies get a marker so their texts (and cached vectors) differ
+            content = d.page_content if copy == 0 else f"{d.page_content} [{copy}]"
+            chunks.append((f"c{copy}-{i}", content, dict(d.metadata)))
+    return chunks
+
+
+def _measure(name, open_index, query_vectors, items, k, repeat):
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    index = open_index()
+    open_s = time.perf_counter() - t0
+
+    lat, results = [], []
+    for qv in query_vectors:
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            docs = index.similarity_search_by_vector(qv, k=k)
+            best = min(best, time.perf_counter() - t)
+        lat.append(best * 1000)
+        results.append(docs)
+    rss1 = _rss_mb()
+
+    quality = {"p": [], "r": [], "mrr": []}
+    for it, docs in zip(items, results):
+        rel = it.get("relevant_sources", []) or []
+        srcs = [(d.metadata or {}).get("source") for d in docs]
+        quality["p"].append(precision_at_k(srcs, rel, k))
+        quality["r"].append(recall_at_k(srcs, rel, k))
+        quality["mrr"].append(mrr(srcs, rel))
+    lat_sorted = sorted(lat)
+    return {
+        "backend": name,
+        "open_s": round(open_s, 4),
+        "query_p50_ms": round(median(lat), 3),
+        "query_p95_ms": round(lat_sorted[int(0.95 * (len(lat_sorted) - 1))], 3),
+        "rss_growth_mb": round(rss1 - rss0, 1),
+        f"mean_precision@{k}": round(mean(quality["p"]), 4) if quality["p"] else 0.0,
+        f"mean_recall@{k}": round(mean(quality["r"]), 4) if quality["r"] else 0.0,
+        "mean_mrr": round(mean(quality["mrr"]), 4) if quality["mrr"] else 0.0,
+    }, [[d.page_content for d in docs] for docs in results]
+
+
+def run_bench(corpus_dir: Path, dataset_path: Path, out_json: Path, k: int,
+              repeat: int, scale: int, fake: bool, dtype: str):
+    chunks = _load_chunks(corpus_dir, scale)
+    if not chunks:
+        raise RuntimeError(f"No files in {corpus_dir}")
+    items = json.loads(dataset_path.read_text(encoding="utf-8")) if dataset_path.exists() else []
+    questions = [it["question"] for it in items] or [c[1][:200] for c in chunks[:50]]
+
+    base = _FakeEmbeddings() if fake else VectorStore().embeddings
+    t0 = time.perf_counter()
+    vectors = base.embed_documents([c[1] for c in chunks])
+    embed_s = time.perf_counter() - t0
+    emb = _Precomputed(dict(zip((c[1] for c in chunks), vectors)), base)
+    query_vectors = [base.embed_query(q) for q in questions]
+
+    ids = [c[0] for c in chunks]
+    texts = [c[1] for c in chunks]
+    metas = [c[2] for c in chunks]
+    with tempfile.TemporaryDirectory() as tmp:
+        np_dir, chroma_dir = Path(tmp) / "numpy", Path(tmp) / "chroma"
+
+        t0 = time.perf_counter()
+        NumpyVectorIndex.from_texts(texts, emb, metadatas=metas, ids=ids, persist_dir=str(np_dir), dtype=dtype)
+        np_build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        Chroma.from_texts(texts, emb, metadatas=metas, ids=ids, collection_name="bench",
+                          persist_directory=str(chroma_dir))
+        chroma_build = time.perf_counter() - t0
+
+        np_res, np_top = _measure(
+            "numpy", lambda: NumpyVectorIndex(emb, persist_dir=str(np_dir)),
+            query_vectors, items, k, repeat
+        )
+        np_res.update(build_s=round(np_build, 3), disk_mb=_dir_mb(np_dir), dtype=dtype)
+        ch_res, ch_top = _measure(
+            "chroma", lambda: Chroma(collection_name="bench", embedding_function=emb,
+                                     persist_directory=str(chroma_dir)),
+            query_vectors, items, k, repeat
+        )
+        ch_res.update(build_s=round(chroma_build, 3), disk_mb=_dir_mb(chroma_dir))
+
+    agreement = mean(len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(np_top, ch_top))
+    summary = {
+        "corpus": str(corpus_dir),
+        "chunks": len(chunks),
+        "dim": len(vectors[0]),
+        "k": k,
+        "fake_embeddings": fake,
+        "embed_s": round(embed_s, 2),
+        "topk_agreement": round(agreement, 4),
+        "results": [np_res, ch_res],
+    }
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    out_json.write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+# ------ CLI ------
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus",  type=str, default=str(ROOT_DIR / "data/corpus_eval"))
+    ap.add_argument("--dataset", type=str, default=str(ROOT_DIR / "data/eval/evaluation_set.json"))
+    ap.add_argument("--out",     type=str, default=str(CUR_DIR / "results/bench_vector_index.json"))
+    ap.add_argument("--k",       type=int, default=3)
+    ap.add_argument("--repeat",  type=int, default=5)
+    ap.add_argument("--scale",   type=int, default=1, help="repeat the corpus N times")
+    ap.add_argument("--dtype",   type=str, default="float32", choices=["float32", "float16"])
+    ap.add_argument("--fake-embeddings", action="store_true", help="no Ollama: random vectors")
+    args = ap.parse_args()
+
+    run_bench(Path(args.corpus), Path(args.dataset), Path(args.out), args.k,
+              args.repeat, args.scale, args.fake_embeddings, args.dtype)
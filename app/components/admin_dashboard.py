@@ -9,6 +9,10 @@ import base64
 import mimetypes
 from pathlib import Path
 from utils.nav import navigate
+from core.cache import get_chunk_cache, get_embedding_cache, get_query_embedding_cache
+from core.answer_cache import get_answer_cache
+from core.embeddings import get_embedding_executor
+from core.clients import get_client_registry
 
 # ----- Helpers ---------------
 def _user_row(u):
@@ -67,6 +71,60 @@ def _user_detail(u):
             st.markdown(f"**💬 R :** {h.answer}")
             st.markdown("-----")
 
+def _show_cache_stats():
+    """Compteurs des caches d'ingestion (process courant + taille disque)."""
+    st.subheader("Caches d'ingestion")
+    for label, cache in (("Découpage", get_chunk_cache()), ("Embeddings", get_embedding_cache())):
+        stats = cache.stats()
+        st.caption(label)
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Hits", stats["hits"])
+        c2.metric("Misses", stats["misses"])
+        c3.metric("Taux de hit", f"{stats['hit_rate'] * 100:.0f} %")
+        c4.metric("Taille", f"{stats['bytes'] / 1e6:.1f} Mo")
+
+    st.caption("Embeddings de requêtes (mémoire, process courant)")
+    stats = get_query_embedding_cache().stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Hits", stats["hits"])
+    c2.metric("Misses", stats["misses"])
+    c3.metric("Taux de hit", f"{stats['hit_rate'] * 100:.0f} %")
+    c4.metric("Entrées", stats["entries"])
+
+    st.caption("Cache sémantique des réponses")
+    stats = get_answer_cache().stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Hits", stats["hits"])
+    c2.metric("Misses", stats["misses"])
+    c3.metric("Taux de hit", f"{stats['hit_rate'] * 100:.0f} %")
+    c4.metric("Réponses", stats["entries"])
+
+    st.caption("Débit d'embedding (process courant)")
+    stats = get_embedding_executor().stats()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Chunks/s", stats["chunks_per_s"])
+    c2.metric("Tokens/s", stats["tokens_per_s"])
+    c3.metric("Relances", stats["retries"])
+    c4.metric("Échecs", stats["failures"])
+
+def _show_model_health():
+    """État du serveur Ollama et des modèles (chargés en mémoire, durée du préchauffage)."""
+    st.subheader("Modèles Ollama")
+    health = get_client_registry().health()
+    server = health["server"]
+    if server["ok"]:
+        st.caption(f"Serveur joignable ({server['latency_ms']} ms)")
+    else:
+        st.error(f"Serveur Ollama injoignable : {server['error']}")
+    if health["models"]:
+        st.dataframe(pd.DataFrame(health["models"]), use_container_width=True)
+    limiter = health["limiter"]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Générations en cours", f"{limiter['active']}/{limiter['slots']}")
+    c2.metric("En file d'attente", limiter["waiting"])
+    c3.metric("Attente moyenne", f"{limiter['mean_wait_ms']:.0f} ms")
+    c4.metric("Attente max", f"{limiter['max_wait_ms']:.0f} ms")
+
 FEEDBACK_ENABLED = False
 def _load_reporting_df(date_from, date_to, event_types=None, user_filter=""):
     init_db()
@@ -200,6 +258,10 @@ def render():
         st.dataframe(df.sort_values("created_at", ascending=False), use_container_width=True)
         st.download_button("Télécharger CSV", df.to_csv(index=False), "reporting.csv")
 
+    st.markdown("---")
+    _show_cache_stats()
+    _show_model_health()
+
     users = crud.list_users(db)
     if "selected_user_id" not in st.session_state:
         st.session_state.selected_user_id = None
@@ -2,6 +2,7 @@ from pathlib import Path
 import streamlit as st
 from core.auth.database import get_db
 from core.auth.models import User
+from core.embeddings import get_user_vector_store
 import base64
 import mimetypes
 
@@ -72,6 +73,8 @@ def show_login() -> bool:
                     "username": user.username,
                     "role": "admin" if getattr(user, "is_admin", False) else "user",
                 }
+                # Reopen the persisted library, nothing is re-embedded
+                st.session_state.vector_db = get_user_vector_store(user.id).load()
                 return True
             else:
                 st.error("Identifiants incorrects")
@@ -1,8 +1,13 @@
 import streamlit as st
 from core.llm import LLMManager
+from core.answer_cache import get_answer_cache
 from core.auth import crud, database, models
 from pathlib import Path
 from core.document import DocumentProcessor
+from core.chunk_store import get_chunk_store
+from core.bm25 import get_bm25_index
+from core.dedup import get_dedup_index
+from core.retrieval import HybridRetriever
 from reporting.log import track_event, log_event
 
 
@@ -24,27 +29,47 @@ def chat_interface():
         llm = LLMManager(model_name=st.session_state.get("selected_model", "llama3.2:latest"))
 
         try:
+            payload = {"source": "chat_interface", "top_k": 3}
             with track_event(
                 event_type="query",
                 user_id=st.session_state.get("user_id"),
                 session_id=st.session_state.get("session_id"),
                 prompt=prompt,
-                payload={"source": "chat_interface", "top_k": 3}
+                payload=payload
             ):
-                # Context : if index present
+                # Context : if index present (dense + BM25, fused)
                 context = []
+                cached = None
                 if 'vector_db' in st.session_state and st.session_state.vector_db:
-                    context = st.session_state.vector_db.similarity_search(prompt, k=3)
+                    uid = st.session_state.get("user_id")
+                    if uid:
+                        # Same query vector as retrieval (in-process LRU)
+                        cached = get_answer_cache().query(
+                            uid, llm.model_name, prompt,
+                            st.session_state.vector_db.embeddings.embed_query(prompt)
+                        )
+                    if cached is None or cached.get() is None:
+                        retriever = HybridRetriever(
+                            st.session_state.vector_db,
+                            get_bm25_index(uid) if uid else None
+                        )
+                        context = retriever.search(prompt, k=3)
+                        payload["retrieval_ms"] = retriever.last_timings
 
-                # Answer : if context : RAG , else : general
-                if context:
-                    response = llm.generate_answer(context, prompt)
+                # Answer : cached if a similar question was answered, if context : RAG , else : general
+                hit = cached is not None and cached.get() is not None
+                payload["answer_cache"] = "hit" if hit else "miss"
+                if context or hit:
+                    stream = llm.stream_answer(context, prompt, cache=cached)
                 else:
-                    response = llm.generate_general(prompt, max_tokens=600)
+                    stream = llm.stream_general(prompt, max_tokens=600)
 
-            # Display + persistence
-            with st.chat_message("assistant"):
-                st.markdown(response)
+                # Display + persistence
+                with st.chat_message("assistant"):
+                    response = st.write_stream(stream)
+                payload.update(stream.timings())
+                if llm.last_context is not None:
+                    payload.update(llm.last_context.stats())
 
             st.session_state.chat_history.append({"role": "assistant", "content": response})
 
@@ -68,36 +93,69 @@ def answer_question(question: str, doc_id: int | None = None) -> str:
     """
     Prépare le contexte documentaire puis interroge le LLM.
     Enregistre la nouvelle Q/R en base.
+
+    Le contexte est recherché dans l'index, filtré sur le document (ou sur
+    l'utilisateur) ; les chunks stockés ne servent que si l'index est vide.
+    La réponse est affichée au fil de la génération.
     """
     db  = database.SessionLocal()
     uid = st.session_state["user_id"]
 
+    payload = {"doc_id": doc_id, "source": "history_view"}
     with track_event(
         event_type="query",
         user_id=uid,
         session_id=st.session_state.get("session_id"),
         prompt=question,
-        payload={"doc_id": doc_id, "source": "history_view"}
+        payload=payload
     ):
 
-        # ----- PDF path -------
-        if doc_id:
-            doc_paths = [db.get(models.Document, doc_id).path]
-        else:
-            docs = crud.list_user_documents(db, uid)
-            doc_paths = [d.path for d in docs]
-
-        # ----- Load and split docs ------
-        processor = DocumentProcessor()
+        # ----- Semantic answer cache, then scoped retrieval (filter applied inside the index) ------
+        llm = LLMManager(model_name=st.session_state.get("selected_model", "llama3.2:latest"))
         context_docs = []
-        for p in doc_paths:
-            raw_docs  = processor.load_document(Path(p))  
-            chunks    = processor.split_documents(raw_docs)  
-            context_docs.extend(chunks)
+        cached = None
+        if st.session_state.get("vector_db"):
+            cached = get_answer_cache().query(
+                uid, llm.model_name, question,
+                st.session_state.vector_db.embeddings.embed_query(question), doc_id=doc_id
+            )
+            if cached.get() is None:
+                retriever = HybridRetriever(st.session_state.vector_db, get_bm25_index(uid))
+                where = {"doc_id": doc_id} if doc_id else {"owner_id": uid}
+                # Passages deduplicated into another document are kept under its doc_id
+                aliased = get_dedup_index(uid).canonical_ids(doc_id) if doc_id else None
+                context_docs = retriever.search(question, k=3, where=where, include_ids=aliased)
+                payload["retrieval_ms"] = retriever.last_timings
+        hit = cached is not None and cached.get() is not None
+        payload["answer_cache"] = "hit" if hit else "miss"
 
-        # ---- Call the LLM ------
-        llm = LLMManager(model_name=st.session_state.get("selected_model", "llama3.2:latest"))
-        answer = llm.generate_answer(context_docs, question)
+        # ----- Fallback: stored chunks (parse only documents uploaded before the store) ------
+        if not context_docs and not hit:
+            if doc_id:
+                docs = [db.get(models.Document, doc_id)]
+            else:
+                docs = crud.list_user_documents(db, uid)
+
+            store = get_chunk_store()
+            processor = None
+            # The ingestion worker writes the chunks of these documents itself
+            indexing = {j.document_id for j in crud.list_user_jobs(db, uid, active_only=True)}
+            for d in docs:
+                if store.has(d.id):
+                    context_docs.extend(store.iter_chunks(d.id))
+                    continue
+                processor = processor or DocumentProcessor()
+                chunks = processor.process_file(Path(d.path))
+                if d.id not in indexing:
+                    store.write(d.id, chunks)
+                context_docs.extend(chunks)
+
+        # ---- Call the LLM (streamed into the page; cached answer on a hit) ------
+        stream = llm.stream_answer(context_docs, question, cache=cached)
+        answer = st.write_stream(stream)
+        payload.update(stream.timings())
+        if llm.last_context is not None:
+            payload.update(llm.last_context.stats())
 
         # ----- Save in Database ------
         crud.save_message(db, uid, question, answer, document_id=doc_id)
@@ -53,8 +53,8 @@ def render():
         st.markdown(" Nouvelle question")
         q = st.text_input("Votre question…", key="hist_q")
         if st.button("Envoyer", key="hist_send") and q:
+            st.markdown("** R :**")
             ans = answer_question(q, doc_id=doc_id)
-            st.markdown(f"** R :** {ans}")
             crud.save_message(db, uid, q, ans, document_id=doc_id)
 
         if st.button("⬅️ Retour au chat"):
@@ -89,11 +89,12 @@ def render():
         if col_yes.button(" Oui, supprimer définitivement"):
             db  = database.SessionLocal()
             uid = st.session_state["user_id"]
-            crud.delete_user_and_data(db, uid)
+            crud.delete_user_and_data(db, uid)  # also purges the index
 
             # Force the logout
             for k in ("user", "user_id", "auth_action"):
                 st.session_state.pop(k, None)
+            st.session_state.vector_db = None
             st.session_state.current_screen = "landing"
             st.success("Compte supprimé.")
         if col_no.button(" Annuler"):
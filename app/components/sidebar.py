@@ -1,6 +1,8 @@
 import streamlit as st
-from core.document import DocumentProcessor
-from core.embeddings import VectorStore
+from core.embeddings import VectorStore, get_user_vector_store
+from core.ingest import IngestionPipeline, IngestItem
+from core.chunk_store import get_chunk_store
+from core.jobs import get_ingestion_worker, wake_ingestion_worker
 from pathlib import Path 
 from core.auth import crud, database, models
 from utils.nav import navigate
@@ -8,7 +10,56 @@ from reporting.log import log_event
 import uuid
 
 
+def _on_job_done(job_id, res):
+    """Reporting hook, called from the ingestion worker thread."""
+    if res.ok:
+        log_event(
+            event_type="ingest",
+            user_id=res.item.owner_id,
+            session_id=None,
+            latency_ms=int(res.parse_seconds * 1000),
+            payload={"job_id": job_id, "doc_id": res.item.doc_id, "chunks": res.chunks,
+                     "duplicates_skipped": res.duplicates, "pdf_tiers": res.pdf_stats},
+        )
+    else:
+        log_event(
+            event_type="error",
+            user_id=res.item.owner_id,
+            session_id=None,
+            status="error",
+            latency_ms=0,
+            payload={"where": "ingestion_job", "job_id": job_id, "doc_id": res.item.doc_id,
+                     "error": (res.error or "")[:300]},
+        )
+
+
+def start_ingestion_worker():
+    """Start the background worker once per process (resumes interrupted jobs)."""
+    get_ingestion_worker(on_done=_on_job_done)
+
+
+def _index_guest_uploads(items):
+    """
+    Guests have no persistent library: their uploads are indexed right away
+    into an in-memory collection of this session (no shared dedup/BM25 files).
+    """
+    store = st.session_state.get("guest_store")
+    if store is None:
+        store = VectorStore(collection_name=f"guest-{st.session_state.session_id}")
+        st.session_state.guest_store = store
+    pipeline = IngestionPipeline(
+        store, chunk_store=get_chunk_store(), deduplicate=False, lexical_index=False
+    )
+    for res in pipeline.run(items):
+        _on_job_done(None, res)
+        if not res.ok:
+            st.warning(f"{res.item.path.name} : échec de l'indexation ({res.error})")
+    if store.vector_db is not None:
+        st.session_state.vector_db = store.vector_db
+
+
 def process_files(uploaded_files):
+    """Store the uploads and queue them for background indexing (guests: indexed now)."""
     if not uploaded_files:
         return
 
@@ -17,9 +68,8 @@ def process_files(uploaded_files):
     user_dir = Path("data") / "docs" / f"user_{uid}"
     user_dir.mkdir(parents=True, exist_ok=True)
 
-    processor     = DocumentProcessor()
-    vector_store  = VectorStore()
-    new_chunks    = []
+    queued = 0
+    guest_items = []
 
     for up in uploaded_files:
         # Check if the file already exists in the DB
@@ -51,19 +101,89 @@ def process_files(uploaded_files):
             }
         )
 
-        # Vectorization
-        raw    = processor.load_document(dest)
-        chunks = processor.split_documents(raw)
-        new_chunks.extend(chunks)
+        if uid is None:
+            guest_items.append(IngestItem(path=dest, doc_id=doc.id, owner_id=None))
+            continue
+
+        # Vectorization happens in the background worker
+        crud.enqueue_ingestion(db, doc.id, uid, str(dest))
+        queued += 1
 
-    # Update the semantic index only once
-    if new_chunks:
-        st.session_state.vector_db = vector_store.create_vector_db(new_chunks)
+    if queued:
+        wake_ingestion_worker()
+    if guest_items:
+        _index_guest_uploads(guest_items)
 
     # Clear the list to avoid reprocessing on rerun
     st.session_state.uploaded_files.clear()
 
 
+def _load_jobs(uid):
+    """Jobs of the user still worth showing (pending, or failed)."""
+    db = database.SessionLocal()
+    try:
+        return [j for j in crud.list_user_jobs(db, uid) if j.status not in ("done", "cancelled")]
+    finally:
+        db.close()
+
+
+def _render_jobs(uid):
+    """
+    Draw indexing progress; returns True while jobs are queued or running.
+    Failures are shown for the jobs this session saw pending, until hidden.
+    """
+    # Pick up vectors indexed by the worker since the last run
+    vector_db = get_user_vector_store(uid).load()
+    if vector_db is not None:
+        st.session_state.vector_db = vector_db
+
+    jobs = _load_jobs(uid)
+    active = [j for j in jobs if j.status in ("queued", "running")]
+    watched = st.session_state.setdefault("watched_jobs", set())
+    watched.update(j.id for j in active)
+    failed = [j for j in jobs if j.status == "failed" and j.id in watched]
+    if not active and not failed:
+        return False
+
+    st.markdown("### Indexation")
+    for j in failed:
+        st.warning(f"{Path(j.path).name} : échec de l'indexation ({(j.error or '')[:200]})")
+    for j in active:
+        name = Path(j.path).name
+        parsed = (j.pages_parsed or 0) / j.pages_total if j.pages_total else 0.0
+        embedded = (j.chunks_embedded or 0) / j.chunks_total if j.chunks_total else 0.0
+        label = f"{name} — {'en attente' if j.status == 'queued' else 'en cours'}"
+        if j.pages_total:
+            label += f" · {j.pages_parsed or 0}/{j.pages_total} pages"
+        if j.chunks_total:
+            label += f" · {j.chunks_embedded or 0}/{j.chunks_total} segments"
+        st.progress(min(1.0, 0.5 * parsed + 0.5 * embedded), text=label)
+    if not active and st.button("Masquer les échecs", key="hide_failed_jobs"):
+        watched.clear()
+        st.rerun()
+    return bool(active)
+
+
+@st.fragment(run_every="2s")
+def _poll_jobs():
+    """Indexing progress, refreshed on its own without blocking the chat."""
+    uid = st.session_state.get("user_id")
+    if uid and not _render_jobs(uid):
+        # Last job finished: a full rerun draws the sidebar without the poller
+        st.rerun()
+
+
+def _show_jobs():
+    """Poll only while something is being indexed."""
+    uid = st.session_state.get("user_id")
+    if not uid:
+        return
+    if any(j.status in ("queued", "running") for j in _load_jobs(uid)):
+        _poll_jobs()
+    else:
+        _render_jobs(uid)
+
+
 def show_sidebar():
     with st.sidebar:
         if "session_id" not in st.session_state:
@@ -96,6 +216,8 @@ def show_sidebar():
             st.session_state.uploaded_files = uploaded_files
             temp_dir = process_files(uploaded_files)
             st.success(f"{len(uploaded_files)} fichier(s) chargé(s)")
+
+        _show_jobs()
         
         st.selectbox(
             "Modèle Ollama",
@@ -152,7 +274,7 @@ def _show_library():
             st.session_state.chat_mode = "regular"
             st.rerun()
         if row[1].button("Supprimer", key=f"del-{d.id}"):
-            crud.delete_document(db, d.id, st.session_state["user_id"])
+            crud.delete_document(db, d.id, st.session_state["user_id"])  # also purges the index
 
 def _show_history_dates():
     if "user_id" not in st.session_state:
@@ -173,4 +295,5 @@ def _logout():
     """Nettoie les infos d’auth et réinitialise la session."""
     for k in ("user", "user_id", "auth_action"):
         st.session_state.pop(k, None)
+    st.session_state.vector_db = None
     navigate("landing")
\ No newline at end of file
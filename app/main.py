@@ -1,5 +1,5 @@
 import streamlit as st
-from components.sidebar import show_sidebar
+from components.sidebar import show_sidebar, start_ingestion_worker
 from components.chat import chat_interface
 from app.components.auth.choice import show_auth_choice
 from app.components.auth.login import show_login
@@ -12,6 +12,7 @@ from app.components.auth.reset_password_confirm import show_reset_password_confi
 from components.pdf_viewer import display_file_viewer, display_file_viewer_by_id
 from utils.nav import navigate
 from reporting.db import init_db
+from core.clients import get_client_registry
 import base64
 import mimetypes
 from pathlib import Path
@@ -147,6 +148,10 @@ def main():
     layout="wide"
     )
     init_db()
+    # Load the models into Ollama once per process, in the background
+    get_client_registry().warm_all()
+    # Index queued uploads in the background; jobs cut by a restart resume now
+    start_ingestion_worker()
     # Read url parameters with the modern api
     params = st.query_params
     screen_param = params.get("screen")     # string or None
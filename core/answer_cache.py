@@ -0,0 +1,238 @@
+"""
+Semantic answer cache.
+Answers are stored with the embedding of their question and looked up by
+cosine similarity, so a rephrased question about the same library is
+answered without calling the LLM. Entries are scoped to a user's library
+version (and optionally one document): uploads and deletions bump the
+version, which retires every cached answer of that library.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from core.cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Minimum cosine similarity between two questions to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+class SemanticAnswerCache:
+    """
+    SQLite table of (owner, library version, doc_id, LLM model, question
+    vector, answer). A lookup scores the vectors of one scope only, so it
+    stays in the millisecond range; the least recently used entries are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DEFAULT_CACHE_DIR / "answers.sqlite3",
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES
+    ):
+        """
+        Args:
+            db_path: SQLite file (shared by every process)
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Entries kept before LRU eviction
+        """
+        self.db_path = Path(db_path)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " id INTEGER PRIMARY KEY, owner_id INTEGER NOT NULL, version INTEGER NOT NULL,"
+                " doc_id INTEGER NOT NULL DEFAULT 0, model TEXT NOT NULL, question TEXT NOT NULL,"
+                " vector BLOB NOT NULL, answer TEXT NOT NULL, last_used REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_answers_scope ON answers(owner_id, version, doc_id, model)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_answers_used ON answers(last_used)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS library_versions ("
+                " owner_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # ---- Library versions ----
+    def version(self, owner_id: int) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT version FROM library_versions WHERE owner_id = ?", (owner_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump_version(self, owner_id: Optional[int]) -> None:
+        """Invalidate the cached answers of a library (upload, deletion)."""
+        if owner_id is None:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO library_versions (owner_id, version) VALUES (?, 1) "
+                "ON CONFLICT(owner_id) DO UPDATE SET version = version + 1",
+                (owner_id,),
+            )
+            conn.execute("DELETE FROM answers WHERE owner_id = ?", (owner_id,))
+
+    # ---- Entries ----
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1.0)
+
+    def lookup(
+        self,
+        owner_id: int,
+        version: int,
+        model: str,
+        vector: List[float],
+        doc_id: Optional[int] = None
+    ) -> Optional[str]:
+        """Answer of the most similar cached question of the scope, if above the threshold."""
+        q = self._normalize(vector)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, vector FROM answers WHERE owner_id = ? AND version = ? AND doc_id = ? AND model = ?",
+                (owner_id, version, doc_id or 0, model),
+            ).fetchall()
+            best_id, best = None, self.threshold
+            if rows:
+                matrix = [np.frombuffer(blob, dtype=np.float32) for _, blob in rows]
+                keep = [i for i, v in enumerate(matrix) if v.shape == q.shape]
+                if keep:
+                    scores = np.stack([matrix[i] for i in keep]) @ q
+                    top = int(np.argmax(scores))
+                    if scores[top] >= best:
+                        best_id, best = rows[keep[top]][0], float(scores[top])
+            answer = None
+            if best_id is not None:
+                conn.execute(
+                    "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE id = ?", (time.time(), best_id)
+                )
+                row = conn.execute("SELECT answer FROM answers WHERE id = ?", (best_id,)).fetchone()
+                answer = row[0] if row else None
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if answer is not None:
+            logger.info(f"Answer cache hit (similarity {best:.3f}, {len(rows)} candidates)")
+        return answer
+
+    def store(
+        self,
+        owner_id: int,
+        version: int,
+        model: str,
+        question: str,
+        vector: List[float],
+        answer: str,
+        doc_id: Optional[int] = None
+    ) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO answers (owner_id, version, doc_id, model, question, vector, answer, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner_id, version, doc_id or 0, model, question,
+                 self._normalize(vector).tobytes(), answer, time.time()),
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM answers")
+
+    def stats(self) -> Dict[str, float]:
+        """Hit counters of this process, lifetime reuse count and entries on disk."""
+        with self._connect() as conn:
+            entries, reused = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM answers"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "reused": reused,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+        }
+
+    def query(
+        self,
+        owner_id: int,
+        model: str,
+        question: str,
+        vector: List[float],
+        doc_id: Optional[int] = None
+    ) -> "CachedQuery":
+        """Handle for one question, bound to the current library version."""
+        return CachedQuery(self, owner_id, self.version(owner_id), model, question, vector, doc_id)
+
+
+@dataclass
+class CachedQuery:
+    """
+    One question's view of the cache. The lookup runs once; put() stores the
+    answer under the library version read when the question was asked, so
+    an answer generated during an upload is never served after it.
+    """
+    cache: SemanticAnswerCache
+    owner_id: int
+    version: int
+    model: str
+    question: str
+    vector: List[float]
+    doc_id: Optional[int] = None
+
+    def __post_init__(self):
+        self._looked_up = False
+        self._answer: Optional[str] = None
+
+    def get(self) -> Optional[str]:
+        if not self._looked_up:
+            self._answer = self.cache.lookup(self.owner_id, self.version, self.model, self.vector, self.doc_id)
+            self._looked_up = True
+        return self._answer
+
+    def put(self, answer: str) -> None:
+        if answer:
+            self.cache.store(
+                self.owner_id, self.version, self.model, self.question, self.vector, answer, self.doc_id
+            )
+
+
+_default_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Process-wide SemanticAnswerCache so hit counters accumulate in one place."""
+    global _default_answer_cache
+    if _default_answer_cache is None:
+        _default_answer_cache = SemanticAnswerCache()
+    return _default_answer_cache
@@ -50,11 +50,22 @@ def create_admin(db: Session, username: str, password: str, email: str = None):
 def list_users(db):
     return db.query(User).all()
 
+def _purge_indexed_data(owner_id, doc_ids=None, doc_id=None) -> None:
+    """Remove vectors, BM25 postings, dedup entries and stored chunks of deleted rows."""
+    # Imported here: core.jobs depends on this module
+    from core.jobs import purge_document, purge_user
+    if doc_id is not None:
+        purge_document(doc_id, owner_id)
+    else:
+        purge_user(owner_id, doc_ids or [])
+
 def delete_user(db, user_id: int):
     db_user = db.get(User, user_id)
     if db_user:
+        doc_ids = [d.id for d in list_user_documents(db, user_id)]
         db.delete(db_user)
         db.commit()
+        _purge_indexed_data(user_id, doc_ids)
 
 def get_user(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
@@ -123,6 +134,85 @@ def delete_document(db, doc_id: int, owner_id: int):
     if doc and doc.owner_id == owner_id:
         db.delete(doc) 
         db.commit()
+        _purge_indexed_data(owner_id, doc_id=doc_id)
+
+# ---- Ingestion jobs ----
+def enqueue_ingestion(db, document_id: int, owner_id: int, path: str) -> models.IngestionJob:
+    job = models.IngestionJob(document_id=document_id, owner_id=owner_id, path=path, status="queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def claim_next_job(db) -> models.IngestionJob | None:
+    """Atomically move the oldest queued job to 'running' and return it."""
+    while True:
+        job = (db.query(models.IngestionJob)
+                 .filter(models.IngestionJob.status == "queued")
+                 .order_by(models.IngestionJob.id)
+                 .first())
+        if job is None:
+            return None
+        claimed = (db.query(models.IngestionJob)
+                     .filter(models.IngestionJob.id == job.id,
+                             models.IngestionJob.status == "queued")
+                     .update({"status": "running",
+                              "attempts": models.IngestionJob.attempts + 1},
+                             synchronize_session=False))
+        db.commit()
+        if claimed:
+            db.refresh(job)
+            return job
+        # Another worker took it first, try the next one
+
+def update_job(db, job_id: int, expect_status: str | None = None, **fields) -> int:
+    """Update a job; with expect_status, only while it still has that status."""
+    q = db.query(models.IngestionJob).filter(models.IngestionJob.id == job_id)
+    if expect_status is not None:
+        q = q.filter(models.IngestionJob.status == expect_status)
+    n = q.update(fields, synchronize_session=False)
+    db.commit()
+    return n
+
+def cancel_jobs(db, document_id: int | None = None, owner_id: int | None = None) -> int:
+    """Mark the queued/running jobs of a document (or of a user) cancelled."""
+    q = (db.query(models.IngestionJob)
+           .filter(models.IngestionJob.status.in_(("queued", "running"))))
+    if document_id is not None:
+        q = q.filter(models.IngestionJob.document_id == document_id)
+    if owner_id is not None:
+        q = q.filter(models.IngestionJob.owner_id == owner_id)
+    n = q.update({"status": "cancelled"}, synchronize_session=False)
+    db.commit()
+    return n
+
+def fail_exhausted_jobs(db, max_attempts: int) -> list[models.IngestionJob]:
+    """Jobs left 'running' after max_attempts claims are marked failed and returned."""
+    q = (db.query(models.IngestionJob)
+           .filter(models.IngestionJob.status == "running",
+                   models.IngestionJob.attempts >= max_attempts))
+    jobs = q.all()
+    for job in jobs:
+        job.status = "failed"
+        job.error = f"Interrupted {job.attempts} times, giving up"
+    db.commit()
+    for job in jobs:
+        db.refresh(job)
+    return jobs
+
+def requeue_interrupted_jobs(db) -> int:
+    """Jobs left 'running' by a previous process go back to the queue."""
+    n = (db.query(models.IngestionJob)
+           .filter(models.IngestionJob.status == "running")
+           .update({"status": "queued"}, synchronize_session=False))
+    db.commit()
+    return n
+
+def list_user_jobs(db, owner_id: int, active_only: bool = False):
+    q = db.query(models.IngestionJob).filter(models.IngestionJob.owner_id == owner_id)
+    if active_only:
+        q = q.filter(models.IngestionJob.status.in_(("queued", "running")))
+    return q.order_by(models.IngestionJob.id.desc()).all()
 
 def update_user(db, user_id: int, username=None, email=None, password=None):
     user = db.get(models.User, user_id)
@@ -137,7 +227,8 @@ def update_user(db, user_id: int, username=None, email=None, password=None):
     db.commit()
 
 def delete_user_and_data(db: Session, user_id: int) -> None:
-    """Delete the user together with their documents and chat history."""
+    """Delete the user together with their documents, chat history and index."""
+    doc_ids = [d.id for d in list_user_documents(db, user_id)]
     
     # documents 
     (db.query(Document)
@@ -155,4 +246,5 @@ def delete_user_and_data(db: Session, user_id: int) -> None:
         db.delete(user)
 
     db.commit()
+    _purge_indexed_data(user_id, doc_ids)
 
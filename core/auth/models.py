@@ -28,6 +28,23 @@ class Document(Base):
     title       = Column(String)
     uploaded = Column(DateTime, default=datetime.utcnow)
 
+class IngestionJob(Base):
+    """Durable ingestion queue: one row per uploaded document to index."""
+    __tablename__ = "ingestion_jobs"
+    id              = Column(Integer, primary_key=True)
+    document_id     = Column(Integer, ForeignKey("documents.id"), index=True, nullable=False)
+    owner_id        = Column(Integer, ForeignKey("users.id"), index=True, nullable=True)
+    path            = Column(String, nullable=False)
+    status          = Column(String(16), index=True, default="queued")  # queued/running/done/failed/cancelled
+    pages_total     = Column(Integer, nullable=True)
+    pages_parsed    = Column(Integer, default=0)
+    chunks_total    = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+    attempts        = Column(Integer, default=0)
+    error           = Column(Text, nullable=True)
+    created         = Column(DateTime, default=datetime.utcnow)
+    updated         = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class User(Base):
     __tablename__ = 'users'
     
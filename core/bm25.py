@@ -0,0 +1,198 @@
+"""
+Per-user BM25 inverted index over chunk tokens.
+Built at ingest next to the vectors and updated incrementally, so exact
+terms (acronyms, product codes, names) can be matched lexically.
+"""
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document as LangchainDocument
+from core.vector_index import equality_values, metadata_matches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BM25_DIR = Path("data") / "bm25"
+
+_TERM = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; codes like "X-200" give "x" and "200"."""
+    return _TERM.findall(text.lower())
+
+
+class BM25Index:
+    """
+    SQLite inverted index: one (term, chunk, tf) posting per distinct term of
+    a chunk, in a WITHOUT ROWID table clustered by term. Chunk texts are kept
+    zlib-compressed so hits can be returned without another lookup.
+    """
+
+    def __init__(
+        self,
+        owner_id: Optional[int],
+        k1: float = 1.2,
+        b: float = 0.75,
+        root: Path = DEFAULT_BM25_DIR
+    ):
+        """
+        Args:
+            owner_id: Library owner; each user gets a separate index file
+            k1: Term frequency saturation
+            b: Length normalization
+            root: Directory holding the per-user index files
+        """
+        self.owner_id = owner_id
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        name = f"user_{owner_id}" if owner_id is not None else "guest"
+        self.db_path = root / f"{name}.sqlite3"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " chunk_id TEXT PRIMARY KEY, doc_id INTEGER, length INTEGER NOT NULL,"
+                " content BLOB NOT NULL, metadata TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_doc ON chunks(doc_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL,"
+                " PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_postings_chunk ON postings(chunk_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add(self, chunks: List[LangchainDocument]) -> None:
+        """Index chunks (by id; re-adding an id replaces it). Chunks without id are skipped."""
+        chunks = [c for c in chunks if c.id]
+        if not chunks:
+            return
+        with self._lock, self._connect() as conn:
+            self._remove(conn, [c.id for c in chunks])
+            for c in chunks:
+                terms = Counter(tokenize(c.page_content))
+                conn.execute(
+                    "INSERT INTO chunks (chunk_id, doc_id, length, content, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (c.id, c.metadata.get("doc_id"), sum(terms.values()),
+                     zlib.compress(c.page_content.encode("utf-8")), json.dumps(c.metadata, default=str)),
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(t, c.id, tf) for t, tf in terms.items()],
+                )
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, chunk_ids: List[str]) -> None:
+        conn.executemany("DELETE FROM postings WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+        conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(i,) for i in chunk_ids])
+
+    def remove_document(self, doc_id: int) -> int:
+        """Drop every chunk of a document; returns how many were indexed."""
+        with self._lock, self._connect() as conn:
+            ids = [r[0] for r in conn.execute("SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,))]
+            self._remove(conn, ids)
+        return len(ids)
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include_ids: Optional[List[str]] = None
+    ) -> List[Tuple[LangchainDocument, float]]:
+        """
+        Top-k chunks by BM25 score, best first.
+        Terms present in more than half of the chunks are ignored (near-zero IDF).
+        A doc_id condition of `where` is applied in SQL, other conditions on
+        the metadata of the scored chunks. Chunks of `include_ids` pass the
+        doc_id condition whatever their document (dedup canonicals).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        include = set(include_ids or ())
+        doc_clause, doc_args = "", ()
+        doc_ids = equality_values(where["doc_id"]) if where and "doc_id" in where else None
+        if doc_ids is not None:
+            doc_clause = f"c.doc_id IN ({','.join('?' * len(doc_ids))})"
+            doc_args = tuple(doc_ids)
+            if include:
+                doc_clause = f"({doc_clause} OR c.chunk_id IN ({','.join('?' * len(include))}))"
+                doc_args += tuple(include)
+            doc_clause = " AND " + doc_clause
+        with self._connect() as conn:
+            n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+            if not n:
+                return []
+            avg_len = total / n
+            scores: Dict[str, float] = {}
+            for term in terms:
+                df = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if df == 0 or df > n / 2:
+                    continue
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for chunk_id, tf, length in conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p "
+                    "JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ?" + doc_clause,
+                    (term,) + doc_args
+                ):
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+            hits = []
+            for chunk_id, score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+                content, metadata = conn.execute(
+                    "SELECT content, metadata FROM chunks WHERE chunk_id = ?", (chunk_id,)
+                ).fetchone()
+                metadata = json.loads(metadata)
+                check = where
+                if where and chunk_id in include and doc_ids is not None:
+                    check = {key: cond for key, cond in where.items() if key != "doc_id"}
+                if check and not metadata_matches(metadata, check):
+                    continue
+                hits.append((LangchainDocument(
+                    page_content=zlib.decompress(content).decode("utf-8"),
+                    metadata=metadata, id=chunk_id
+                ), score))
+                if len(hits) == k:
+                    break
+        return hits
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+_indexes: Dict[Optional[int], BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bm25_index(owner_id: Optional[int]) -> BM25Index:
+    """Process-wide BM25Index per user."""
+    with _indexes_lock:
+        if owner_id not in _indexes:
+            _indexes[owner_id] = BM25Index(owner_id)
+        return _indexes[owner_id]
+
+
+def drop_bm25_index(owner_id: Optional[int]) -> None:
+    """Delete a user's index file (account removal)."""
+    with _indexes_lock:
+        index = _indexes.pop(owner_id, None)
+    name = f"user_{owner_id}" if owner_id is not None else "guest"
+    db_path = index.db_path if index else DEFAULT_BM25_DIR / f"{name}.sqlite3"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
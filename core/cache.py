@@ -0,0 +1,484 @@
+"""
+Persistent on-disk caches for the ingestion path.
+SQLite-backed, size-bounded (LRU eviction) and safe to share between processes.
+Plus in-process LRUs (query vectors, query expansions) for the chat hot path.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from langchain_core.documents import Document as LangchainDocument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path("data") / "cache"
+
+
+def file_digest(file_path: Path, block_size: int = 1 << 20) -> str:
+    """
+    SHA-256 of a file's content, read in blocks.
+
+    Args:
+        file_path: Path to the file to hash
+        block_size: Read size in bytes
+
+    Returns:
+        Hex digest string
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class SQLiteLRUCache:
+    """
+    Key/blob store in SQLite with LRU eviction and hit/miss counters.
+
+    The total payload size is kept up to date by triggers in cache_counters,
+    so a write checks the budget without summing the table, and eviction
+    reads the oldest entries in batches of `evict_batch` rows.
+    """
+
+    evict_batch = 256
+
+    def __init__(self, db_path: Path, table: str, max_bytes: int):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: SQLite file location
+            table: Table name holding the entries
+            max_bytes: Total payload size kept before evicting least recently used entries
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{self.table}_last_access "
+                f"ON {self.table}(last_access)"
+            )
+            # Counters live in the database so pool workers and restarts add up
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_counters ("
+                " name TEXT PRIMARY KEY,"
+                " value INTEGER NOT NULL DEFAULT 0)"
+            )
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            bytes_key = f"{self.table}.bytes"
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_size_insert AFTER INSERT ON {self.table} "
+                "BEGIN UPDATE cache_counters SET value = value + new.size "
+                f"WHERE name = '{bytes_key}'; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_size_delete AFTER DELETE ON {self.table} "
+                "BEGIN UPDATE cache_counters SET value = value - old.size "
+                f"WHERE name = '{bytes_key}'; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_size_update AFTER UPDATE OF size ON {self.table} "
+                "BEGIN UPDATE cache_counters SET value = value + new.size - old.size "
+                f"WHERE name = '{bytes_key}'; END"
+            )
+            # Databases created before the running total: one full sum, once
+            conn.execute(
+                f"INSERT OR IGNORE INTO cache_counters (name, value) "
+                f"SELECT ?, COALESCE(SUM(size), 0) FROM {self.table}",
+                (bytes_key,),
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        One short-lived connection per call (works across threads and
+        processes), committed on success and always closed.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_blob(self, key: str) -> Optional[bytes]:
+        """Return the stored blob for key (refreshing its LRU stamp) or None."""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                self._count(conn, "hits" if row is not None else "misses")
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed ({self.table}): {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def get_blobs(self, keys: List[str]) -> Dict[str, bytes]:
+        """Batch get_blob: one transaction for many keys, missing keys are left out."""
+        found: Dict[str, bytes] = {}
+        try:
+            with self._connect() as conn:
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    marks = ",".join("?" * len(part))
+                    found.update(conn.execute(
+                        f"SELECT key, value FROM {self.table} WHERE key IN ({marks})", part
+                    ).fetchall())
+                    hit = [k for k in part if k in found]
+                    if hit:
+                        conn.execute(
+                            f"UPDATE {self.table} SET last_access = ? "
+                            f"WHERE key IN ({','.join('?' * len(hit))})",
+                            (time.time(), *hit),
+                        )
+                self._count(conn, "hits", len(found))
+                self._count(conn, "misses", len(keys) - len(found))
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed ({self.table}): {e}")
+            found = {}
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_blob(self, key: str, value: bytes) -> None:
+        """Store a blob, then evict old entries if the size budget is exceeded."""
+        if len(value) > self.max_bytes:
+            logger.info(f"Cache entry too large to store ({len(value)} bytes)")
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(self._upsert_sql(), (key, value, len(value), time.time()))
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache write failed ({self.table}): {e}")
+
+    def put_blobs(self, items: Dict[str, bytes]) -> None:
+        """Batch put_blob: one transaction and one eviction pass."""
+        if not items:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    self._upsert_sql(),
+                    [(k, v, len(v), now) for k, v in items.items() if len(v) <= self.max_bytes],
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache write failed ({self.table}): {e}")
+
+    def _upsert_sql(self) -> str:
+        # An upsert (not INSERT OR REPLACE, whose implicit delete skips triggers)
+        return (
+            f"INSERT INTO {self.table} (key, value, size, last_access) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "last_access = excluded.last_access"
+        )
+
+    def _count(self, conn: sqlite3.Connection, name: str, n: int = 1) -> None:
+        conn.execute(
+            "INSERT INTO cache_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (f"{self.table}.{name}", n),
+        )
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute(
+            "SELECT value FROM cache_counters WHERE name = ?", (f"{self.table}.bytes",)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries, a batch at a time, until back under budget
+        removed = 0
+        while total > self.max_bytes:
+            batch = conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY last_access ASC LIMIT ?",
+                (self.evict_batch,),
+            ).fetchall()
+            if not batch:
+                break
+            victims = []
+            for key, size in batch:
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ({','.join('?' * len(victims))})", victims
+            )
+            removed += len(victims)
+        self._count(conn, "evictions", removed)
+        with self._lock:
+            self.evictions += removed
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Lifetime counters (all processes) plus the current on-disk footprint.
+        Counters of this process alone are available as self.hits/self.misses.
+        """
+        with self._connect() as conn:
+            entries = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            size = self._total_bytes(conn)
+            counters = dict(conn.execute(
+                "SELECT name, value FROM cache_counters WHERE name LIKE ?",
+                (f"{self.table}.%",),
+            ).fetchall())
+        hits = counters.get(f"{self.table}.hits", 0)
+        misses = counters.get(f"{self.table}.misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": counters.get(f"{self.table}.evictions", 0),
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class ChunkCache(SQLiteLRUCache):
+    """
+    Parse/split cache for DocumentProcessor.
+
+    Entries are keyed by the file's content hash plus the splitter settings,
+    so re-uploads, renamed copies and the same file from another user all hit.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DEFAULT_CACHE_DIR / "chunks.sqlite3",
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        super().__init__(db_path, table="chunks", max_bytes=max_bytes)
+
+    @staticmethod
+    def make_key(digest: str, settings: str, part: str = "") -> str:
+        """
+        Build a cache key.
+
+        Args:
+            digest: Content hash of the source file
+            settings: Splitter signature (see DocumentProcessor.settings_key)
+            part: Optional sub-part of the file (e.g. a page range)
+        """
+        return f"{digest}|{settings}|{part}"
+
+    def get(self, key: str) -> Optional[List[LangchainDocument]]:
+        blob = self.get_blob(key)
+        if blob is None:
+            return None
+        try:
+            items = json.loads(zlib.decompress(blob).decode("utf-8"))
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"Discarding corrupt chunk cache entry: {e}")
+            self.delete(key)
+            return None
+        return [
+            LangchainDocument(page_content=i["page_content"], metadata=i["metadata"])
+            for i in items
+        ]
+
+    def put(self, key: str, chunks: List[LangchainDocument]) -> None:
+        payload = json.dumps(
+            [{"page_content": c.page_content, "metadata": c.metadata} for c in chunks],
+            default=str,
+        )
+        self.put_blob(key, zlib.compress(payload.encode("utf-8")))
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """
+    Vector cache keyed by (model, sha256(text)).
+
+    Vectors are stored as raw float32 blobs (4 bytes per dimension), so a
+    768-d nomic-embed-text vector costs about 3 KB on disk.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DEFAULT_CACHE_DIR / "embeddings.sqlite3",
+        max_bytes: int = 1024 * 1024 * 1024,
+    ):
+        super().__init__(db_path, table="embeddings", max_bytes=max_bytes)
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return f"{model}|{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _pack(vector: List[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _unpack(blob: bytes) -> List[float]:
+        return array("f", blob).tolist()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached vector for each text, None where missing."""
+        keys = [self.make_key(model, t) for t in texts]
+        found = self.get_blobs(list(dict.fromkeys(keys)))
+        return [self._unpack(found[k]) if k in found else None for k in keys]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        self.put_blobs({
+            self.make_key(model, t): self._pack(v) for t, v in zip(texts, vectors)
+        })
+
+
+class MemoryLRUCache:
+    """
+    In-process LRU keyed by (model, text), with a time-to-live.
+    Entries expire after `ttl_seconds` so a swapped model is picked up.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 900.0):
+        """
+        Args:
+            max_entries: Values kept before the least recently used is evicted
+            ttl_seconds: Lifetime of an entry from its insertion
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, model: str, text: str) -> Optional[Any]:
+        key = (model, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, model: str, text: str, value: Any) -> None:
+        with self._lock:
+            self._entries[(model, text)] = (time.monotonic(), value)
+            self._entries.move_to_end((model, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters of this process (the cache is not shared)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+class QueryEmbeddingCache(MemoryLRUCache):
+    """
+    Query vectors: retries, reruns and expanded variants of a question are
+    embedded once.
+    """
+
+
+_default_chunk_cache: Optional[ChunkCache] = None
+_default_embedding_cache: Optional[EmbeddingCache] = None
+_default_query_cache: Optional[QueryEmbeddingCache] = None
+_default_expansion_cache: Optional[MemoryLRUCache] = None
+
+
+def get_chunk_cache() -> ChunkCache:
+    """Process-wide ChunkCache so hit/miss counters accumulate in one place."""
+    global _default_chunk_cache
+    if _default_chunk_cache is None:
+        _default_chunk_cache = ChunkCache()
+    return _default_chunk_cache
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide EmbeddingCache (the SQLite file itself is shared by all processes)."""
+    global _default_embedding_cache
+    if _default_embedding_cache is None:
+        _default_embedding_cache = EmbeddingCache()
+    return _default_embedding_cache
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Process-wide QueryEmbeddingCache shared by every user's VectorStore."""
+    global _default_query_cache
+    if _default_query_cache is None:
+        _default_query_cache = QueryEmbeddingCache()
+    return _default_query_cache
+
+
+def get_query_expansion_cache() -> MemoryLRUCache:
+    """Process-wide LRU of LLM query expansions, keyed by (LLM model, question)."""
+    global _default_expansion_cache
+    if _default_expansion_cache is None:
+        _default_expansion_cache = MemoryLRUCache(max_entries=1024, ttl_seconds=3600.0)
+    return _default_expansion_cache
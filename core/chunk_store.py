@@ -0,0 +1,143 @@
+"""
+Persistent chunk store keyed by documents.id.
+Chunks are written once at upload time and read back lazily (memory-mapped),
+so a document is never parsed twice.
+"""
+import json
+import logging
+import mmap
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from langchain_core.documents import Document as LangchainDocument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_DIR = Path("data") / "chunks"
+
+
+class ChunkWriter:
+    """Append chunks of one document, possibly out of order, then commit."""
+
+    def __init__(self, data_path: Path, index_path: Path):
+        self.data_path = data_path
+        self.index_path = index_path
+        # Own tmp names: another writer of the same document must not share them
+        self._tmp_suffix = f".{uuid.uuid4().hex}.tmp"
+        self._tmp_data = data_path.with_name(data_path.name + self._tmp_suffix)
+        self._file = open(self._tmp_data, "wb")
+        self._entries = []   # (order, seq, offset, length, metadata)
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def append(self, chunks: List[LangchainDocument], order: int = 0) -> None:
+        """
+        Add chunks. `order` places this group relative to others (e.g. the
+        first page of a PDF window) so the committed document reads in order.
+        """
+        with self._lock:
+            for seq, c in enumerate(chunks):
+                data = c.page_content.encode("utf-8")
+                self._file.write(data)
+                self._entries.append((order, seq, self._offset, len(data), c.metadata))
+                self._offset += len(data)
+
+    def commit(self) -> int:
+        """Flush data and index atomically; returns the number of chunks."""
+        with self._lock:
+            self._file.close()
+            self._entries.sort(key=lambda e: (e[0], e[1]))
+            index = [[off, length, meta] for _, _, off, length, meta in self._entries]
+            tmp_index = self.index_path.with_name(self.index_path.name + self._tmp_suffix)
+            tmp_index.write_text(json.dumps(index, default=str), encoding="utf-8")
+            os.replace(self._tmp_data, self.data_path)
+            os.replace(tmp_index, self.index_path)
+            return len(index)
+
+    def abort(self) -> None:
+        with self._lock:
+            self._file.close()
+            self._tmp_data.unlink(missing_ok=True)
+
+
+class ChunkStore:
+    """
+    Two files per document under `root`:
+    - doc_<id>.bin : UTF-8 chunk texts, concatenated
+    - doc_<id>.idx : JSON list of [offset, length, metadata]
+    """
+
+    def __init__(self, root: Path = DEFAULT_CHUNK_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, doc_id: int) -> Tuple[Path, Path]:
+        return self.root / f"doc_{doc_id}.bin", self.root / f"doc_{doc_id}.idx"
+
+    def has(self, doc_id: int) -> bool:
+        return self._paths(doc_id)[1].exists()
+
+    def writer(self, doc_id: int) -> ChunkWriter:
+        return ChunkWriter(*self._paths(doc_id))
+
+    def write(self, doc_id: int, chunks: List[LangchainDocument]) -> int:
+        w = self.writer(doc_id)
+        try:
+            w.append(chunks)
+        except Exception:
+            w.abort()
+            raise
+        return w.commit()
+
+    def _index(self, doc_id: int) -> Optional[list]:
+        _, index_path = self._paths(doc_id)
+        if not index_path.exists():
+            return None
+        return json.loads(index_path.read_text(encoding="utf-8"))
+
+    def count(self, doc_id: int) -> int:
+        index = self._index(doc_id)
+        return len(index) if index else 0
+
+    def iter_chunks(self, doc_id: int) -> Iterator[LangchainDocument]:
+        """
+        Lazily yield the chunks of a document from a memory-mapped file.
+
+        Raises:
+            KeyError: If the document was never stored
+        """
+        index = self._index(doc_id)
+        if index is None:
+            raise KeyError(f"No stored chunks for document {doc_id}")
+        data_path, _ = self._paths(doc_id)
+        if not index or data_path.stat().st_size == 0:
+            # mmap cannot map empty files; only empty chunks can be stored here
+            for _, _, meta in index:
+                yield LangchainDocument(page_content="", metadata=meta)
+            return
+        with open(data_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset, length, meta in index:
+                yield LangchainDocument(
+                    page_content=mm[offset:offset + length].decode("utf-8"),
+                    metadata=meta
+                )
+
+    def read(self, doc_id: int) -> List[LangchainDocument]:
+        return list(self.iter_chunks(doc_id))
+
+    def delete(self, doc_id: int) -> None:
+        for p in self._paths(doc_id):
+            p.unlink(missing_ok=True)
+
+
+_default_store: Optional[ChunkStore] = None
+
+
+def get_chunk_store() -> ChunkStore:
+    """Process-wide ChunkStore rooted at data/chunks."""
+    global _default_store
+    if _default_store is None:
+        _default_store = ChunkStore()
+    return _default_store
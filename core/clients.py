@@ -0,0 +1,324 @@
+"""
+Process-wide registry of Ollama clients.
+One ChatOllama per model and options, shared by every session, so its HTTP
+connection pool is reused instead of being rebuilt on each message.
+Models can be loaded into Ollama ahead of the first question (keep-alive
+warm-up) and their health / latency is tracked for the admin dashboard.
+Generation requests from every session go through one FIFO limiter.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import ollama
+from langchain_ollama.chat_models import ChatOllama
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# How long Ollama keeps a model in memory after its last request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Loaded at startup: "model" for chat models, "embed:model" for embedding models
+WARM_MODELS = [
+    m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", "llama3.2:latest,embed:nomic-embed-text").split(",")
+    if m.strip()
+]
+# Generation requests sent to Ollama at once (others wait in line)
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+@dataclass
+class Slot:
+    """A held limiter slot; wait_ms is the time spent queued for it."""
+    wait_ms: float = 0.0
+
+
+class FairLimiter:
+    """
+    First-come, first-served concurrency limit shared by threads (Streamlit
+    sessions) and event loops (async pipelines).
+
+    A released slot is handed to the oldest waiter and newcomers queue
+    behind waiters, so under saturation every request waits its turn
+    instead of all of them timing out together.
+    """
+
+    def __init__(self, slots: int = OLLAMA_MAX_CONCURRENCY):
+        """
+        Args:
+            slots: Requests allowed at once
+        """
+        self.slots = max(1, slots)
+        self._active = 0
+        self._waiters: "deque[_Waiter]" = deque()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _enter(self, waiter: _Waiter) -> bool:
+        """Take a free slot, or join the queue; True if the slot is held."""
+        with self._lock:
+            if self._active < self.slots and not self._waiters:
+                self._active += 1
+                return True
+            self._waiters.append(waiter)
+            self.queued += 1
+            return False
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue; True if a slot was granted meanwhile (caller owns it)."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _granted(self, start: float) -> Slot:
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.acquired += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return Slot(wait_ms=round(waited * 1000, 1))
+
+    def acquire(self, timeout: Optional[float] = None) -> Slot:
+        """
+        Block until a slot is free (raises TimeoutError after `timeout` seconds).
+        """
+        start = time.perf_counter()
+        waiter = _Waiter()
+        if not self._enter(waiter) and not waiter.event.wait(timeout):
+            if not self._abandon(waiter):
+                raise TimeoutError(f"No free Ollama slot after {timeout}s")
+        return self._granted(start)
+
+    async def aacquire(self) -> Slot:
+        """Async acquire: waits without blocking the event loop."""
+        start = time.perf_counter()
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._enter(waiter):
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        return self._granted(start)
+
+    def try_acquire(self) -> Optional[Slot]:
+        """A slot if one is free right now and nobody is queued, else None (never waits)."""
+        with self._lock:
+            if self._active >= self.slots or self._waiters:
+                return None
+            self._active += 1
+            self.acquired += 1
+        return Slot()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Hand the slot over: _active is unchanged
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[Slot]:
+        held = self.acquire(timeout)
+        try:
+            yield held
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[Slot]:
+        held = await self.aacquire()
+        try:
+            yield held
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "acquired": self.acquired,
+                "queued": self.queued,
+                "mean_wait_ms": round(self.wait_seconds / self.acquired * 1000, 1) if self.acquired else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 1),
+            }
+
+
+@dataclass
+class ModelStatus:
+    """Last known state of a model on the Ollama server."""
+    model: str
+    kind: str                               # "llm" or "embedding"
+    loaded: Optional[bool] = None           # resident in Ollama memory (from /api/ps)
+    warm_ms: Optional[float] = None         # duration of the last warm-up request
+    last_error: Optional[str] = None
+    checked_at: Optional[float] = None      # time.time() of the last warm-up / health check
+
+
+class ClientRegistry:
+    """Shared chat clients, warm-up and health checks against one Ollama server."""
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, keep_alive: str = OLLAMA_KEEP_ALIVE):
+        """
+        Args:
+            base_url: Ollama server
+            keep_alive: Passed with every request so models stay loaded between questions
+        """
+        self.base_url = base_url
+        self.keep_alive = keep_alive
+        self._client = ollama.Client(host=base_url)
+        self._chat_models: Dict[tuple, ChatOllama] = {}
+        self._status: Dict[str, ModelStatus] = {}
+        self._server: Dict[str, Any] = {"ok": None, "latency_ms": None, "error": None}
+        self._lock = threading.Lock()
+        self._warming: Optional[threading.Thread] = None
+
+    def chat_model(self, model: str, **options: Any) -> ChatOllama:
+        """
+        ChatOllama for a model and options (temperature, num_ctx, ...),
+        created once per process.
+        """
+        key = (model, tuple(sorted(options.items())))
+        with self._lock:
+            client = self._chat_models.get(key)
+            if client is None:
+                client = ChatOllama(model=model, base_url=self.base_url, keep_alive=self.keep_alive, **options)
+                self._chat_models[key] = client
+                self._status.setdefault(model, ModelStatus(model=model, kind="llm"))
+                logger.info(f"Created chat client for {model} ({len(self._chat_models)} cached)")
+            return client
+
+    def embeddings(self, model: str = "nomic-embed-text"):
+        """Shared embedding executor of a model (see core.embeddings)."""
+        from core.embeddings import get_embedding_executor
+        with self._lock:
+            self._status.setdefault(model, ModelStatus(model=model, kind="embedding"))
+        return get_embedding_executor(model)
+
+    # ---- Warm-up ----
+    def warm(self, model: str, kind: str = "llm") -> ModelStatus:
+        """
+        Load a model into Ollama memory with an empty request (no generation)
+        and record how long it took.
+        """
+        with self._lock:
+            status = self._status.setdefault(model, ModelStatus(model=model, kind=kind))
+        t0 = time.perf_counter()
+        try:
+            if kind == "embedding":
+                self._client.embed(model=model, input="", keep_alive=self.keep_alive)
+            else:
+                self._client.generate(model=model, keep_alive=self.keep_alive)
+            status.loaded, status.last_error = True, None
+        except Exception as e:
+            status.loaded, status.last_error = False, str(e)[:300]
+            logger.warning(f"Warm-up of {model} failed: {e}")
+        status.warm_ms = round((time.perf_counter() - t0) * 1000, 1)
+        status.checked_at = time.time()
+        logger.info(f"Warm-up of {model}: {status.warm_ms} ms (loaded={status.loaded})")
+        return status
+
+    def warm_all(self, models: List[str] = WARM_MODELS, background: bool = True) -> None:
+        """
+        Warm every configured model once per process.
+        In the background by default, so startup does not wait for Ollama.
+        """
+        with self._lock:
+            if self._warming is not None:
+                return
+
+            def _run():
+                for spec in models:
+                    if spec.startswith("embed:"):
+                        self.warm(spec[len("embed:"):], "embedding")
+                    else:
+                        self.warm(spec)
+
+            self._warming = threading.Thread(target=_run, name="ollama-warmup", daemon=True)
+        if background:
+            self._warming.start()
+        else:
+            self._warming.run()
+
+    # ---- Health ----
+    def health(self) -> Dict[str, Any]:
+        """
+        Ping the server (/api/ps) and refresh which known models are loaded.
+
+        Returns:
+            {"server": {ok, latency_ms, error}, "models": [ModelStatus as dicts]}
+        """
+        t0 = time.perf_counter()
+        try:
+            running = {m.model for m in self._client.ps().models}
+            self._server = {"ok": True, "latency_ms": round((time.perf_counter() - t0) * 1000, 1), "error": None}
+        except Exception as e:
+            running = None
+            self._server = {"ok": False, "latency_ms": None, "error": str(e)[:300]}
+        now = time.time()
+        with self._lock:
+            for status in self._status.values():
+                if running is not None:
+                    # /api/ps reports "name:tag"; an untagged name means ":latest"
+                    name = status.model if ":" in status.model else f"{status.model}:latest"
+                    status.loaded = name in running
+                status.checked_at = now
+            models = [asdict(s) for s in self._status.values()]
+        return {"server": dict(self._server), "models": models, "limiter": get_ollama_limiter().stats()}
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    """Process-wide ClientRegistry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+
+_limiter: Optional[FairLimiter] = None
+
+
+def get_ollama_limiter() -> FairLimiter:
+    """Process-wide limiter on generation requests to the Ollama server."""
+    global _limiter
+    with _registry_lock:
+        if _limiter is None:
+            _limiter = FairLimiter()
+        return _limiter
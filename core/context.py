@@ -0,0 +1,162 @@
+"""
+Context assembly for RAG prompts.
+Retrieved chunks are de-overlapped and packed, best first, into the tokens
+left by the prompt template, the question and the answer in num_ctx.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from langchain_core.documents import Document as LangchainDocument
+from core.tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Room kept for the generated answer (same reserve as chunk_budget)
+ANSWER_TOKENS = 256
+
+SEPARATOR = "\n\n"
+
+
+@dataclass
+class PackedContext:
+    """Prompt context and what packing removed from the retrieved chunks."""
+    text: str
+    passages: List[LangchainDocument] = field(default_factory=list)
+    budget: int = 0
+    tokens: int = 0
+    retrieved_tokens: int = 0
+    overlap_tokens: int = 0
+    dropped_tokens: int = 0
+
+    @property
+    def trimmed_tokens(self) -> int:
+        return self.overlap_tokens + self.dropped_tokens
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for reporting payloads."""
+        return {
+            "context_tokens": self.tokens,
+            "context_budget": self.budget,
+            "context_passages": len(self.passages),
+            "context_trimmed_tokens": self.trimmed_tokens,
+            "context_overlap_tokens": self.overlap_tokens,
+        }
+
+
+def _uncovered(lo: int, hi: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sub-spans of [lo, hi) outside `covered` (sorted, non-overlapping intervals)."""
+    spans, pos = [], lo
+    for a, b in covered:
+        if b <= pos:
+            continue
+        if a >= hi:
+            break
+        if a > pos:
+            spans.append((pos, a))
+        pos = b
+        if pos >= hi:
+            break
+    if pos < hi:
+        spans.append((pos, hi))
+    return spans
+
+
+def _merge(covered: List[Tuple[int, int]], lo: int, hi: int) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for a, b in sorted(covered + [(lo, hi)]):
+        if merged and a <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+        else:
+            merged.append((a, b))
+    return merged
+
+
+def _split_unit(doc: LangchainDocument) -> tuple:
+    """The text `start_index` is relative to: offsets only compare within it."""
+    meta = doc.metadata
+    return (meta.get("doc_id"), meta.get("source"), meta.get("page"), meta.get("row_start"))
+
+
+def _remove_overlap(docs: List[LangchainDocument]) -> Tuple[List[LangchainDocument], int]:
+    """
+    Drop text already present in a better-ranked chunk.
+
+    Chunks split from the same unit (document, source, PDF page, CSV row
+    group) carry `start_index` character offsets into that unit, so only
+    their spans not covered by better-ranked chunks are kept (the
+    `chunk_overlap` shared by neighbours at either end, or any covered span
+    inside); chunks without offsets are only de-duplicated when their text
+    is identical.
+    """
+    covered: Dict[tuple, List[Tuple[int, int]]] = {}
+    seen = set()
+    out, removed = [], 0
+    for doc in docs:
+        text = doc.page_content
+        start = doc.metadata.get("start_index")
+        if isinstance(start, int):
+            key = _split_unit(doc)
+            end = start + len(text)
+            spans = _uncovered(start, end, covered.get(key, []))
+            covered[key] = _merge(covered.get(key, []), start, end)
+            pieces = (text[a - start:b - start].strip() for a, b in spans)
+            kept = " ".join(p for p in pieces if p)
+        else:
+            kept = "" if text in seen else text
+            seen.add(text)
+        removed += count_tokens(text) - count_tokens(kept)
+        if kept:
+            out.append(LangchainDocument(page_content=kept, metadata=doc.metadata, id=doc.id))
+    return out, removed
+
+
+def pack_context(
+    docs: List[LangchainDocument],
+    budget: int,
+    min_passage_tokens: int = 32
+) -> PackedContext:
+    """
+    Assemble the prompt context from retrieved chunks.
+
+    Args:
+        docs: Chunks in relevance order (best first), as returned by retrieval
+        budget: Tokens available for the context
+        min_passage_tokens: Smallest truncated passage worth including
+
+    Returns:
+        PackedContext; passages keep the relevance order
+    """
+    retrieved = sum(count_tokens(d.page_content) for d in docs)
+    passages, overlap = _remove_overlap(docs)
+
+    packed, used = [], 0
+    for doc in passages:
+        tokens = count_tokens(doc.page_content)
+        remaining = budget - used
+        if tokens <= remaining:
+            packed.append(doc)
+            used += tokens
+        elif remaining >= min_passage_tokens:
+            # Best remaining passage does not fit: keep its beginning
+            text = truncate_to_tokens(doc.page_content, remaining)
+            packed.append(LangchainDocument(page_content=text, metadata=doc.metadata, id=doc.id))
+            used += count_tokens(text)
+            break
+        else:
+            break
+
+    result = PackedContext(
+        text=SEPARATOR.join(d.page_content for d in packed),
+        passages=packed,
+        budget=budget,
+        tokens=used,
+        retrieved_tokens=retrieved,
+        overlap_tokens=overlap,
+        dropped_tokens=retrieved - overlap - used,
+    )
+    if result.trimmed_tokens:
+        logger.info(
+            f"Context packed: {used}/{budget} tokens, {len(packed)}/{len(docs)} chunks, "
+            f"{overlap} overlap + {result.dropped_tokens} over-budget tokens trimmed"
+        )
+    return result
@@ -0,0 +1,270 @@
+"""
+Near-duplicate chunk detection with MinHash signatures and an LSH index.
+One SQLite index per user; duplicates are not embedded again but recorded
+as aliases of the chunk they repeat.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document as LangchainDocument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEDUP_DIR = Path("data") / "dedup"
+
+_WORD = re.compile(r"\w+")
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK32 = (1 << 32) - 1
+
+
+def shingles(text: str, k: int = 5) -> List[int]:
+    """32-bit hashes of the k-word shingles of a normalized text."""
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + k]) for i in range(len(words) - k + 1)]
+    return [
+        int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little")
+        for g in set(grams)
+    ]
+
+
+class MinHasher:
+    """Universal-hash MinHash: h_i(x) = (a_i * x + b_i) mod p, vectorized with NumPy."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        # a, b < 2^32 and x < 2^32 keep a*x + b inside uint64
+        self.a = rng.randint(1, _MASK32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MASK32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        hashes = shingles(text)
+        if not hashes:
+            return None
+        x = np.asarray(hashes, dtype=np.uint64)
+        values = (self.a[:, None] * x[None, :] + self.b[:, None]) % _PRIME
+        return values.min(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    Per-user LSH index over chunk signatures.
+
+    Candidates come from band buckets (bands x rows = num_perm); a candidate
+    is a duplicate when the estimated Jaccard similarity reaches `threshold`.
+    """
+
+    def __init__(
+        self,
+        owner_id: Optional[int],
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 8,
+        root: Path = DEFAULT_DEDUP_DIR
+    ):
+        """
+        Args:
+            owner_id: Library owner; each user gets a separate index file
+            threshold: Estimated Jaccard similarity above which a chunk is a duplicate
+            num_perm: MinHash permutations
+            bands: LSH bands (num_perm must be divisible by bands)
+            root: Directory holding the per-user index files
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.owner_id = owner_id
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.skipped = 0
+        self.checked = 0
+        self._lock = threading.Lock()
+
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        name = f"user_{owner_id}" if owner_id is not None else "guest"
+        self.db_path = root / f"{name}.sqlite3"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " chunk_id TEXT PRIMARY KEY, doc_id INTEGER, sig BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " band INTEGER NOT NULL, bucket TEXT NOT NULL, chunk_id TEXT NOT NULL,"
+                " UNIQUE(band, bucket, chunk_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets ON buckets(band, bucket)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                " chunk_id TEXT PRIMARY KEY, canonical_id TEXT NOT NULL,"
+                " doc_id INTEGER, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_aliases_canonical ON aliases(canonical_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _band_keys(self, sig: np.ndarray) -> List[str]:
+        return [
+            hashlib.blake2b(sig[b * self.rows:(b + 1) * self.rows].tobytes(), digest_size=8).hexdigest()
+            for b in range(self.bands)
+        ]
+
+    def filter(
+        self,
+        chunks: List[LangchainDocument]
+    ) -> Tuple[List[LangchainDocument], List[Tuple[LangchainDocument, str]]]:
+        """
+        Split chunks into (to_embed, duplicates).
+
+        Every kept chunk is added to the index. Duplicates are recorded as
+        aliases of the chunk id they repeat and returned with that id.
+        Chunks without an id are always kept and never indexed.
+        """
+        keep: List[LangchainDocument] = []
+        dups: List[Tuple[LangchainDocument, str]] = []
+        with self._lock, self._connect() as conn:
+            for c in chunks:
+                sig = self.hasher.signature(c.page_content) if c.id else None
+                if sig is None:
+                    keep.append(c)
+                    continue
+                self.checked += 1
+                keys = self._band_keys(sig)
+                canonical = self._match(conn, sig, keys, exclude=c.id)
+                if canonical is None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO signatures (chunk_id, doc_id, sig) VALUES (?, ?, ?)",
+                        (c.id, c.metadata.get("doc_id"), sig.tobytes()),
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO buckets (band, bucket, chunk_id) VALUES (?, ?, ?)",
+                        [(b, k, c.id) for b, k in enumerate(keys)],
+                    )
+                    keep.append(c)
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO aliases (chunk_id, canonical_id, doc_id, content, metadata) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (c.id, canonical, c.metadata.get("doc_id"), c.page_content,
+                     json.dumps(c.metadata, default=str)),
+                )
+                self.skipped += 1
+                dups.append((c, canonical))
+        return keep, dups
+
+    def _match(
+        self,
+        conn: sqlite3.Connection,
+        sig: np.ndarray,
+        keys: List[str],
+        exclude: str
+    ) -> Optional[str]:
+        candidates: Dict[str, None] = {}
+        for b, k in enumerate(keys):
+            for (chunk_id,) in conn.execute(
+                "SELECT chunk_id FROM buckets WHERE band = ? AND bucket = ?", (b, k)
+            ):
+                if chunk_id != exclude:
+                    candidates[chunk_id] = None
+        for chunk_id in candidates:
+            row = conn.execute("SELECT sig FROM signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                continue
+            other = np.frombuffer(row[0], dtype=np.uint64)
+            if float(np.mean(other == sig)) >= self.threshold:
+                return chunk_id
+        return None
+
+    def remove_document(self, doc_id: int) -> List[LangchainDocument]:
+        """
+        Forget a deleted document.
+
+        Its own aliases are dropped. For each of its canonical chunks that other
+        documents were aliased to, the first alias is promoted to canonical and
+        returned, so the caller can embed it in place of the deleted vector.
+        """
+        promoted: List[LangchainDocument] = []
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM aliases WHERE doc_id = ?", (doc_id,))
+            canonical = [r[0] for r in conn.execute(
+                "SELECT chunk_id FROM signatures WHERE doc_id = ?", (doc_id,)
+            ).fetchall()]
+            for chunk_id in canonical:
+                conn.execute("DELETE FROM signatures WHERE chunk_id = ?", (chunk_id,))
+                conn.execute("DELETE FROM buckets WHERE chunk_id = ?", (chunk_id,))
+                row = conn.execute(
+                    "SELECT chunk_id, doc_id, content, metadata FROM aliases "
+                    "WHERE canonical_id = ? ORDER BY chunk_id LIMIT 1", (chunk_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                heir, heir_doc, content, metadata = row
+                sig = self.hasher.signature(content)
+                conn.execute(
+                    "INSERT OR REPLACE INTO signatures (chunk_id, doc_id, sig) VALUES (?, ?, ?)",
+                    (heir, heir_doc, sig.tobytes()),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO buckets (band, bucket, chunk_id) VALUES (?, ?, ?)",
+                    [(b, k, heir) for b, k in enumerate(self._band_keys(sig))],
+                )
+                conn.execute("DELETE FROM aliases WHERE chunk_id = ?", (heir,))
+                conn.execute(
+                    "UPDATE aliases SET canonical_id = ? WHERE canonical_id = ?", (heir, chunk_id)
+                )
+                promoted.append(LangchainDocument(
+                    page_content=content, metadata=json.loads(metadata), id=heir
+                ))
+        return promoted
+
+    def canonical_ids(self, doc_id: int) -> List[str]:
+        """
+        Chunks a document's near-duplicates were aliased to. They hold that
+        text under another document's doc_id, so a search scoped to this
+        document has to include them.
+        """
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute(
+                "SELECT DISTINCT canonical_id FROM aliases WHERE doc_id = ?", (doc_id,)
+            )]
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            indexed = conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            aliases = conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+        return {"checked": self.checked, "skipped": self.skipped, "indexed": indexed, "aliases": aliases}
+
+
+_indexes: Dict[Optional[int], NearDuplicateIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_dedup_index(owner_id: Optional[int]) -> NearDuplicateIndex:
+    """Process-wide NearDuplicateIndex per user."""
+    with _indexes_lock:
+        if owner_id not in _indexes:
+            _indexes[owner_id] = NearDuplicateIndex(owner_id)
+        return _indexes[owner_id]
+
+
+def drop_dedup_index(owner_id: Optional[int]) -> None:
+    """Delete a user's index file (account removal)."""
+    with _indexes_lock:
+        index = _indexes.pop(owner_id, None)
+    name = f"user_{owner_id}" if owner_id is not None else "guest"
+    db_path = index.db_path if index else DEFAULT_DEDUP_DIR / f"{name}.sqlite3"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
@@ -2,38 +2,331 @@
 Document processing module with multi-format support.
 Handles PDF, TXT, DOCX, and CSV files with LangChain integration.
 """
+import csv
+import io
 import logging
+import tempfile
+import time
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from docx import Document
 import pandas as pd
-from langchain_community.document_loaders import (
-    UnstructuredPDFLoader,
-    UnstructuredFileLoader 
-)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import pdfplumber
+from langchain_community.document_loaders import UnstructuredFileLoader
 from langchain_core.documents import Document as LangchainDocument
+from core.cache import ChunkCache, file_digest, get_chunk_cache
+from core.llm import NUM_CTX, rag_prompt_overhead
+from core.tokens import TokenTextSplitter, chunk_budget, count_tokens
 
 # Initialize logger for error tracking
 logger = logging.getLogger(__name__)
 
+# Chunks retrieved per question in the chat
+DEFAULT_TOP_K = 3
+
+
+def default_chunk_tokens(num_ctx: int = NUM_CTX, k: int = DEFAULT_TOP_K) -> int:
+    """Chunk size (tokens) that lets k chunks + prompt + answer fit in num_ctx."""
+    return chunk_budget(num_ctx, k, rag_prompt_overhead())
+
+
+class TieredPDFExtractor:
+    """
+    Two-tier PDF text extraction.
+    
+    Tier 1 reads the text layer with pdfplumber (fast, born-digital PDFs).
+    Pages that look scanned, multi-column or table-dense are sent to
+    tier 2 (unstructured partition_pdf) in one call per batch of pages.
+    """
+
+    def __init__(
+        self,
+        min_chars: int = 40,
+        table_area_ratio: float = 0.25,
+        min_column_words: int = 80,
+        layout_strategy: str = "hi_res",
+        batch_pages: int = 16
+    ):
+        """
+        Args:
+            min_chars: Below this many text-layer characters a page is treated as scanned
+            table_area_ratio: Share of the page covered by tables that triggers tier 2
+            min_column_words: Minimum words before looking for a column gutter
+            layout_strategy: unstructured partition strategy for tier 2
+            batch_pages: Pages extracted (and buffered) before yielding
+        """
+        self.min_chars = min_chars
+        self.table_area_ratio = table_area_ratio
+        self.min_column_words = min_column_words
+        self.layout_strategy = layout_strategy
+        self.batch_pages = batch_pages
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.stats = {
+            "fast_pages": 0,
+            "layout_pages": 0,
+            "fast_seconds": 0.0,
+            "layout_seconds": 0.0,
+            "scanned": 0,
+            "tables": 0,
+            "columns": 0,
+        }
+
+    def take_stats(self) -> Dict[str, float]:
+        """Return the per-tier counters/timings and start a new measurement."""
+        stats = dict(self.stats)
+        self.reset_stats()
+        return stats
+
+    def iter_pages(
+        self,
+        file_path: Path,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> Iterator[LangchainDocument]:
+        """
+        Yield page-level Documents for pages [start, end).
+        At most `batch_pages` pages are held in memory at a time.
+        """
+        with pdfplumber.open(file_path) as pdf:
+            stop = len(pdf.pages) if end is None else min(end, len(pdf.pages))
+            for batch_start in range(start, stop, self.batch_pages):
+                batch_stop = min(batch_start + self.batch_pages, stop)
+                texts: Dict[int, str] = {}
+                hard: List[int] = []
+
+                t0 = time.perf_counter()
+                for i in range(batch_start, batch_stop):
+                    page = pdf.pages[i]
+                    texts[i] = page.extract_text() or ""
+                    reason = self._needs_layout(page, texts[i])
+                    if reason:
+                        self.stats[reason] += 1
+                        hard.append(i)
+                    # Drop the parsed layout objects before moving on
+                    page.close()
+                self.stats["fast_seconds"] += time.perf_counter() - t0
+                self.stats["fast_pages"] += (batch_stop - batch_start) - len(hard)
+
+                if hard:
+                    t0 = time.perf_counter()
+                    texts.update(self._layout_pages(Path(file_path), hard))
+                    self.stats["layout_seconds"] += time.perf_counter() - t0
+                    self.stats["layout_pages"] += len(hard)
+
+                for i in range(batch_start, batch_stop):
+                    yield LangchainDocument(
+                        page_content=texts.pop(i),
+                        metadata={"source": str(file_path), "page": i + 1}
+                    )
+
+    def _needs_layout(self, page, text: str) -> Optional[str]:
+        """Return why a page needs tier 2 ('scanned', 'tables', 'columns') or None."""
+        if len(text.strip()) < self.min_chars:
+            # Blank pages stay on the fast path; pages with images are likely scans
+            return "scanned" if page.images else None
+
+        # No ruling lines means the default table finder cannot match anything
+        if len(page.edges) >= 4:
+            page_area = float(page.width * page.height) or 1.0
+            table_area = 0.0
+            for table in page.find_tables():
+                x0, top, x1, bottom = table.bbox
+                table_area += (x1 - x0) * (bottom - top)
+            if table_area / page_area >= self.table_area_ratio:
+                return "tables"
+
+        if self._has_column_gutter(page):
+            return "columns"
+        return None
+
+    def _has_column_gutter(self, page, bins: int = 100) -> bool:
+        """
+        Detect a vertical gutter in the middle of the page: a band with no
+        words while both sides carry a good share of the text.
+        """
+        words = page.extract_words()
+        if len(words) < self.min_column_words:
+            return False
+        width = float(page.width) or 1.0
+        coverage = [0] * bins
+        for w in words:
+            first = max(0, int(w["x0"] / width * bins))
+            last = min(bins - 1, int(w["x1"] / width * bins))
+            for b in range(first, last + 1):
+                coverage[b] += 1
+
+        # Look for an empty run of at least 2 bins between 30% and 70% of the width
+        lo, hi = int(bins * 0.3), int(bins * 0.7)
+        b = lo
+        while b < hi:
+            if coverage[b] == 0:
+                run_start = b
+                while b < hi and coverage[b] == 0:
+                    b += 1
+                if b - run_start >= 2:
+                    left = sum(1 for w in words if w["x1"] / width * bins <= run_start)
+                    right = sum(1 for w in words if w["x0"] / width * bins >= b)
+                    if min(left, right) >= 0.25 * len(words):
+                        return True
+            b += 1
+        return False
+
+    def _layout_pages(self, file_path: Path, pages: List[int]) -> Dict[int, str]:
+        """
+        Run unstructured on the given 0-based pages only.
+        Falls back to the text layer (by returning nothing) if partitioning fails.
+        """
+        try:
+            from unstructured.partition.pdf import partition_pdf
+            # Without page subsets every batch would partition the whole PDF again
+            import pypdf  # noqa: F401
+        except ImportError as e:
+            logger.warning(f"unstructured/pypdf unavailable, keeping text layer: {e}")
+            return {}
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                subset = self._write_subset(file_path, pages, Path(tmp))
+                elements = partition_pdf(
+                    filename=str(subset),
+                    strategy=self.layout_strategy,
+                    infer_table_structure=True
+                )
+        except Exception as e:
+            logger.warning(f"Layout extraction failed for {file_path.name}, keeping text layer: {e}")
+            return {}
+
+        texts: Dict[int, List[str]] = {}
+        wanted = set(pages)
+        for el in elements:
+            number = getattr(el.metadata, "page_number", None)
+            if number is None:
+                continue
+            # Map back from the subset document to the original page index
+            idx = pages[number - 1]
+            if idx in wanted and str(el).strip():
+                texts.setdefault(idx, []).append(str(el))
+        return {i: "\n\n".join(parts) for i, parts in texts.items()}
+
+    @staticmethod
+    def _write_subset(file_path: Path, pages: List[int], tmp_dir: Path) -> Path:
+        """Copy the selected pages into a temporary PDF."""
+        from pypdf import PdfReader, PdfWriter
+        reader = PdfReader(str(file_path))
+        writer = PdfWriter()
+        for i in pages:
+            writer.add_page(reader.pages[i])
+        subset = tmp_dir / "pages.pdf"
+        with open(subset, "wb") as f:
+            writer.write(f)
+        return subset
+
+
 class DocumentProcessor:
     """Core processor for document loading and text splitting"""
     
-    def __init__(self, chunk_size: int = 7500, chunk_overlap: int = 100):
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        cache: Optional[ChunkCache] = None,
+        use_cache: bool = True
+    ):
         """
         Initialize text splitter with configuration
         
         Args:
-            chunk_size: Character length for text chunks
-            chunk_overlap: Overlap between chunks for context preservation
-        """
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
+            chunk_size: Tokens per chunk (default: derived from the context budget)
+            chunk_overlap: Overlap in tokens (default: 10% of chunk_size)
+            cache: Parse/split cache (defaults to the shared on-disk cache)
+            use_cache: Set False to always re-parse
+        """
+        self.chunk_size = chunk_size or default_chunk_tokens()
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else self.chunk_size // 10
+        self.splitter = TokenTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
         )
+        self.cache = (cache or get_chunk_cache()) if use_cache else None
+        self.pdf_extractor = TieredPDFExtractor()
+
+    # Pages per window when a PDF is streamed through the pipeline
+    pdf_window_pages = 16
+
+    @classmethod
+    def for_context(cls, num_ctx: int, k: int, **kwargs) -> "DocumentProcessor":
+        """Processor whose chunks fit k-at-a-time in a num_ctx-token window."""
+        return cls(chunk_size=default_chunk_tokens(num_ctx, k), **kwargs)
+
+    def settings_key(self) -> str:
+        """Signature of the splitter settings, part of every cache key."""
+        return f"tokens2:{self.chunk_size}:{self.chunk_overlap}:pdf=tiered:csv=rows"
+
+    def process_file(
+        self,
+        file_path: Path,
+        pages: Optional[Tuple[int, int]] = None,
+        digest: Optional[str] = None
+    ) -> List:
+        """
+        Load and split a file, reusing cached chunks when the same content
+        was already processed with the same splitter settings.
+        
+        Args:
+            file_path: Path to target file
+            pages: Optional 0-based [start, end) page window (PDF only)
+            digest: Precomputed content hash, avoids re-hashing per window
+            
+        Returns:
+            List of document chunks
+        """
+        file_path = Path(file_path)
+        if self.cache is None:
+            return self._split_file(file_path, pages)
+
+        part = f"pages:{pages[0]}-{pages[1]}" if pages else ""
+        key = self.cache.make_key(digest or file_digest(file_path), self.settings_key(), part)
+        chunks = self.cache.get(key)
+        if chunks is not None:
+            logger.info(f"Chunk cache hit: {file_path.name} ({len(chunks)} chunks)")
+            # Cached entry may come from a renamed copy or another user's upload
+            for c in chunks:
+                if "source" in c.metadata:
+                    c.metadata["source"] = str(file_path)
+            return chunks
+
+        chunks = self._split_file(file_path, pages)
+        self.cache.put(key, chunks)
+        return chunks
+
+    def _split_file(self, file_path: Path, pages: Optional[Tuple[int, int]]) -> List:
+        return list(self.iter_chunks(file_path, pages))
+
+    def iter_chunks(
+        self,
+        file_path: Path,
+        pages: Optional[Tuple[int, int]] = None
+    ) -> Iterator[LangchainDocument]:
+        """
+        Stream the chunks of a file without materializing the whole document.
+        PDFs go page by page, CSVs row group by row group; other formats are
+        small enough to load at once.
+        
+        Args:
+            file_path: Path to target file
+            pages: Optional 0-based [start, end) page window (PDF only)
+        """
+        file_path = Path(file_path)
+        suffix = file_path.suffix.lower()
+        if suffix == ".pdf":
+            start, end = pages or (0, None)
+            yield from self.iter_split(self.iter_pdf_pages(file_path, start, end))
+        elif suffix == ".csv":
+            yield from self.iter_split(self.iter_csv(file_path))
+        else:
+            yield from self.split_documents(self.load_document(file_path))
     
     def load_document(self, file_path: Path) -> List:
         """
@@ -72,15 +365,39 @@ class DocumentProcessor:
     #Loaders
     def _load_pdf(self, file_path: Path) -> List:
         """
-        PDF loader using UnstructuredPDFLoader
+        PDF loader returning one Document per page.
         
         Advantages:
-        - Preserves complex layouts
-        - Handles embedded tables/images
-        - Better than PyPDF2 for structured PDFs
+        - Text layer via pdfplumber for born-digital pages (fast)
+        - Scanned, multi-column and table pages go through unstructured
+        - Built on iter_pdf_pages, see there for the streaming variant
         """
-        loader = UnstructuredPDFLoader(str(file_path))
-        return loader.load()
+        return list(self.iter_pdf_pages(file_path))
+
+    @staticmethod
+    def count_pdf_pages(file_path: Path) -> int:
+        """Number of pages, read from the page tree without extracting text."""
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+    def iter_pdf_pages(
+        self,
+        file_path: Path,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> Iterator[LangchainDocument]:
+        """
+        Stream a PDF as page-level Documents (tiered extraction).
+        
+        Args:
+            file_path: Path to the PDF
+            start: First page (0-based, inclusive)
+            end: Last page (0-based, exclusive), None for the end of file
+            
+        Yields:
+            One Document per page with `source` and 1-based `page` metadata
+        """
+        yield from self.pdf_extractor.iter_pages(file_path, start, end)
     
     def _load_txt(self, file_path: Path) -> List:
         """
@@ -104,28 +421,84 @@ class DocumentProcessor:
         """
         doc = Document(file_path)
         text = "\n".join([para.text for para in doc.paragraphs])
-        return [LangchainDocument(page_content=text)]
+        return [LangchainDocument(page_content=text, metadata={"source": str(file_path)})]
     
     def _load_csv(self, file_path: Path) -> List:
         """
         CSV loader using pandas.
         
-        Options:
-        - Use CSVLoader for simple cases
-        - pandas provides better table handling
+        Note:
+        - Built on iter_csv: one Document per row group, header repeated
+        """
+        return list(self.iter_csv(file_path))
+
+    def iter_csv(self, file_path: Path, read_rows: int = 10000) -> Iterator[LangchainDocument]:
+        """
+        Stream a CSV as row groups that each fit in one chunk.
+        
+        Features:
+        - Reads with pandas `chunksize`, memory stays flat for large files
+        - Column names repeated at the top of every group
+        - Compact CSV lines instead of padded `to_string` output
+        
+        Args:
+            file_path: Path to the CSV
+            read_rows: Rows parsed per pandas chunk
+            
+        Yields:
+            Documents with `row_start` / `row_end` metadata (1-based data rows)
         """
-        df = pd.read_csv(file_path)
-        text = df.to_string(index=False)
-        return [LangchainDocument(page_content=text)]
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        header = None
+        budget = 0
+        lines: List[str] = []
+        size = 0
+        first_row = row = 0
+
+        def _group() -> LangchainDocument:
+            return LangchainDocument(
+                page_content=header + "".join(lines),
+                metadata={"source": str(file_path), "row_start": first_row, "row_end": row}
+            )
+
+        reader = pd.read_csv(
+            file_path,
+            chunksize=read_rows,
+            dtype=str,
+            keep_default_na=False
+        )
+        for frame in reader:
+            if header is None:
+                writer.writerow(frame.columns)
+                header = buf.getvalue()
+                # Groups must fit in a chunk once the header is prepended
+                budget = max(self.chunk_size - count_tokens(header), 1)
+            for values in frame.itertuples(index=False, name=None):
+                buf.seek(0)
+                buf.truncate()
+                writer.writerow(values)
+                line = buf.getvalue()
+                line_tokens = count_tokens(line)
+                if lines and size + line_tokens > budget:
+                    yield _group()
+                    lines, size = [], 0
+                if not lines:
+                    first_row = row + 1
+                lines.append(line)
+                size += line_tokens
+                row += 1
+        if lines:
+            yield _group()
     
     def split_documents(self, documents: List) -> List:
         """
-        Split documents using recursive text splitting.
+        Split documents using token-budgeted splitting.
         
         Process:
-        1. Splits on paragraphs
-        2. Then sentences
-        3. Finally by chunk size
+        1. Fills each chunk up to chunk_size tokens
+        2. Backs off to a paragraph, then sentence, then word break
+        3. Records `start_index` offsets in metadata
         
         Returns:
             List of processed document chunks
@@ -136,4 +509,16 @@ class DocumentProcessor:
         except Exception as e:
             logger.error(f"Text splitting failed: {e}")
             raise
+
+    def iter_split(self, documents: Iterable) -> Iterator[LangchainDocument]:
+        """
+        Lazily split a stream of documents (e.g. PDF pages, CSV row groups).
+        
+        Yields:
+            Chunks in input order; metadata of each page is kept
+        """
+        for doc in documents:
+            if not doc.page_content.strip():
+                continue
+            yield from self.splitter.split_documents([doc])
         
\ No newline at end of file
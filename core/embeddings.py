@@ -1,29 +1,219 @@
 """Vector embeddings and database functionality for local Ollama setup."""
 import logging
-from typing import List
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import chromadb
 from langchain_ollama import OllamaEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+from core.clients import OLLAMA_BASE_URL, get_client_registry
+from core.cache import EmbeddingCache, QueryEmbeddingCache, get_embedding_cache, get_query_embedding_cache
+from core.tokens import count_tokens
+from core.vector_index import NumpyVectorIndex
 
 logger = logging.getLogger(__name__)
 
+# "chroma" (default) or "numpy" (in-process memory-mapped exact index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# numpy backend only: "int8" keeps int8 codes in memory and re-scores from disk
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION") or None
+# numpy backend only: "ivf" for approximate search, scanning VECTOR_NPROBE cells
+VECTOR_ANN = os.getenv("VECTOR_ANN") or None
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "8"))
+
+
+class EmbeddingExecutor(Embeddings):
+    """
+    Embeddings wrapper that controls how requests reach the embedding server.
+
+    Texts are cut into fixed-size batches sent by a bounded thread pool;
+    a failed batch is retried with exponential backoff. The pool is the only
+    path to the server, so concurrent callers share the same concurrency cap.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 32,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5
+    ):
+        """
+        Args:
+            embeddings: Underlying embeddings (e.g. OllamaEmbeddings)
+            batch_size: Texts per request
+            max_concurrency: Requests in flight at once
+            max_retries: Extra attempts for a failed batch
+            backoff: Delay before the first retry, doubled on each attempt
+        """
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self._stats_lock = threading.Lock()
+        self._active = 0
+        self._busy_since = 0.0
+        self._stats = {"chunks": 0, "tokens": 0, "batches": 0, "retries": 0, "failures": 0, "seconds": 0.0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        self._enter()
+        try:
+            vectors: List[List[float]] = []
+            for result in self._pool.map(self._embed_batch, batches):
+                vectors.extend(result)
+            return vectors
+        finally:
+            self._leave()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embeddings.embed_documents(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    with self._stats_lock:
+                        self._stats["failures"] += 1
+                    logger.error(f"Embedding batch of {len(batch)} failed after {attempt + 1} attempts: {e}")
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+                with self._stats_lock:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
+        tokens = sum(count_tokens(t) for t in batch)
+        with self._stats_lock:
+            self._stats["chunks"] += len(batch)
+            self._stats["tokens"] += tokens
+            self._stats["batches"] += 1
+        return vectors
+
+    def _enter(self) -> None:
+        # Throughput is measured over busy wall time, not summed per caller
+        with self._stats_lock:
+            if self._active == 0:
+                self._busy_since = time.perf_counter()
+            self._active += 1
+
+    def _leave(self) -> None:
+        with self._stats_lock:
+            self._active -= 1
+            if self._active == 0:
+                self._stats["seconds"] += time.perf_counter() - self._busy_since
+
+    def stats(self) -> Dict[str, float]:
+        """Lifetime counters of this process plus chunks/s and tokens/s."""
+        with self._stats_lock:
+            out = dict(self._stats)
+            if self._active:
+                out["seconds"] += time.perf_counter() - self._busy_since
+        seconds = out["seconds"]
+        out["seconds"] = round(seconds, 3)
+        out["chunks_per_s"] = round(out["chunks"] / seconds, 1) if seconds else 0.0
+        out["tokens_per_s"] = round(out["tokens"] / seconds, 1) if seconds else 0.0
+        return out
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Drop-in Embeddings wrapper that memoizes vectors on disk.
+
+    Only texts missing from the cache are sent to the wrapped model, so
+    re-uploads and evaluation reruns of unchanged text cost no embedding call.
+    Queries are first looked up in an in-process LRU, skipping SQLite too.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None
+    ):
+        """
+        Args:
+            embeddings: Underlying embeddings (e.g. OllamaEmbeddings)
+            model_name: Part of the cache key; vectors of different models never mix
+            cache: Vector cache (default: process-wide EmbeddingCache)
+            query_cache: Query vector LRU (default: process-wide QueryEmbeddingCache)
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+        self.query_cache = query_cache or get_query_embedding_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(missing)))
+            self.cache.put_many(self.model_name, missing, [computed[t] for t in missing])
+            vectors = [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.query_cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embed_documents([text])[0]
+            self.query_cache.put(self.model_name, text, vector)
+        return vector
+
 class VectorStore:
     """Handles vector storage and retrieval with Ollama embeddings."""
     
-    def __init__(self, embedding_model: str = "nomic-embed-text"):
+    def __init__(
+        self,
+        embedding_model: str = "nomic-embed-text",
+        collection_name: str = "local-rag",
+        persist_dir: Optional[str] = None,
+        backend: Optional[str] = None
+    ):
         """
         Initialize with Ollama embeddings.
         
         Args:
             embedding_model: Name of Ollama model to use (must be pulled locally)
+            collection_name: Default collection used by add_documents
+            persist_dir: Default on-disk location of the collection (None: in memory)
+            backend: "chroma" or "numpy" (default: VECTOR_BACKEND)
         """
         try:
-            self.embeddings = OllamaEmbeddings(
-                model=embedding_model,
-                base_url="http://localhost:11434"
+            self.embeddings = CachedEmbeddings(
+                get_client_registry().embeddings(embedding_model),
+                model_name=embedding_model
             )
             self.vector_db = None
+            self.collection_name = collection_name
+            self.persist_dir = persist_dir
+            self.backend = backend or VECTOR_BACKEND
+            if self.backend not in ("chroma", "numpy"):
+                raise ValueError(f"Unknown vector backend: {self.backend}")
+            self.deleted_since_compaction = 0
+            self._lock = threading.Lock()
+            # Writers (add_documents, delete_document) run concurrently; compaction waits for them
+            self._writes = threading.Condition()
+            self._active_writes = 0
+            self._compacting = False
             logger.info(f"Initialized Ollama embeddings with model: {embedding_model}")
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Failed to initialize Ollama: {e}")
             raise RuntimeError("Ensure Ollama is running (run 'ollama serve')")
@@ -35,7 +225,7 @@ class VectorStore:
         persist_dir: str = None
     ) -> Chroma:
         """
-        Create Chroma vectorstore from processed documents.
+        Create the vectorstore (Chroma, or NumpyVectorIndex) from processed documents.
         
         Args:
             documents: List of documents from DocumentProcessor
@@ -44,7 +234,12 @@ class VectorStore:
         """
         try:
             logger.info(f"Creating vector database with {len(documents)} documents")
-            
+
+            if self.backend == "numpy":
+                self.vector_db = self._numpy_index(persist_dir)
+                self.vector_db.add_documents(documents)
+                return self.vector_db
+
             self.vector_db = Chroma.from_documents(
                 documents=documents,
                 embedding=self.embeddings,
@@ -57,12 +252,252 @@ class VectorStore:
             logger.error(f"Vector DB creation failed: {e}")
             raise
 
+    def _numpy_index(self, persist_dir: Optional[str]) -> NumpyVectorIndex:
+        return NumpyVectorIndex(
+            self.embeddings,
+            persist_dir=persist_dir,
+            quantization=VECTOR_QUANTIZATION,
+            ann=VECTOR_ANN,
+            nprobe=VECTOR_NPROBE
+        )
+
+    def add_documents(
+        self,
+        documents: List[LangchainDocument],
+        collection_name: Optional[str] = None,
+        persist_dir: str = None
+    ) -> Chroma:
+        """
+        Append documents to the vectorstore, creating it on first use.
+        Safe to call from several threads (e.g. the ingestion pipeline).
+        
+        Args:
+            documents: Chunks to embed and store
+            collection_name: Name for the Chroma collection (default: self.collection_name)
+            persist_dir: Optional directory to persist the database (default: self.persist_dir)
+        """
+        if collection_name is None and persist_dir is None:
+            # Reopen the persisted collection (its newest generation) before creating one
+            self.load()
+        with self._lock:
+            if self.vector_db is None and self.backend == "numpy":
+                self.vector_db = self._numpy_index(persist_dir or self.persist_dir)
+            elif self.vector_db is None:
+                self.vector_db = Chroma(
+                    collection_name=collection_name or self.collection_name,
+                    embedding_function=self.embeddings,
+                    persist_directory=persist_dir or self.persist_dir
+                )
+        with self._writing():
+            try:
+                self.vector_db.add_documents(documents)
+                return self.vector_db
+            except Exception as e:
+                logger.error(f"Adding documents failed: {e}")
+                raise
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """
+        Write barrier: waits while a compaction copies the collection, so a
+        write lands in the generation that survives it.
+        """
+        with self._writes:
+            while self._compacting:
+                self._writes.wait()
+            self._active_writes += 1
+        try:
+            yield
+        finally:
+            with self._writes:
+                self._active_writes -= 1
+                self._writes.notify_all()
+
+    def delete_document(self, doc_id: int) -> int:
+        """
+        Remove every vector of a document, matched on its `doc_id` metadata.
+
+        Returns:
+            Number of vectors removed
+        """
+        if self.load() is None:
+            return 0
+        try:
+            # A delete made while compaction copies the collection would be copied back
+            with self._writing():
+                ids = self._ids_where({"doc_id": doc_id})
+                if ids:
+                    self.vector_db.delete(ids=ids)
+            with self._lock:
+                self.deleted_since_compaction += len(ids)
+            logger.info(f"Removed {len(ids)} vectors of document {doc_id} from {self.collection_name}")
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Vector deletion failed: {e}")
+            raise
+
+    def needs_compaction(self, min_deleted: int = 500, min_ratio: float = 0.2) -> bool:
+        """True once enough vectors were deleted to make a rebuild worthwhile."""
+        if self.vector_db is None or self.deleted_since_compaction < min_deleted:
+            return False
+        remaining = self._count()
+        return self.deleted_since_compaction >= min_ratio * (remaining + self.deleted_since_compaction)
+
+    def _ids_where(self, where: Dict) -> List[str]:
+        if isinstance(self.vector_db, NumpyVectorIndex):
+            return self.vector_db.get_ids(where)
+        return self.vector_db.get(where=where, include=[])["ids"]
+
+    def _count(self) -> int:
+        if isinstance(self.vector_db, NumpyVectorIndex):
+            return self.vector_db.count()
+        return self.vector_db._collection.count()
+
+    def compact(self) -> None:
+        """
+        Rebuild the collection without the space held by deleted vectors.
+
+        Stored embeddings are copied into a new generation of the collection
+        (no re-embedding), the store switches to it and the old one is dropped;
+        the SQLite file of a persisted collection is then vacuumed.
+        The copy is written under a ".partial" name and renamed once complete,
+        so a crash mid-copy never leaves a truncated generation to reopen.
+        """
+        if self.vector_db is None:
+            return
+        with self._writes:
+            self._compacting = True
+            while self._active_writes:
+                self._writes.wait()
+        try:
+            if isinstance(self.vector_db, NumpyVectorIndex):
+                self.vector_db.compact()
+                with self._lock:
+                    self.deleted_since_compaction = 0
+                logger.info(f"Compacted {self.collection_name}: {self._count()} vectors kept")
+                return
+            old = self.vector_db
+            client = old._client
+            name = self._next_generation(old._collection.name)
+            self._drop_stale_generations(client, keep=old._collection.name)
+            data = old.get(include=["embeddings", "documents", "metadatas"])
+            partial = client.create_collection(f"{name}.partial")
+            step = client.get_max_batch_size()
+            for i in range(0, len(data["ids"]), step):
+                partial.add(
+                    ids=data["ids"][i:i + step],
+                    embeddings=data["embeddings"][i:i + step],
+                    documents=data["documents"][i:i + step],
+                    metadatas=[m or None for m in data["metadatas"][i:i + step]],
+                )
+            # The switch: from now on load() picks the new generation
+            partial.modify(name=name)
+            self.vector_db = Chroma(client=client, collection_name=name, embedding_function=self.embeddings)
+            old.delete_collection()
+            with self._lock:
+                self.deleted_since_compaction = 0
+            self._vacuum()
+            logger.info(f"Compacted {self.collection_name}: {len(data['ids'])} vectors kept")
+        except Exception as e:
+            logger.error(f"Collection compaction failed: {e}")
+            raise
+        finally:
+            with self._writes:
+                self._compacting = False
+                self._writes.notify_all()
+
+    def _next_generation(self, current: str) -> str:
+        match = re.fullmatch(rf"{re.escape(self.collection_name)}\.g(\d+)", current)
+        return f"{self.collection_name}.g{int(match.group(1)) + 1 if match else 1}"
+
+    def _drop_stale_generations(self, client, keep: str) -> None:
+        """Delete what interrupted compactions left: partial copies, older generations."""
+        for c in client.list_collections():
+            name = getattr(c, "name", c)
+            if name != keep and (name == self.collection_name or name.startswith(f"{self.collection_name}.g")):
+                client.delete_collection(name)
+                logger.info(f"Deleted stale collection {name}")
+
+    def _current_generation(self, client) -> str:
+        """
+        Name of the newest complete generation of this store's collection in
+        a client (".partial" copies of an interrupted compaction are ignored).
+        """
+        best, best_gen = self.collection_name, 0
+        for c in client.list_collections():
+            name = getattr(c, "name", c)
+            match = re.fullmatch(rf"{re.escape(self.collection_name)}\.g(\d+)", name)
+            if match and int(match.group(1)) > best_gen:
+                best, best_gen = name, int(match.group(1))
+        return best
+
+    def _vacuum(self) -> None:
+        if not self.persist_dir:
+            return
+        db_file = Path(self.persist_dir) / "chroma.sqlite3"
+        if not db_file.exists():
+            return
+        try:
+            conn = sqlite3.connect(db_file, timeout=30)
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"VACUUM of {db_file} skipped: {e}")
+
+    def drop(self) -> None:
+        """Delete every generation of this store's collection (account removal)."""
+        if self.load() is None:
+            return
+        if isinstance(self.vector_db, NumpyVectorIndex):
+            self.vector_db.drop()
+            self.vector_db = None
+            return
+        client = self.vector_db._client
+        for c in client.list_collections():
+            name = getattr(c, "name", c)
+            if name == self.collection_name or name.startswith(f"{self.collection_name}.g"):
+                client.delete_collection(name)
+        self.vector_db = None
+        self._vacuum()
+
+    def load(self) -> Optional[Chroma]:
+        """
+        Open the persisted collection if there is one, without embedding anything.
+        Cheap to call repeatedly: the collection is opened once.
+
+        Returns:
+            The Chroma store, or None when nothing was persisted yet
+        """
+        with self._lock:
+            if self.vector_db is None and self.backend == "numpy":
+                if self.persist_dir and NumpyVectorIndex.exists(self.persist_dir):
+                    self.vector_db = self._numpy_index(self.persist_dir)
+            elif self.vector_db is None and self.persist_dir and Path(self.persist_dir).is_dir():
+                try:
+                    client = chromadb.PersistentClient(path=self.persist_dir)
+                    # After a compaction the live data is in a newer generation
+                    self.vector_db = Chroma(
+                        client=client,
+                        collection_name=self._current_generation(client),
+                        embedding_function=self.embeddings
+                    )
+                    logger.info(f"Loaded vector collection {self.collection_name} from {self.persist_dir}")
+                except Exception as e:
+                    logger.error(f"Loading vector collection failed: {e}")
+                    raise
+        return self.vector_db
+
     def delete_collection(self) -> None:
         """Cleanup vector database resources."""
         if self.vector_db:
             try:
                 logger.info("Deleting vector collection")
-                self.vector_db.delete_collection()
+                if isinstance(self.vector_db, NumpyVectorIndex):
+                    self.vector_db.drop()
+                else:
+                    self.vector_db.delete_collection()
                 self.vector_db = None
             except Exception as e:
                 logger.error(f"Collection deletion failed: {e}")
@@ -71,7 +506,9 @@ class VectorStore:
     def similarity_search(
         self,
         query: str,
-        k: int = 3
+        k: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+        include_ids: Optional[List[str]] = None
     ) -> List[LangchainDocument]:  
         """
         Perform similarity search against stored vectors.
@@ -79,6 +516,9 @@ class VectorStore:
         Args:
             query: The search query
             k: Number of results to return
+            where: Metadata filter applied inside the index scan, e.g.
+                {"doc_id": 12, "file_type": "pdf", "page": {"$gte": 3, "$lte": 7}}
+            include_ids: Chunk ids searched whatever their doc_id (dedup canonicals)
             
         Returns:
             List of relevant documents
@@ -86,7 +526,7 @@ class VectorStore:
         if not self.vector_db:
             raise ValueError("Vector database not initialized")
             
-        return self.vector_db.similarity_search(query, k=k)
+        return similarity_search_where(self.vector_db, query, k, where, include_ids)
 
     
 
@@ -95,7 +535,168 @@ class VectorStore:
         if not self.vector_db:
             return True
         try:
-            data = self.vector_db.get()
-            return len(data.get("ids", [])) == 0
+            return self._count() == 0
         except Exception:
             return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Size of the collection without reading its vectors or documents
+        (Chroma: paged metadata reads through the collection API).
+
+        Returns:
+            count, deleted (since the last compaction), dimensions, bytes
+            (on disk, or estimated in memory) and per_doc ({doc_id: vectors})
+        """
+        if self.load() is None:
+            return {"count": 0, "deleted": 0, "dimensions": None, "bytes": 0, "per_doc": {}}
+        if isinstance(self.vector_db, NumpyVectorIndex):
+            return self.vector_db.stats()
+
+        # Public collection API only: Chroma's internal tables change between versions
+        collection = self.vector_db._collection
+        count = collection.count()
+        per_doc: Dict[Any, int] = {}
+        step = self.vector_db._client.get_max_batch_size()
+        for offset in range(0, count, step):
+            # Metadatas only, a page at a time: no vectors or texts are read
+            for meta in collection.get(include=["metadatas"], limit=step, offset=offset)["metadatas"]:
+                doc_id = (meta or {}).get("doc_id")
+                if doc_id is not None:
+                    per_doc[doc_id] = per_doc.get(doc_id, 0) + 1
+        dimensions = None
+        if count:
+            dimensions = len(collection.get(limit=1, include=["embeddings"])["embeddings"][0])
+        size = None
+        if self.persist_dir and Path(self.persist_dir).is_dir():
+            size = sum(p.stat().st_size for p in Path(self.persist_dir).rglob("*") if p.is_file())
+        return {
+            "count": count,
+            "deleted": self.deleted_since_compaction,
+            "dimensions": dimensions,
+            "bytes": size if size is not None else count * (dimensions or 0) * 4,
+            "per_doc": per_doc,
+        }
+
+
+def _chroma_where(where: Dict[str, Any]) -> Dict[str, Any]:
+    """Chroma syntax: one operator per clause, several clauses under $and."""
+    clauses = []
+    for key, cond in where.items():
+        ops = cond if isinstance(cond, dict) else {"$eq": cond}
+        clauses.extend({key: {op: arg}} for op, arg in ops.items())
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _scored_search(
+    vector_db,
+    query: str,
+    k: int,
+    where: Optional[Dict[str, Any]],
+    ids: Optional[List[str]] = None
+) -> List[tuple]:
+    kwargs: Dict[str, Any] = {} if ids is None else {"ids": ids}
+    if where:
+        kwargs["filter"] = where if isinstance(vector_db, NumpyVectorIndex) else _chroma_where(where)
+    return vector_db.similarity_search_with_score(query, k=k, **kwargs)
+
+
+def similarity_search_where(
+    vector_db,
+    query: str,
+    k: int,
+    where: Optional[Dict[str, Any]] = None,
+    include_ids: Optional[List[str]] = None
+) -> List[LangchainDocument]:
+    """
+    Top-k search on an opened store (Chroma or NumpyVectorIndex), with an
+    optional metadata filter evaluated by the store itself (pre-filtering):
+    a document-scoped query never scores the rest of the library.
+
+    `include_ids` are chunks that are candidates even though their doc_id
+    does not match (the canonical chunks a document's near-duplicates were
+    aliased to, see NearDuplicateIndex.canonical_ids); the other conditions
+    of `where` still apply to them. Both scans are merged on their scores.
+    """
+    if include_ids:
+        others = {key: cond for key, cond in (where or {}).items() if key != "doc_id"}
+        hits = _scored_search(vector_db, query, k, where) + _scored_search(vector_db, query, k, others, include_ids)
+        # NumpyVectorIndex scores are similarities, Chroma's are distances
+        hits.sort(key=lambda h: h[1], reverse=isinstance(vector_db, NumpyVectorIndex))
+        seen, docs = set(), []
+        for doc, _ in hits:
+            key = doc.id or doc.page_content
+            if key not in seen:
+                seen.add(key)
+                docs.append(doc)
+        return docs[:k]
+    if not where:
+        return vector_db.similarity_search(query, k=k)
+    if isinstance(vector_db, NumpyVectorIndex):
+        return vector_db.similarity_search(query, k=k, filter=where)
+    return vector_db.similarity_search(query, k=k, filter=_chroma_where(where))
+
+
+_executors: Dict[str, EmbeddingExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_embedding_executor(embedding_model: str = "nomic-embed-text") -> EmbeddingExecutor:
+    """
+    Process-wide executor per model, so every VectorStore (one per user)
+    shares the same concurrency cap towards the local Ollama server.
+    """
+    with _executors_lock:
+        executor = _executors.get(embedding_model)
+        if executor is None:
+            executor = EmbeddingExecutor(
+                OllamaEmbeddings(model=embedding_model, base_url=OLLAMA_BASE_URL)
+            )
+            _executors[embedding_model] = executor
+        return executor
+
+
+_user_stores: Dict[Optional[int], VectorStore] = {}
+_user_stores_lock = threading.Lock()
+
+
+DEFAULT_VECTOR_DIR = Path("data") / "vectors"
+
+
+def get_user_vector_store(owner_id: Optional[int]) -> VectorStore:
+    """
+    Shared VectorStore for one user's library, used by both the background
+    ingestion worker and the chat of every session of that user.
+
+    Registered users get a persistent collection under data/vectors/user_<id>,
+    grown with add_documents and reopened with load() after a restart.
+    owner_id None gives an in-memory collection; guest sessions do not use
+    it (the sidebar indexes their uploads into a collection per session).
+    """
+    with _user_stores_lock:
+        store = _user_stores.get(owner_id)
+        if store is None:
+            if owner_id is not None:
+                suffix = "-numpy" if VECTOR_BACKEND == "numpy" else ""
+                store = VectorStore(
+                    collection_name=f"user-{owner_id}",
+                    persist_dir=str(DEFAULT_VECTOR_DIR / f"user_{owner_id}{suffix}")
+                )
+            else:
+                store = VectorStore(collection_name="guest")
+            _user_stores[owner_id] = store
+        return store
+
+
+def list_user_vector_stores() -> List[VectorStore]:
+    """Stores opened so far in this process."""
+    with _user_stores_lock:
+        return list(_user_stores.values())
+
+
+def drop_user_vector_store(owner_id: Optional[int]) -> None:
+    """Delete a user's collection and forget the store."""
+    store = get_user_vector_store(owner_id)
+    store.drop()
+    with _user_stores_lock:
+        _user_stores.pop(owner_id, None)
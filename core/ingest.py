@@ -0,0 +1,362 @@
+"""
+Pipelined multi-file ingestion.
+Parsing/splitting fans out across a process pool while finished files are
+embedded concurrently in bounded batches. PDFs are cut into page windows and
+large CSVs are streamed row group by row group, so memory follows the window,
+not the document.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document as LangchainDocument
+from core.cache import file_digest
+from core.chunk_store import ChunkStore, ChunkWriter
+from core.bm25 import get_bm25_index
+from core.dedup import get_dedup_index
+from core.document import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestItem:
+    """One file to ingest and the library row it belongs to."""
+    path: Path
+    doc_id: Optional[int] = None
+    owner_id: Optional[int] = None
+
+
+@dataclass
+class IngestResult:
+    """Outcome of a single file; failures are isolated per file."""
+    item: IngestItem
+    chunks: int = 0
+    embedded: int = 0
+    duplicates: int = 0
+    pages_total: Optional[int] = None
+    pages_parsed: int = 0
+    parse_seconds: float = 0.0
+    pdf_stats: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _parse_part(
+    path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    pages: Optional[Tuple[int, int]],
+    digest: Optional[str]
+) -> Tuple[List[LangchainDocument], Dict[str, float]]:
+    """Process-pool entry point: load + split one file or one page window."""
+    processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = processor.process_file(Path(path), pages=pages, digest=digest)
+    return chunks, processor.pdf_extractor.take_stats()
+
+
+def _process_context():
+    # Streamlit runs many threads: fork from a clean server process instead
+    try:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["core.document"])
+        return ctx
+    except ValueError:
+        return multiprocessing.get_context("spawn")
+
+
+class IngestionPipeline:
+    """Parse files in parallel and stream their chunks into a VectorStore."""
+
+    def __init__(
+        self,
+        vector_store,
+        processor: Optional[DocumentProcessor] = None,
+        chunk_store: Optional[ChunkStore] = None,
+        max_workers: Optional[int] = None,
+        embed_batch_size: int = 64,
+        max_pending_batches: int = 4,
+        stream_threshold_bytes: int = 64 * 1024 * 1024,
+        deduplicate: bool = True,
+        lexical_index: bool = True
+    ):
+        """
+        Args:
+            vector_store: our VectorStore instance from embeddings.py
+            processor: DocumentProcessor whose splitter settings are used
+            chunk_store: Where chunks of items with a doc_id are persisted
+            max_workers: Parser processes (defaults to the CPU count)
+            embed_batch_size: Chunks per embedding call
+            max_pending_batches: Embedding batches allowed in flight at once
+            stream_threshold_bytes: CSVs above this size bypass the pool/cache
+                and are streamed straight into the embedder
+            deduplicate: Skip embedding chunks that near-duplicate one already
+                indexed for the same user (MinHash/LSH)
+            lexical_index: Also add embedded chunks to the user's BM25 index
+        """
+        self.vector_store = vector_store
+        self.processor = processor or DocumentProcessor()
+        self.chunk_store = chunk_store
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.max_pending_batches = max_pending_batches
+        self.stream_threshold_bytes = stream_threshold_bytes
+        self.deduplicate = deduplicate
+        self.lexical_index = lexical_index
+
+    def run(
+        self,
+        items: List[IngestItem],
+        on_progress: Optional[Callable[[IngestResult], None]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> List[IngestResult]:
+        """
+        Ingest a batch of files.
+
+        Args:
+            items: Files to ingest
+            on_progress: Called with a file's IngestResult whenever pages are
+                parsed or chunks embedded (from pipeline threads)
+            cancel: Once set, no further chunks are indexed and the remaining
+                files fail with "cancelled" (batches in flight still complete)
+
+        Returns:
+            One IngestResult per item, in input order
+        """
+        results: Dict[int, IngestResult] = {i: IngestResult(item=it) for i, it in enumerate(items)}
+        if not items:
+            return []
+
+        started = time.perf_counter()
+        slots = threading.BoundedSemaphore(self.max_pending_batches)
+        progress_lock = threading.Lock()
+
+        def _notify(idx: int) -> None:
+            if on_progress is None:
+                return
+            try:
+                on_progress(results[idx])
+            except Exception as e:
+                logger.warning(f"Progress callback failed: {e}")
+
+        def _embedded(fut, idx: int, size: int) -> None:
+            slots.release()
+            if fut.exception() is None:
+                with progress_lock:
+                    results[idx].embedded += size
+                _notify(idx)
+        parts, streamed = self._plan(items, results)
+        workers = min(self.max_workers, len(parts))
+        writers: Dict[int, ChunkWriter] = {}
+        if self.chunk_store is not None:
+            for idx, it in enumerate(items):
+                if it.doc_id is not None and results[idx].ok:
+                    writers[idx] = self.chunk_store.writer(it.doc_id)
+
+        with ThreadPoolExecutor(max_workers=self.max_pending_batches) as embed_pool, \
+                ThreadPoolExecutor(max_workers=1) as stream_pool:
+            pending = {}   # embedding future -> file index
+
+            def _dispatch(
+                idx: int,
+                chunks: List[LangchainDocument],
+                stats: Dict[str, float],
+                order: int,
+                pages: Optional[Tuple[int, int]] = None
+            ) -> None:
+                res = results[idx]
+                if cancel is not None and cancel.is_set():
+                    if res.ok:
+                        self._fail(res, "cancelled")
+                    return
+                with progress_lock:
+                    res.chunks += len(chunks)
+                    if pages:
+                        res.pages_parsed += pages[1] - pages[0]
+                for name, value in stats.items():
+                    res.pdf_stats[name] = res.pdf_stats.get(name, 0) + value
+                self._tag(chunks, res.item, order)
+                if idx in writers:
+                    writers[idx].append(chunks, order=order)
+                if self.deduplicate and res.item.doc_id is not None:
+                    chunks, dups = get_dedup_index(res.item.owner_id).filter(chunks)
+                    with progress_lock:
+                        res.duplicates += len(dups)
+                        # Aliased chunks count as indexed for progress reporting
+                        res.embedded += len(dups)
+                if self.lexical_index and res.item.doc_id is not None:
+                    get_bm25_index(res.item.owner_id).add(chunks)
+                _notify(idx)
+                for start in range(0, len(chunks), self.embed_batch_size):
+                    batch = chunks[start:start + self.embed_batch_size]
+                    slots.acquire()  # back-pressure: bounded batches in flight
+                    fut = embed_pool.submit(self._embed_batch, batch)
+                    fut.add_done_callback(lambda f, i=idx, n=len(batch): _embedded(f, i, n))
+                    pending[fut] = idx
+
+            def _stream(idx: int) -> None:
+                t0 = time.perf_counter()
+                batch, order = [], 0
+                try:
+                    for chunk in self.processor.iter_chunks(Path(items[idx].path)):
+                        batch.append(chunk)
+                        if len(batch) == self.embed_batch_size:
+                            _dispatch(idx, batch, {}, order)
+                            batch, order = [], order + 1
+                    if batch:
+                        _dispatch(idx, batch, {}, order)
+                except Exception as e:
+                    self._fail(results[idx], f"parse: {e}")
+                results[idx].parse_seconds += time.perf_counter() - t0
+
+            # Large CSVs stream in the background while the pool handles the rest
+            streaming = [stream_pool.submit(_stream, idx) for idx in streamed]
+
+            if workers <= 1:
+                # Single part: no point paying for a process pool
+                for idx, pages, digest in parts:
+                    if not results[idx].ok:
+                        continue
+                    t0 = time.perf_counter()
+                    try:
+                        chunks = self.processor.process_file(
+                            Path(items[idx].path), pages=pages, digest=digest
+                        )
+                    except Exception as e:
+                        self._fail(results[idx], f"parse: {e}")
+                        continue
+                    finally:
+                        stats = self.processor.pdf_extractor.take_stats()
+                    results[idx].parse_seconds += time.perf_counter() - t0
+                    _dispatch(idx, chunks, stats, pages[0] if pages else 0, pages)
+            else:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=_process_context()) as parse_pool:
+                    queue = iter(parts)
+                    running = {}   # parse future -> (file index, page window, submit time)
+
+                    def _submit_next() -> bool:
+                        for idx, pages, digest in queue:
+                            if not results[idx].ok:
+                                continue
+                            fut = parse_pool.submit(
+                                _parse_part,
+                                str(items[idx].path),
+                                self.processor.chunk_size,
+                                self.processor.chunk_overlap,
+                                pages,
+                                digest
+                            )
+                            running[fut] = (idx, pages, time.perf_counter())
+                            return True
+                        return False
+
+                    # Keep at most two windows per worker parsed ahead of the embedder
+                    for _ in range(workers * 2):
+                        if not _submit_next():
+                            break
+
+                    while running:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            idx, pages, t0 = running.pop(fut)
+                            try:
+                                chunks, stats = fut.result()
+                            except Exception as e:
+                                self._fail(results[idx], f"parse: {e}")
+                            else:
+                                results[idx].parse_seconds += time.perf_counter() - t0
+                                _dispatch(idx, chunks, stats, pages[0] if pages else 0, pages)
+                            _submit_next()
+
+            for fut in streaming:
+                fut.result()
+            for fut in as_completed(list(pending)):
+                idx = pending.pop(fut)
+                try:
+                    fut.result()
+                except Exception as e:
+                    self._fail(results[idx], f"embed: {e}")
+
+        for idx, writer in writers.items():
+            if results[idx].ok:
+                writer.commit()
+            else:
+                writer.abort()
+
+        ordered = [results[i] for i in range(len(items))]
+        for res in ordered:
+            if res.pdf_stats:
+                logger.info(f"PDF tiers for {Path(res.item.path).name}: {res.pdf_stats}")
+        logger.info(
+            f"Ingested {sum(r.ok for r in ordered)}/{len(ordered)} files, "
+            f"{sum(r.embedded for r in ordered)} chunks in {time.perf_counter() - started:.1f}s, "
+            f"{sum(r.duplicates for r in ordered)} near-duplicate embeddings avoided"
+        )
+        return ordered
+
+    def _plan(
+        self,
+        items: List[IngestItem],
+        results: Dict[int, IngestResult]
+    ) -> Tuple[List[Tuple[int, Optional[Tuple[int, int]], Optional[str]]], List[int]]:
+        """
+        Cut every file into parse tasks: page windows for PDFs, whole file
+        otherwise. Large CSVs are returned separately to be streamed.
+        """
+        parts, streamed = [], []
+        window = self.processor.pdf_window_pages
+        for idx, it in enumerate(items):
+            path = Path(it.path)
+            try:
+                suffix = path.suffix.lower()
+                if suffix == ".csv" and path.stat().st_size > self.stream_threshold_bytes:
+                    streamed.append(idx)
+                    continue
+                digest = file_digest(path)
+                if suffix != ".pdf":
+                    parts.append((idx, None, digest))
+                    continue
+                n_pages = self.processor.count_pdf_pages(path)
+                results[idx].pages_total = n_pages
+            except Exception as e:
+                self._fail(results[idx], f"parse: {e}")
+                continue
+            for start in range(0, n_pages, window):
+                parts.append((idx, (start, min(start + window, n_pages)), digest))
+        return parts, streamed
+
+    @staticmethod
+    def _tag(chunks: List[LangchainDocument], item: IngestItem, order: int) -> None:
+        for seq, c in enumerate(chunks):
+            if item.doc_id is not None:
+                c.metadata["doc_id"] = item.doc_id
+                # Deterministic ids: re-running a job upserts instead of duplicating
+                c.id = f"doc{item.doc_id}:{order}:{seq}"
+            if item.owner_id is not None:
+                c.metadata["owner_id"] = item.owner_id
+            # Filterable at query time ("pdf", "docx", ...)
+            c.metadata["file_type"] = item.path.suffix.lower().lstrip(".")
+
+    def _embed_batch(self, batch: List[LangchainDocument]) -> None:
+        self.vector_store.add_documents(batch)
+
+    @staticmethod
+    def _fail(res: IngestResult, message: str) -> None:
+        logger.error(f"Ingestion failed for {Path(res.item.path).name}: {message}")
+        res.errors.append(message)
+        res.error = res.errors[0]
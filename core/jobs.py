@@ -0,0 +1,286 @@
+"""
+Background ingestion worker.
+Uploads are queued in the ingestion_jobs table; worker threads claim jobs,
+run the ingestion pipeline and record progress so the UI only has to poll.
+Jobs interrupted by a restart are queued again when the worker starts,
+up to INGEST_MAX_ATTEMPTS times; deleting a document or a user cancels its
+pending jobs. Whatever a failed or cancelled job indexed is removed.
+Idle workers also compact vector collections that accumulated deletions.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+from core.answer_cache import get_answer_cache
+from core.auth import crud, database
+from core.bm25 import drop_bm25_index, get_bm25_index
+from core.chunk_store import get_chunk_store
+from core.dedup import drop_dedup_index, get_dedup_index
+from core.embeddings import drop_user_vector_store, get_user_vector_store, list_user_vector_stores
+from core.ingest import IngestionPipeline, IngestItem, IngestResult
+
+logger = logging.getLogger(__name__)
+
+# A job still 'running' after this many claims crashed the process each time
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+
+class IngestionWorker:
+    """Pool of daemon threads draining the ingestion_jobs queue."""
+
+    def __init__(
+        self,
+        num_threads: int = 2,
+        poll_interval: float = 2.0,
+        progress_interval: float = 1.0,
+        compact_interval: float = 600.0,
+        max_attempts: int = INGEST_MAX_ATTEMPTS,
+        on_done: Optional[Callable[[int, IngestResult], None]] = None
+    ):
+        """
+        Args:
+            num_threads: Jobs processed concurrently
+            poll_interval: Seconds between queue polls when idle
+            progress_interval: Minimum seconds between progress writes per job
+            compact_interval: Minimum seconds between compaction checks
+            max_attempts: Claims after which an interrupted job is failed, not resumed
+            on_done: Optional hook called with (job_id, result) after each job
+        """
+        self.num_threads = num_threads
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.compact_interval = compact_interval
+        self.max_attempts = max_attempts
+        self.on_done = on_done
+        self._last_compaction = time.monotonic()
+        self._compact_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        db = database.SessionLocal()
+        try:
+            exhausted = crud.fail_exhausted_jobs(db, self.max_attempts)
+            for job in exhausted:
+                db.expunge(job)
+            resumed = crud.requeue_interrupted_jobs(db)
+            if resumed:
+                logger.info(f"Resuming {resumed} interrupted ingestion job(s)")
+        finally:
+            db.close()
+        for job in exhausted:
+            logger.error(f"Ingestion job {job.id} interrupted {job.attempts} times, marked failed")
+            self._rollback(job)
+        for i in range(self.num_threads):
+            t = threading.Thread(target=self._loop, name=f"ingestion-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def wake(self) -> None:
+        """Signal that new jobs were queued."""
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            db = database.SessionLocal()
+            try:
+                job = crud.claim_next_job(db)
+                if job is not None:
+                    db.expunge(job)
+            except Exception as e:
+                logger.error(f"Claiming ingestion job failed: {e}")
+                job = None
+            finally:
+                db.close()
+
+            if job is None:
+                self._maybe_compact()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job) -> None:
+        logger.info(f"Ingestion job {job.id} started: {Path(job.path).name}")
+        last_write = [0.0]
+        cancel = threading.Event()
+
+        def _progress(res: IngestResult) -> None:
+            now = time.monotonic()
+            if now - last_write[0] < self.progress_interval:
+                return
+            last_write[0] = now
+            # No row updated: the job was cancelled (document or user deleted)
+            if not self._update(
+                job.id,
+                expect_status="running",
+                pages_total=res.pages_total,
+                pages_parsed=res.pages_parsed,
+                chunks_total=res.chunks,
+                chunks_embedded=res.embedded,
+            ):
+                cancel.set()
+
+        try:
+            pipeline = IngestionPipeline(
+                get_user_vector_store(job.owner_id),
+                chunk_store=get_chunk_store()
+            )
+            item = IngestItem(path=Path(job.path), doc_id=job.document_id, owner_id=job.owner_id)
+            res = pipeline.run([item], on_progress=_progress, cancel=cancel)[0]
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} crashed: {e}")
+            self._update(job.id, expect_status="running", status="failed", error=str(e)[:2000])
+            self._rollback(job)
+            return
+
+        if not self._update(
+            job.id,
+            expect_status="running",
+            status="done" if res.ok else "failed",
+            error=None if res.ok else res.error[:2000],
+            pages_total=res.pages_total,
+            pages_parsed=res.pages_parsed,
+            chunks_total=res.chunks,
+            chunks_embedded=res.embedded,
+        ):
+            # Cancelled while running: the purge may have run before our last writes
+            logger.info(f"Ingestion job {job.id} cancelled, removing what it indexed")
+            self._rollback(job)
+            return
+        if res.ok:
+            # The library changed: cached answers no longer reflect it
+            get_answer_cache().bump_version(job.owner_id)
+        else:
+            self._rollback(job)
+        if self.on_done:
+            try:
+                self.on_done(job.id, res)
+            except Exception as e:
+                logger.warning(f"Ingestion on_done hook failed: {e}")
+
+    @staticmethod
+    def _rollback(job) -> None:
+        """
+        Remove what a failed or cancelled job indexed: its dedup signatures
+        and BM25 postings would otherwise point at chunks never embedded.
+        """
+        try:
+            _purge_index(job.document_id, job.owner_id)
+        except Exception as e:
+            logger.warning(f"Could not remove partial index of job {job.id}: {e}")
+        get_answer_cache().bump_version(job.owner_id)
+
+    def _maybe_compact(self) -> None:
+        """Compact collections with many deleted vectors, one idle thread at a time."""
+        if time.monotonic() - self._last_compaction < self.compact_interval:
+            return
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_compaction = time.monotonic()
+            for store in list_user_vector_stores():
+                if store.needs_compaction():
+                    try:
+                        store.compact()
+                    except Exception as e:
+                        logger.warning(f"Compaction of {store.collection_name} failed: {e}")
+        finally:
+            self._compact_lock.release()
+
+    @staticmethod
+    def _update(job_id: int, expect_status: Optional[str] = None, **fields) -> bool:
+        """Write job fields; False if the job no longer has `expect_status`."""
+        db = database.SessionLocal()
+        try:
+            return crud.update_job(db, job_id, expect_status=expect_status, **fields) > 0
+        except Exception as e:
+            logger.warning(f"Could not update ingestion job {job_id}: {e}")
+            return True
+        finally:
+            db.close()
+
+
+def _cancel_jobs(**match) -> None:
+    db = database.SessionLocal()
+    try:
+        n = crud.cancel_jobs(db, **match)
+        if n:
+            logger.info(f"Cancelled {n} ingestion job(s) ({match})")
+    finally:
+        db.close()
+
+
+def purge_document(doc_id: int, owner_id: Optional[int]) -> None:
+    """
+    Remove everything indexed for a deleted document: its pending ingestion
+    jobs are cancelled, then its vectors (matched on the doc_id metadata),
+    its BM25 postings, its stored chunks and its near-duplicate entries are
+    removed; cached answers of the library are retired.
+    Chunks of other documents that were only aliases of this one get embedded.
+    """
+    _cancel_jobs(document_id=doc_id)
+    _purge_index(doc_id, owner_id)
+    get_answer_cache().bump_version(owner_id)
+
+
+def _purge_index(doc_id: int, owner_id: Optional[int]) -> None:
+    store = get_user_vector_store(owner_id)
+    store.delete_document(doc_id)
+    bm25 = get_bm25_index(owner_id)
+    bm25.remove_document(doc_id)
+    promoted = get_dedup_index(owner_id).remove_document(doc_id)
+    if promoted:
+        store.add_documents(promoted)
+        bm25.add(promoted)
+        logger.info(f"Promoted {len(promoted)} aliased chunks after deleting document {doc_id}")
+    get_chunk_store().delete(doc_id)
+
+
+def purge_user(owner_id: int, doc_ids: Iterable[int]) -> None:
+    """Remove a user's whole index (account deletion), after cancelling their jobs."""
+    _cancel_jobs(owner_id=owner_id)
+    drop_user_vector_store(owner_id)
+    drop_dedup_index(owner_id)
+    drop_bm25_index(owner_id)
+    get_answer_cache().bump_version(owner_id)
+    chunk_store = get_chunk_store()
+    for doc_id in doc_ids:
+        chunk_store.delete(doc_id)
+
+
+_worker: Optional[IngestionWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_ingestion_worker(
+    on_done: Optional[Callable[[int, IngestResult], None]] = None
+) -> IngestionWorker:
+    """
+    Process-wide worker, started on first use (app start-up, so interrupted
+    jobs are resumed without waiting for an upload).
+    `on_done` is only taken into account when the worker is created.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = IngestionWorker(on_done=on_done)
+            _worker.start()
+        return _worker
+
+
+def wake_ingestion_worker() -> None:
+    """Tell the running worker that jobs were queued (it also polls on its own)."""
+    with _worker_lock:
+        worker = _worker
+    if worker is not None:
+        worker.wake()
@@ -1,30 +1,141 @@
 """LLM management for RAG system with local Ollama models."""
 import logging
-from typing import List
-from langchain_ollama.chat_models import ChatOllama
+import re
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Union
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.documents import Document as LangchainDocument
+from core.answer_cache import CachedQuery
+from core.clients import FairLimiter, Slot, get_client_registry, get_ollama_limiter
+from core.context import ANSWER_TOKENS, PackedContext, pack_context
+from core.tokens import count_tokens, usable_context
 
 logger = logging.getLogger(__name__)
 
+# Context window used for every model (tokens)
+NUM_CTX = 2048
+
+# Limiter wait of the last non-streamed call, per thread / asyncio task
+_last_queue_ms: ContextVar[Optional[float]] = ContextVar("last_queue_ms", default=None)
+
+RAG_PROMPT_TEMPLATE = """Answer the question using ONLY the following context:
+            {context}
+            
+            Question: {question}
+            
+            Your response should be precise and include relevant details from the context.
+            If the answer isn't in the context, say "I don't have that information"."""
+
+
+def rag_prompt_overhead(question_tokens: int = 64) -> int:
+    """Tokens taken by the RAG template itself plus room for the question."""
+    return count_tokens(RAG_PROMPT_TEMPLATE.format(context="", question="")) + question_tokens
+
+
+class TimedStream:
+    """
+    Iterator over generated text pieces (e.g. for st.write_stream) that
+    records time-to-first-token and total generation time.
+    With a `limiter`, a slot is held for the whole stream and the time spent
+    waiting for it is kept apart (queue_ms); the generation clock starts
+    once the request is actually sent.
+    `on_complete` receives the full text once the stream is exhausted.
+    Iterate with `for` over sync pieces, `async for` over async ones.
+    """
+
+    def __init__(
+        self,
+        pieces: Union[Iterable[str], AsyncIterable[str]],
+        on_complete: Optional[Callable[[str], None]] = None,
+        limiter: Optional[FairLimiter] = None
+    ):
+        self._pieces = pieces
+        self.on_complete = on_complete
+        self.limiter = limiter
+        self._parts: List[str] = []
+        self.queue_ms: Optional[float] = None
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+
+    def _record(self, piece: str, t0: float) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - t0) * 1000
+        self._parts.append(piece)
+
+    def _finish(self, t0: float) -> None:
+        self.total_ms = (time.perf_counter() - t0) * 1000
+        logger.info(
+            f"Generation: queued {self.queue_ms or 0:.0f} ms, "
+            f"first token {self.ttft_ms or 0:.0f} ms, total {self.total_ms:.0f} ms"
+        )
+        if self.on_complete:
+            self.on_complete(self.text)
+
+    def __iter__(self) -> Iterator[str]:
+        with self.limiter.slot() if self.limiter else nullcontext(Slot()) as slot:
+            self.queue_ms = slot.wait_ms
+            t0 = time.perf_counter()
+            for piece in self._pieces:
+                if piece:
+                    self._record(piece, t0)
+                    yield piece
+            self._finish(t0)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async with self.limiter.aslot() if self.limiter else nullcontext(Slot()) as slot:
+            self.queue_ms = slot.wait_ms
+            t0 = time.perf_counter()
+            async for piece in self._pieces:
+                if piece:
+                    self._record(piece, t0)
+                    yield piece
+            self._finish(t0)
+
+    @property
+    def text(self) -> str:
+        """Text generated so far."""
+        return "".join(self._parts)
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """queue_ms / ttft_ms / generation_ms for reporting payloads (None until known)."""
+        return {
+            "queue_ms": self.queue_ms,
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "generation_ms": round(self.total_ms, 1) if self.total_ms is not None else None,
+        }
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
 class LLMManager:
     """Handles LLM interactions and prompt engineering for the RAG system."""
     
     def __init__(self, model_name: str = "llama3.2:latest"):
         """
         Initialize the LLM with local Ollama.
+        Cheap: the ChatOllama client (and its connections) comes from the
+        process-wide registry and is shared by every session, as is the
+        limiter every generation request waits on.
         
         Args:
             model_name: Ollama model name (must be pulled locally)
         """
         try:
-            self.llm = ChatOllama(
-                model=model_name,
+            self.llm = get_client_registry().chat_model(
+                model_name,
                 temperature=0.3,  # balances creativity
-                base_url="http://localhost:11434",  
-                num_ctx=2048, # consistent context window
+                num_ctx=NUM_CTX, # consistent context window
                 num_threads=2
             )
+            self.num_ctx = NUM_CTX
+            self.model_name = model_name
+            self.limiter = get_ollama_limiter()
+            self.last_context: Optional[PackedContext] = None
             logger.info(f"Initialized LLM with model: {model_name}")
         except Exception as e:
             logger.error(f"LLM initialization failed: {e}")
@@ -34,7 +145,8 @@ class LLMManager:
         self,
         context: List[LangchainDocument],  
         question: str,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        cache: Optional[CachedQuery] = None
     ) -> str:
         """
         Generate answer from context using RAG pattern.
@@ -43,61 +155,203 @@ class LLMManager:
             context: Documents retrieved from VectorStore
             question: User query
             max_tokens: Limit response length
+            cache: Semantic answer cache entry of the question (hit: no LLM call)
             
         Returns:
             Generated answer string
         """
+        if cache is not None and cache.get() is not None:
+            return cache.get()
         try:
-            # Format context from document chunks
-            context_text = "\n\n".join([doc.page_content for doc in context])
+            # Pack the chunks into the tokens left in num_ctx
+            context_text = self.pack_context(context, question).text
             
-            response = self.llm.invoke(
+            response = self._invoke(
                 self._get_rag_prompt().format(
                     context=context_text,
                     question=question
                 )
             )
+            if cache is not None:
+                cache.put(response.content)
             return response.content
             
         except Exception as e:
             logger.error(f"Answer generation failed: {e}")
             raise
 
+    def stream_answer(
+        self,
+        context: List[LangchainDocument],
+        question: str,
+        cache: Optional[CachedQuery] = None
+    ) -> TimedStream:
+        """
+        Streaming variant of generate_answer.
+
+        Args:
+            context: Documents retrieved from VectorStore
+            question: User query
+            cache: Semantic answer cache entry of the question (hit: no LLM call)
+
+        Returns:
+            TimedStream of answer pieces (timings available once consumed)
+        """
+        if cache is not None and cache.get() is not None:
+            return TimedStream([cache.get()])
+        context_text = self.pack_context(context, question).text
+        prompt = self._get_rag_prompt().format(context=context_text, question=question)
+        return TimedStream(
+            self._stream(prompt), on_complete=cache.put if cache is not None else None, limiter=self.limiter
+        )
+
+    def stream_general(self, question: str, max_tokens: int = 600) -> TimedStream:
+        """Streaming variant of generate_general."""
+        return TimedStream(
+            self._stream(self._get_general_prompt().format(question=question)), limiter=self.limiter
+        )
+
+    # ---- Async variants (ainvoke / astream, for the async pipeline) ----
+    async def agenerate_answer(
+        self,
+        context: List[LangchainDocument],
+        question: str,
+        max_tokens: int = 1000,
+        cache: Optional[CachedQuery] = None
+    ) -> str:
+        """Async variant of generate_answer (the cache lookup is expected done)."""
+        if cache is not None and cache.get() is not None:
+            return cache.get()
+        try:
+            context_text = self.pack_context(context, question).text
+            response = await self._ainvoke(
+                self._get_rag_prompt().format(context=context_text, question=question)
+            )
+            if cache is not None:
+                cache.put(response.content)
+            return response.content
+        except Exception as e:
+            logger.error(f"Answer generation failed: {e}")
+            raise
+
+    async def agenerate_general(self, question: str, max_tokens: int = 600) -> str:
+        """Async variant of generate_general."""
+        try:
+            resp = await self._ainvoke(self._get_general_prompt().format(question=question))
+            return (resp.content or "").strip()
+        except Exception as e:
+            logger.error(f"General answer failed: {e}")
+            raise
+
+    def astream_answer(
+        self,
+        context: List[LangchainDocument],
+        question: str,
+        cache: Optional[CachedQuery] = None
+    ) -> TimedStream:
+        """stream_answer for `async for`."""
+        if cache is not None and cache.get() is not None:
+            return TimedStream(_single(cache.get()))
+        context_text = self.pack_context(context, question).text
+        prompt = self._get_rag_prompt().format(context=context_text, question=question)
+        return TimedStream(
+            self._astream(prompt), on_complete=cache.put if cache is not None else None, limiter=self.limiter
+        )
+
+    def astream_general(self, question: str, max_tokens: int = 600) -> TimedStream:
+        """stream_general for `async for`."""
+        return TimedStream(
+            self._astream(self._get_general_prompt().format(question=question)), limiter=self.limiter
+        )
+
+    def pack_context(self, context: List[LangchainDocument], question: str) -> PackedContext:
+        """
+        Fit the retrieved chunks in num_ctx next to the template, the question
+        and the answer; the result is also kept in self.last_context.
+        """
+        budget = usable_context(self.num_ctx) - rag_prompt_overhead(count_tokens(question)) - ANSWER_TOKENS
+        self.last_context = pack_context(context, max(budget, 0))
+        return self.last_context
+
+    @property
+    def last_queue_ms(self) -> Optional[float]:
+        """Limiter wait of the last generate_* / agenerate_* call of this thread or task."""
+        return _last_queue_ms.get()
+
+    def _invoke(self, prompt: str):
+        """llm.invoke once a limiter slot is free."""
+        with self.limiter.slot() as slot:
+            _last_queue_ms.set(slot.wait_ms)
+            return self.llm.invoke(prompt)
+
+    async def _ainvoke(self, prompt: str):
+        async with self.limiter.aslot() as slot:
+            _last_queue_ms.set(slot.wait_ms)
+            return await self.llm.ainvoke(prompt)
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        try:
+            for chunk in self.llm.stream(prompt):
+                yield chunk.content
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            raise
+
+    async def _astream(self, prompt: str) -> AsyncIterator[str]:
+        try:
+            async for chunk in self.llm.astream(prompt):
+                yield chunk.content
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            raise
+
     def _get_rag_prompt(self) -> ChatPromptTemplate:
         """Core RAG prompt template in English."""
-        return ChatPromptTemplate.from_template(
-            """Answer the question using ONLY the following context:
-            {context}
-            
-            Question: {question}
-            
-            Your response should be precise and include relevant details from the context.
-            If the answer isn't in the context, say "I don't have that information"."""
-        )
+        return ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
 
-    def expand_query(self, question: str) -> List[str]:
+    def expand_query(self, question: str, cancel: Optional[threading.Event] = None) -> List[str]:
         """
         Generate alternative query phrasings for improved retrieval.
+
+        Optional work: it only starts if a limiter slot is free right away
+        (never queues behind answers), and once `cancel` is set the stream is
+        closed so Ollama stops generating it.
         
         Args:
             question: Original user question
+            cancel: Set by the caller when it stops waiting for the result
             
         Returns:
             List of alternative phrasings (including original)
         """
+        if self.limiter.try_acquire() is None:
+            logger.info("Ollama busy, query expansion skipped")
+            return [question]
         try:
             prompt = """Generate 2 alternative phrasings for this search query.
             Maintain the original meaning but vary the wording.
             Original question: {question}
             Responses (1 per line):"""
             
-            result = self.llm.invoke(prompt.format(question=question))
-            alternatives = result.content.strip().split('\n')
+            parts = []
+            for chunk in self.llm.stream(prompt.format(question=question)):
+                if cancel is not None and cancel.is_set():
+                    logger.info("Query expansion dropped after its time budget")
+                    return [question]
+                parts.append(chunk.content)
+            # Drop blank lines, list markers ("1.", "-") and echoes of the question
+            alternatives = [
+                re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", line).strip().strip('"')
+                for line in "".join(parts).strip().split('\n')
+            ]
+            alternatives = [a for a in alternatives if a and a.lower() != question.lower()]
             return [question] + alternatives[:2]  # Keep max 2 alternatives
             
         except Exception as e:
             logger.warning(f"Query expansion failed, using original: {e}")
             return [question]
+        finally:
+            self.limiter.release()
 
     # For general question generation
     def _get_general_prompt(self) -> ChatPromptTemplate:
@@ -118,7 +372,7 @@ class LLMManager:
         try:
             prompt = self._get_general_prompt().format(question=question)
             # to limite length: self.llm.bind(num_predict=max_tokens)
-            resp = self.llm.invoke(prompt)
+            resp = self._invoke(prompt)
             return (resp.content or "").strip()
         except Exception as e:
             logger.error(f"General answer failed: {e}")
@@ -1,60 +1,168 @@
 """RAG pipeline core functionality."""
+import asyncio
 import logging
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+import time
+from typing import Dict, Optional
+from core.answer_cache import CachedQuery, SemanticAnswerCache
+from core.llm import TimedStream
+from core.retrieval import QUERY_EXPANSION_TIMEOUT, MultiQueryRetriever
 
 logger = logging.getLogger(__name__)
 
 class RAGPipeline:
     """Simplified RAG pipeline with basic retrieval and generation."""
     
-    def __init__(self, vector_store, llm_manager):
+    def __init__(
+        self,
+        vector_store,
+        llm_manager,
+        owner_id: Optional[int] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        multi_query: bool = False,
+        expansion_timeout: float = QUERY_EXPANSION_TIMEOUT
+    ):
         """
         Initialize with pre-configured components.
         
         Args:
             vector_store: our VectorStore instance from embeddings.py
             llm_manager: our LLMManager instance from llm.py
+            owner_id: Library owner, scope of cached answers
+            answer_cache: Semantic answer cache (None, or no owner: disabled)
+            multi_query: Also search LLM rephrasings of the question (fused with RRF)
+            expansion_timeout: Max seconds spent waiting for the rephrasings
         """
         self.vector_store = vector_store
         self.llm_manager = llm_manager
-        self.chain = self._setup_simple_chain()
+        self.owner_id = owner_id
+        self.answer_cache = answer_cache
+        self.multi_query = (
+            MultiQueryRetriever(self._search, llm_manager, expansion_timeout) if multi_query else None
+        )
+        self.last_timings: Dict[str, Optional[float]] = {}
 
-    def _setup_simple_chain(self):
-        """Build minimal RAG chain without advanced retrieval."""
-        try:
-            return (
-                {"context": self._retrieve_context, "question": RunnablePassthrough()}
-                | self.llm_manager._get_rag_prompt()
-                | self.llm_manager.llm
-                | StrOutputParser()
-            )
-        except Exception as e:
-            logger.error(f"Failed to setup chain: {e}")
-            raise RuntimeError("Chain initialization error")
+    def _search(self, query: str, k: int):
+        return self.vector_store.similarity_search(query, k=k)
 
     def _retrieve_context(self, question: str):
-        """Basic retrieval using your existing vector store."""
+        """Basic retrieval using your existing vector store (multi-query if enabled)."""
         try:
+            if self.multi_query is not None:
+                return self.multi_query.search(question, k=4)
             return self.vector_store.similarity_search(question, k=4)
         except Exception:
             # if the vectore database is not initiated
             return []
 
+    def _cached_query(self, question: str) -> Optional[CachedQuery]:
+        if self.answer_cache is None or self.owner_id is None:
+            return None
+        return self.answer_cache.query(
+            self.owner_id,
+            self.llm_manager.model_name,
+            question,
+            self.vector_store.embeddings.embed_query(question)
+        )
+
     def get_response(self, question: str) -> str:
         """
         Get answer to user question.
+        - if a similar question was answered on this library -> cached answer
         - if non doc is available/return -> general responce
         - else -> RAG (chain exist)
         """
         try:
+            cached = self._cached_query(question)
+            if cached is not None and cached.get() is not None:
+                return cached.get()
+
             docs = self._retrieve_context(question)
             if not docs:   # simple fallback
                 return self.llm_manager.generate_general(question, max_tokens=600)
 
             logger.info(f"Processing question: {question[:50]}...")
-            return self.chain.invoke(question)
+            # Through LLMManager so the call waits on the shared limiter
+            return self.llm_manager.generate_answer(docs, question, cache=cached)
 
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
-            raise RuntimeError("Please check your input and try again")
\ No newline at end of file
+            raise RuntimeError("Please check your input and try again")
+
+    async def aget_response(self, question: str) -> str:
+        """
+        Async variant of get_response, for serving many users from one event loop.
+        Cache lookup and retrieval (embedding, SQLite, Chroma) run in worker
+        threads; generation uses ainvoke behind the shared Ollama limiter.
+        self.last_timings separates the queue wait from inference.
+        """
+        try:
+            t0 = time.perf_counter()
+            cached = await asyncio.to_thread(self._lookup, question)
+            if cached is not None and cached.get() is not None:
+                self.last_timings = {"answer_cache": "hit"}
+                return cached.get()
+
+            docs = await asyncio.to_thread(self._retrieve_context, question)
+            t1 = time.perf_counter()
+            if not docs:
+                answer = await self.llm_manager.agenerate_general(question, max_tokens=600)
+            else:
+                logger.info(f"Processing question: {question[:50]}...")
+                answer = await self.llm_manager.agenerate_answer(docs, question, cache=cached)
+            self._record_timings(t0, t1)
+            return answer
+
+        except Exception as e:
+            logger.error(f"Response generation failed: {e}")
+            raise RuntimeError("Please check your input and try again")
+
+    async def astream_response(self, question: str) -> TimedStream:
+        """
+        Async variant of stream_response; iterate the result with `async for`.
+        Its timings() report queue_ms apart from ttft_ms / generation_ms.
+        """
+        cached = await asyncio.to_thread(self._lookup, question)
+        if cached is not None and cached.get() is not None:
+            return self.llm_manager.astream_answer([], question, cache=cached)
+
+        docs = await asyncio.to_thread(self._retrieve_context, question)
+        if not docs:
+            return self.llm_manager.astream_general(question, max_tokens=600)
+
+        logger.info(f"Streaming answer to: {question[:50]}...")
+        return self.llm_manager.astream_answer(docs, question, cache=cached)
+
+    def _lookup(self, question: str) -> Optional[CachedQuery]:
+        """Cache entry of the question with its lookup done (blocking I/O)."""
+        cached = self._cached_query(question)
+        if cached is not None:
+            cached.get()
+        return cached
+
+    def _record_timings(self, start: float, generation_start: float) -> None:
+        queue_ms = self.llm_manager.last_queue_ms or 0.0
+        generation_ms = (time.perf_counter() - generation_start) * 1000
+        self.last_timings = {
+            "retrieval_ms": round((generation_start - start) * 1000, 1),
+            "queue_ms": queue_ms,
+            "inference_ms": round(generation_ms - queue_ms, 1),
+        }
+        logger.info(f"Async response: {self.last_timings}")
+
+    def stream_response(self, question: str) -> TimedStream:
+        """
+        Streaming variant of get_response (same RAG / general fallback).
+
+        Returns:
+            TimedStream of answer pieces, e.g. for st.write_stream
+        """
+        cached = self._cached_query(question)
+        if cached is not None and cached.get() is not None:
+            return TimedStream([cached.get()])
+
+        docs = self._retrieve_context(question)
+        if not docs:
+            return self.llm_manager.stream_general(question, max_tokens=600)
+
+        logger.info(f"Streaming answer to: {question[:50]}...")
+        return self.llm_manager.stream_answer(docs, question, cache=cached)
@@ -0,0 +1,200 @@
+"""
+Hybrid retrieval: dense vectors and BM25 fused with reciprocal rank fusion.
+Multi-query retrieval: LLM rephrasings of the question searched concurrently
+and fused the same way.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.documents import Document as LangchainDocument
+from core.bm25 import BM25Index
+from core.cache import MemoryLRUCache, get_query_expansion_cache
+from core.embeddings import similarity_search_where
+
+logger = logging.getLogger(__name__)
+
+# Longest wait (seconds) for the LLM expansion before searching with the question alone
+QUERY_EXPANSION_TIMEOUT = float(os.getenv("QUERY_EXPANSION_TIMEOUT", "2.0"))
+
+# Expansions run off the request thread so they can be time-boxed
+_expansion_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-expansion")
+
+
+def _doc_key(doc: LangchainDocument) -> str:
+    # Chroma does not return ids with its hits; identical chunks share their text
+    return doc.id or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[LangchainDocument]],
+    k: int,
+    rrf_k: int = 60
+) -> List[LangchainDocument]:
+    """
+    Merge ranked lists: score(d) = sum over lists of 1 / (rrf_k + rank).
+
+    Args:
+        rankings: Result lists, best first
+        k: Number of documents to return
+        rrf_k: Damping constant (60 in the original RRF paper)
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, LangchainDocument] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+class HybridRetriever:
+    """Dense + BM25 retrieval with per-stage timings."""
+
+    def __init__(
+        self,
+        vector_db,
+        bm25: Optional[BM25Index],
+        fetch_factor: int = 4,
+        rrf_k: int = 60
+    ):
+        """
+        Args:
+            vector_db: Any store with similarity_search(query, k) (Chroma, NumpyVectorIndex)
+            bm25: Lexical index of the same chunks (None: dense only)
+            fetch_factor: Candidates taken from each stage, as a multiple of k
+            rrf_k: Reciprocal rank fusion constant
+        """
+        self.vector_db = vector_db
+        self.bm25 = bm25
+        self.fetch_factor = fetch_factor
+        self.rrf_k = rrf_k
+        self.last_timings: Dict[str, float] = {}
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        where: Optional[Dict[str, Any]] = None,
+        include_ids: Optional[List[str]] = None
+    ) -> List[LangchainDocument]:
+        """
+        Fused top-k; stage timings (ms) are kept in self.last_timings.
+        `where` (metadata filter) is pushed down to both stages; `include_ids`
+        (dedup canonicals of a scoped document) are candidates in both too.
+        """
+        fetch_k = k * self.fetch_factor
+        timings: Dict[str, float] = {}
+
+        t0 = time.perf_counter()
+        dense = (
+            similarity_search_where(self.vector_db, query, fetch_k, where, include_ids)
+            if self.vector_db else []
+        )
+        timings["dense_ms"] = (time.perf_counter() - t0) * 1000
+
+        lexical: List[LangchainDocument] = []
+        if self.bm25 is not None:
+            t0 = time.perf_counter()
+            lexical = [doc for doc, _ in self.bm25.search(query, k=fetch_k, where=where, include_ids=include_ids)]
+            timings["bm25_ms"] = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        fused = reciprocal_rank_fusion([dense, lexical], k, self.rrf_k) if lexical else dense[:k]
+        timings["fusion_ms"] = (time.perf_counter() - t0) * 1000
+
+        self.last_timings = {name: round(ms, 2) for name, ms in timings.items()}
+        logger.info(f"Hybrid retrieval: {len(dense)} dense, {len(lexical)} bm25 -> {len(fused)} ({self.last_timings})")
+        return fused
+
+
+class MultiQueryRetriever:
+    """
+    Searches the question and its LLM rephrasings (LLMManager.expand_query)
+    concurrently, then fuses the rankings with RRF.
+
+    The expansion is cached per (model, question) and time-boxed: past
+    `expansion_timeout` the question is searched alone and the expansion is
+    dropped (its stream closed), so it never holds a limiter slot or Ollama
+    CPU while the answer is generated. It is also skipped when no limiter
+    slot is free. Trade-off: a dropped expansion fills no cache entry, so a
+    question whose expansion is always slower than the budget is always
+    searched alone.
+    """
+
+    def __init__(
+        self,
+        search: Callable[[str, int], List[LangchainDocument]],
+        llm_manager,
+        expansion_timeout: float = QUERY_EXPANSION_TIMEOUT,
+        fetch_factor: int = 2,
+        rrf_k: int = 60,
+        cache: Optional[MemoryLRUCache] = None
+    ):
+        """
+        Args:
+            search: Single-query search, e.g. VectorStore.similarity_search or HybridRetriever.search
+            llm_manager: LLMManager providing expand_query
+            expansion_timeout: Seconds to wait for the expansion
+            fetch_factor: Candidates taken per variant, as a multiple of k
+            rrf_k: Reciprocal rank fusion constant
+            cache: Expansion cache (default: process-wide)
+        """
+        self.search_fn = search
+        self.llm_manager = llm_manager
+        self.expansion_timeout = expansion_timeout
+        self.fetch_factor = fetch_factor
+        self.rrf_k = rrf_k
+        self.cache = cache or get_query_expansion_cache()
+        self.last_timings: Dict[str, Any] = {}
+
+    def expand(self, query: str) -> List[str]:
+        """Question plus its rephrasings; the question alone on timeout or failure."""
+        model = getattr(self.llm_manager, "model_name", "")
+        cached = self.cache.get(model, query)
+        if cached is not None:
+            self.last_timings["expansion"] = "cached"
+            return cached
+
+        def _store(fut) -> None:
+            if not fut.exception() and len(fut.result()) > 1:
+                self.cache.put(model, query, fut.result())
+
+        cancel = threading.Event()
+        future = _expansion_pool.submit(self.llm_manager.expand_query, query, cancel)
+        future.add_done_callback(_store)
+        try:
+            variants = future.result(timeout=self.expansion_timeout)
+            self.last_timings["expansion"] = "llm" if len(variants) > 1 else "skipped"
+            return variants
+        except FutureTimeout:
+            cancel.set()
+            logger.info(f"Query expansion exceeded {self.expansion_timeout}s, searching the question alone")
+            self.last_timings["expansion"] = "timeout"
+            return [query]
+
+    def search(self, query: str, k: int = 4) -> List[LangchainDocument]:
+        """Fused top-k over all variants; timings kept in self.last_timings."""
+        self.last_timings = {}
+        fetch_k = k * self.fetch_factor
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="multi-query") as pool:
+            # The question itself is searched while the expansion is generated
+            original = pool.submit(self.search_fn, query, fetch_k)
+            variants = self.expand(query)
+            self.last_timings["expansion_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            others = [pool.submit(self.search_fn, v, fetch_k) for v in variants if v != query]
+            rankings = [original.result()] + [f.result() for f in others]
+        self.last_timings["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        t0 = time.perf_counter()
+        fused = reciprocal_rank_fusion(rankings, k, self.rrf_k)
+        self.last_timings["fusion_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        self.last_timings["variants"] = len(variants)
+        logger.info(f"Multi-query retrieval: {len(variants)} variants -> {len(fused)} ({self.last_timings})")
+        return fused
@@ -0,0 +1,162 @@
+"""
+Token accounting and token-aware text splitting.
+Sizes chunks from the model's context budget instead of a fixed character count.
+"""
+import copy
+import re
+from typing import List, Optional, Tuple
+from langchain_text_splitters import TextSplitter
+from langchain_core.documents import Document as LangchainDocument
+
+# CJK scripts (kana, ideographs, hangul): about one BPE token per character
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+# One match per estimated token: CJK characters one by one, digits in groups
+# of 3 (as the Llama 3 pre-tokenizer splits them), other words cut every
+# 6 characters (long words cost several BPE tokens), each punctuation mark one
+_TOKEN = re.compile(rf"[{_CJK}]|\d{{1,3}}|[^\W\d{_CJK}]{{1,6}}|[^\w\s]")
+_SENTENCE_END = ".!?;:"
+
+# Share of num_ctx budgeted with the estimate. count_tokens stays a heuristic:
+# on mixed text it can undercount the real tokenizer by up to ~10%, and an
+# overflowing prompt is silently truncated by Ollama, so 10% is kept spare.
+TOKEN_SAFETY_MARGIN = 0.9
+
+
+def count_tokens(text: str) -> int:
+    """
+    Fast token estimate for Llama-style BPE vocabularies.
+    No tokenizer round-trip to Ollama: a single regex pass in C.
+    """
+    return len(_TOKEN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Longest prefix of text within max_tokens (estimated), cut after the last
+    sentence end of its second half when there is one.
+    """
+    spans = [m.end() for m in _TOKEN.finditer(text)]
+    if len(spans) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    cut = spans[max_tokens - 1]
+    floor = spans[max_tokens // 2]
+    for pos in range(cut, floor, -1):
+        if text[pos - 1] in _SENTENCE_END:
+            return text[:pos]
+    return text[:cut]
+
+
+def usable_context(num_ctx: int) -> int:
+    """Estimated tokens that safely fit in a num_ctx window (see TOKEN_SAFETY_MARGIN)."""
+    return int(num_ctx * TOKEN_SAFETY_MARGIN)
+
+
+def chunk_budget(
+    num_ctx: int,
+    k: int,
+    prompt_tokens: int,
+    answer_tokens: int = 256,
+    min_tokens: int = 64
+) -> int:
+    """
+    Largest chunk (in tokens) such that k retrieved chunks, the prompt
+    template and the answer all fit in the model's context window, less
+    the estimator's safety margin.
+
+    Args:
+        num_ctx: Model context window (Ollama num_ctx)
+        k: Number of chunks retrieved per question
+        prompt_tokens: Template + question overhead
+        answer_tokens: Room kept for the generated answer
+        min_tokens: Floor, so tiny windows still produce usable chunks
+    """
+    available = usable_context(num_ctx) - prompt_tokens - answer_tokens
+    return max(min_tokens, available // max(k, 1))
+
+
+class TokenTextSplitter(TextSplitter):
+    """
+    Single-pass, token-budgeted splitter that keeps character offsets.
+
+    Text is scanned once into estimated-token spans; each chunk takes as many
+    tokens as the budget allows and then backs off to the best break in its
+    second half (paragraph > sentence > line > word).
+    """
+
+    def __init__(self, chunk_size: int = 512, chunk_overlap: int = 48, **kwargs):
+        """
+        Args:
+            chunk_size: Maximum tokens per chunk
+            chunk_overlap: Tokens repeated at the start of the next chunk
+        """
+        kwargs.setdefault("length_function", count_tokens)
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for _, chunk in self.split_with_offsets(text)]
+
+    def split_with_offsets(self, text: str) -> List[Tuple[int, str]]:
+        """Return (start_index, chunk_text) pairs."""
+        spans = [m.span() for m in _TOKEN.finditer(text)]
+        starts = [a for a, _ in spans]
+        ends = [b for _, b in spans]
+        n = len(spans)
+        out = []
+        i = 0
+        while i < n:
+            # One span per token: the budget is a plain index distance
+            j = min(i + self._chunk_size, n)
+            if j < n:
+                j = self._best_break(text, starts, ends, i, j)
+            out.append((starts[i], text[starts[i]:ends[j - 1]]))
+            if j >= n:
+                break
+            # Next chunk starts `chunk_overlap` tokens before this one ended,
+            # on a word start rather than inside a word or on punctuation
+            nxt = max(j - self._chunk_overlap, i + 1)
+            while nxt < j - 1 and not (
+                text[starts[nxt]].isalnum() and (starts[nxt] == 0 or not text[starts[nxt] - 1].isalnum())
+            ):
+                nxt += 1
+            i = nxt
+        return out
+
+    @staticmethod
+    def _best_break(text: str, starts: List[int], ends: List[int], i: int, j: int) -> int:
+        """Pick the end piece index in (i + (j-i)//2, j] with the strongest break."""
+        best, best_score = j, 0
+        floor = i + max(1, (j - i) // 2)
+        for m in range(j, floor, -1):
+            gap = text[ends[m - 1]:starts[m]]
+            if "\n\n" in gap:
+                score = 4
+            elif gap and text[ends[m - 1] - 1] in _SENTENCE_END:
+                score = 3
+            elif "\n" in gap:
+                score = 2
+            elif gap:
+                score = 1
+            else:
+                score = 0
+            if score > best_score:
+                best, best_score = m, score
+                if score == 4:
+                    break
+        return best
+
+    def create_documents(
+        self,
+        texts: List[str],
+        metadatas: Optional[List[dict]] = None
+    ) -> List[LangchainDocument]:
+        """Like TextSplitter.create_documents, with exact `start_index` offsets."""
+        _metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, meta in zip(texts, _metadatas):
+            for start, chunk in self.split_with_offsets(text):
+                metadata = copy.deepcopy(meta)
+                metadata["start_index"] = start
+                documents.append(LangchainDocument(page_content=chunk, metadata=metadata))
+        return documents
@@ -0,0 +1,788 @@
+"""
+In-process exact vector index backed by a memory-mapped NumPy matrix.
+A lighter alternative to Chroma for libraries of a few thousand chunks:
+no client, no server, the OS page cache holds the vectors.
+Optionally keeps only int8 codes in memory and re-scores a shortlist
+with the full-precision vectors on disk, and/or restricts the scan to the
+closest IVF cells for approximate search on large shared indexes.
+"""
+import json
+import math
+import logging
+import os
+import shutil
+import threading
+import uuid
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore as LangchainVectorStore
+
+logger = logging.getLogger(__name__)
+
+# Metadata keys with an in-memory row index, so filters on them skip the scan
+INDEXED_FIELDS = ("doc_id", "owner_id", "file_type")
+
+INDEX_FILES = ("vectors.bin", "rows.jsonl", "deleted.jsonl", "index.json",
+               "codes.bin", "scales.bin", "ivf_centroids.npy", "ivf_labels.bin")
+
+_RANGE_OPS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _condition_matches(value: Any, cond: Any) -> bool:
+    if not isinstance(cond, dict):
+        return value == cond
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = value == arg
+        elif op == "$ne":
+            ok = value != arg
+        elif op == "$in":
+            ok = value in arg
+        elif op == "$nin":
+            ok = value not in arg
+        elif op in _RANGE_OPS:
+            ok = value is not None and _RANGE_OPS[op](value, arg)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def metadata_matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """
+    True if metadata satisfies every condition of `where`.
+
+    A condition is a plain value (equality) or a dict of operators:
+    $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, e.g.
+    {"doc_id": 12, "page": {"$gte": 3, "$lte": 7}}.
+    """
+    return all(_condition_matches(metadata.get(key), cond) for key, cond in where.items())
+
+
+def equality_values(cond: Any) -> Optional[List[Any]]:
+    """Values a condition can only be equal to ($eq, $in, plain value), else None."""
+    if not isinstance(cond, dict):
+        return [cond]
+    if set(cond) == {"$eq"}:
+        return [cond["$eq"]]
+    if set(cond) == {"$in"}:
+        return list(cond["$in"])
+    return None
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization: v ~= codes * scale.
+
+    Returns:
+        (codes int8 (n, dim), scales float32 (n,))
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class IVFLists:
+    """
+    Inverted file partition: spherical k-means centroids and, per centroid,
+    the rows assigned to it. New rows join their nearest centroid; the
+    caller retrains when the index has grown enough to unbalance the cells.
+    """
+
+    def __init__(self, nlist: Optional[int] = None, iterations: int = 8, seed: int = 0):
+        """
+        Args:
+            nlist: Number of cells (None: sqrt(rows) at training time)
+            iterations: k-means iterations
+            seed: Sampling/initialization seed
+        """
+        self.nlist = nlist
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self._lists: List[array] = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, sample: np.ndarray, total_rows: int) -> None:
+        """Fit centroids on a float32 sample of normalized vectors."""
+        nlist = self.nlist or int(math.sqrt(total_rows))
+        nlist = max(1, min(nlist, 4096, len(sample)))
+        rng = np.random.RandomState(self.seed)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # Empty cells restart from random points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms == 0, 1, norms)
+        self.centroids = centroids.astype(np.float32)
+        self.trained_rows = total_rows
+        self._lists = [array("q") for _ in range(nlist)]
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, batch: int = 4096) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch):
+            block = np.asarray(vectors[start:start + batch], dtype=np.float32)
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        return self._nearest(vectors, self.centroids)
+
+    def add(self, labels: np.ndarray, start_row: int) -> None:
+        for offset, label in enumerate(labels.tolist()):
+            self._lists[label].append(start_row + offset)
+
+    def set_labels(self, labels: np.ndarray) -> None:
+        """Rebuild every list from the label of each row."""
+        self._lists = [array("q") for _ in range(len(self.centroids))]
+        self.add(labels, 0)
+
+    def probe(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted rows of the `nprobe` cells closest to q."""
+        nprobe = min(nprobe, len(self.centroids))
+        cells = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        parts = [np.frombuffer(self._lists[c], dtype=np.int64) for c in cells if len(self._lists[c])]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+
+class NumpyVectorIndex(LangchainVectorStore):
+    """
+    Exact top-k cosine search over normalized vectors.
+
+    Three append-only files under the current generation of `persist_dir`:
+    - vectors.bin   : rows of `dim` float32/float16 values, L2-normalized
+    - rows.jsonl    : one JSON line per row (id, text, metadata)
+    - deleted.jsonl : row numbers removed since the last compaction
+    Re-adding an existing id deletes its old row (upsert, like Chroma).
+    Compaction writes a new generation directory (g1, g2, ...) and switches
+    the CURRENT file to it with one rename, so a crash leaves either the old
+    or the new files, never a mix. Indexes written before generations keep
+    their files in `persist_dir` itself until their first compaction.
+
+    Searches accept a metadata `filter` (see metadata_matches). Rows of each
+    doc_id / owner_id / file_type value are indexed in memory, so a filter on
+    them scores only the matching rows, whatever the size of the index.
+
+    With quantization="int8", codes.bin/scales.bin hold an int8 copy that is
+    loaded in memory (a quarter of float32) and scored first; the best
+    `rescore_factor * k` candidates are then re-scored exactly from vectors.bin.
+
+    With ann="ivf", once the index holds `ann_min_rows` rows, a query only scores
+    the rows of its `nprobe` closest cells (ivf_centroids.npy, ivf_labels.bin):
+    about nprobe * sqrt(n) rows instead of n. Cells are retrained when the
+    index has grown `ann_retrain_growth` times since the last training.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        persist_dir: Optional[str] = None,
+        dtype: str = "float32",
+        score_batch_rows: int = 4096,
+        quantization: Optional[str] = None,
+        rescore_factor: int = 4,
+        ann: Optional[str] = None,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        ann_min_rows: int = 4096,
+        ann_retrain_growth: float = 4.0
+    ):
+        """
+        Args:
+            embedding_function: Embeddings used for documents and queries
+            persist_dir: Directory holding the index files (None: in memory only)
+            dtype: Storage type of the matrix, "float32" or "float16"
+            score_batch_rows: Rows scored per matrix-vector product
+            quantization: None (exact scan) or "int8" (compressed scan + re-scoring)
+            rescore_factor: Shortlist size as a multiple of k when quantized
+            ann: None (exhaustive) or "ivf" (inverted file, approximate)
+            nlist: IVF cells (None: sqrt of the row count at training time)
+            nprobe: IVF cells scanned per query (recall/latency knob)
+            ann_min_rows: Rows needed before the IVF partition is trained
+            ann_retrain_growth: Retrain once rows exceed this multiple of the last training
+        """
+        if quantization not in (None, "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        if ann not in (None, "ivf"):
+            raise ValueError(f"Unsupported ANN mode: {ann}")
+        self._embedding = embedding_function
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self.dtype = np.dtype(dtype)
+        self.score_batch_rows = score_batch_rows
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.ann = ann
+        self.nprobe = nprobe
+        self.ann_min_rows = ann_min_rows
+        self.ann_retrain_growth = ann_retrain_growth
+        self._ivf = IVFLists(nlist) if ann else None
+        self.dim: Optional[int] = None
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of: Dict[str, int] = {}
+        # field -> value -> rows (deleted rows included until compaction)
+        self._field_rows: Dict[str, Dict[Any, array]] = {f: {} for f in INDEXED_FIELDS}
+        self._memory: Optional[np.ndarray] = None   # in-memory matrix when not persisted
+        self._mm: Optional[np.ndarray] = None
+        # int8 codes with spare capacity, so appends do not copy the whole matrix
+        self._codes = np.zeros((0, 0), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._lock = threading.RLock()
+        self._generation = ""
+        if self.persist_dir:
+            self.persist_dir.mkdir(parents=True, exist_ok=True)
+            self._open_generation()
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # ---- Files ----
+    def _path(self, name: str) -> Path:
+        return self.persist_dir / self._generation / name
+
+    def _open_generation(self) -> None:
+        """Read CURRENT and remove what an interrupted or finished compaction left."""
+        current = self.persist_dir / "CURRENT"
+        if not current.exists():
+            return
+        self._generation = current.read_text(encoding="utf-8").strip()
+        for name in INDEX_FILES:
+            (self.persist_dir / name).unlink(missing_ok=True)
+        for p in self.persist_dir.glob("g*"):
+            if p.is_dir() and p.name != self._generation:
+                shutil.rmtree(p, ignore_errors=True)
+        (self.persist_dir / "CURRENT.tmp").unlink(missing_ok=True)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        """Whether an index was persisted in `persist_dir` (any generation)."""
+        root = Path(persist_dir)
+        current = root / "CURRENT"
+        generation = current.read_text(encoding="utf-8").strip() if current.exists() else ""
+        return (root / generation / "index.json").exists()
+
+    @staticmethod
+    def _write_synced(path: Path, data: bytes) -> None:
+        with open(path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load(self) -> None:
+        meta_file = self._path("index.json")
+        if not meta_file.exists():
+            return
+        info = json.loads(meta_file.read_text(encoding="utf-8"))
+        self.dim, self.dtype = info["dim"], np.dtype(info["dtype"])
+        row_bytes = self.dim * self.dtype.itemsize
+        n_vectors = self._path("vectors.bin").stat().st_size // row_bytes
+        with open(self._path("rows.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                if len(self._ids) == n_vectors:
+                    break   # rows written after their vectors; ignore a torn tail
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    break
+                self._ids.append(row["id"])
+                self._texts.append(row["text"])
+                self._metas.append(row["metadata"])
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        deleted = self._path("deleted.jsonl")
+        if deleted.exists():
+            for line in deleted.read_text(encoding="utf-8").split():
+                if int(line) < len(self._alive):
+                    self._alive[int(line)] = False
+        self._row_of = {i: r for r, i in enumerate(self._ids) if self._alive[r]}
+        self._index_fields(0)
+        if self.quantization:
+            self._load_codes()
+        if self.ann:
+            self._load_ivf()
+        logger.info(f"Loaded vector index {self.persist_dir}: {len(self._row_of)} vectors")
+
+    def _load_codes(self) -> None:
+        n = len(self._ids)
+        codes_file, scales_file = self._path("codes.bin"), self._path("scales.bin")
+        if (codes_file.exists() and scales_file.exists()
+                and codes_file.stat().st_size == n * self.dim and scales_file.stat().st_size == 4 * n):
+            codes = np.fromfile(codes_file, dtype=np.int8).reshape(n, self.dim)
+            self._set_codes(codes, np.fromfile(scales_file, dtype=np.float32))
+            return
+        # Missing or stale (e.g. index created unquantized): rebuild from the vectors
+        logger.info(f"Building int8 codes for {self.persist_dir}")
+        matrix = self._matrix()
+        parts = [quantize_int8(matrix[i:i + self.score_batch_rows]) for i in range(0, n, self.score_batch_rows)]
+        codes = np.concatenate([p[0] for p in parts]) if parts else np.zeros((0, self.dim), np.int8)
+        scales = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, np.float32)
+        codes.tofile(codes_file)
+        scales.tofile(scales_file)
+        self._set_codes(codes, scales)
+
+    def _load_ivf(self) -> None:
+        n = len(self._ids)
+        centroids_file, labels_file = self._path("ivf_centroids.npy"), self._path("ivf_labels.bin")
+        if centroids_file.exists() and labels_file.exists() and labels_file.stat().st_size == 4 * n:
+            self._ivf.centroids = np.load(centroids_file)
+            self._ivf.trained_rows = n
+            self._ivf.set_labels(np.fromfile(labels_file, dtype=np.int32))
+        elif n >= self.ann_min_rows:
+            self._train_ivf()
+
+    def _train_ivf(self) -> None:
+        """(Re)build the IVF cells over every stored row; caller holds the lock."""
+        matrix = self._matrix()
+        n = matrix.shape[0]
+        alive = np.flatnonzero(self._alive)
+        if not len(alive):
+            return
+        rng = np.random.RandomState(0)
+        sample_rows = np.sort(rng.choice(alive, min(len(alive), 65536), replace=False))
+        self._ivf.train(np.asarray(matrix[sample_rows], dtype=np.float32), len(alive))
+        labels = self._ivf.assign(matrix)
+        self._ivf.set_labels(labels)
+        if self.persist_dir:
+            np.save(self._path("ivf_centroids.npy"), self._ivf.centroids)
+            labels.tofile(self._path("ivf_labels.bin"))
+        logger.info(f"Trained IVF index: {len(self._ivf.centroids)} cells over {n} rows")
+
+    def _drop_ivf_files(self) -> None:
+        for name in ("ivf_centroids.npy", "ivf_labels.bin"):
+            self._path(name).unlink(missing_ok=True)
+
+    def _set_codes(self, codes: np.ndarray, scales: np.ndarray) -> None:
+        self._codes = np.array(codes, dtype=np.int8)
+        self._scales = np.array(scales, dtype=np.float32)
+
+    def _append_codes(self, codes: np.ndarray, scales: np.ndarray) -> None:
+        n = len(self._ids)
+        if self._codes.shape[1] != codes.shape[1]:
+            self._codes = np.zeros((0, codes.shape[1]), dtype=np.int8)
+        if n + len(codes) > len(self._codes):
+            capacity = max(n + len(codes), 2 * len(self._codes), 1024)
+            grown = np.zeros((capacity, codes.shape[1]), dtype=np.int8)
+            grown[:n] = self._codes[:n]
+            grown_scales = np.zeros(capacity, dtype=np.float32)
+            grown_scales[:n] = self._scales[:n]
+            self._codes, self._scales = grown, grown_scales
+        self._codes[n:n + len(codes)] = codes
+        self._scales[n:n + len(codes)] = scales
+
+    def memory_bytes(self) -> int:
+        """Bytes the scan keeps resident: int8 codes, or the whole matrix."""
+        n = len(self._ids)
+        if self.quantization:
+            return n * (self.dim or 0) + 4 * n
+        return n * (self.dim or 0) * self.dtype.itemsize
+
+    def _matrix(self) -> np.ndarray:
+        """Current rows as an (n, dim) array: memory-mapped when persisted."""
+        n = len(self._ids)
+        if self.persist_dir is None:
+            return self._memory if self._memory is not None else np.zeros((0, self.dim or 0), self.dtype)
+        if self._mm is None or self._mm.shape[0] != n:
+            self._mm = (
+                np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r", shape=(n, self.dim))
+                if n else np.zeros((0, self.dim or 0), self.dtype)
+            )
+        return self._mm
+
+    # ---- Writes ----
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [i or str(uuid.uuid4()) for i in (ids or [None] * len(texts))]
+        vectors = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms == 0, 1, norms)).astype(self.dtype)
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                if self.persist_dir:
+                    self._path("index.json").write_text(
+                        json.dumps({"dim": self.dim, "dtype": self.dtype.name}), encoding="utf-8"
+                    )
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != index dimension {self.dim}")
+
+            self._delete_rows([self._row_of[i] for i in ids if i in self._row_of])
+            start = len(self._ids)
+            if self.quantization:
+                codes, scales = quantize_int8(vectors)
+            if self.persist_dir:
+                # Vectors first: a crash leaves extra vectors, never rows without one
+                with open(self._path("vectors.bin"), "ab") as f:
+                    f.write(vectors.tobytes())
+                if self.quantization:
+                    with open(self._path("codes.bin"), "ab") as f:
+                        f.write(codes.tobytes())
+                    with open(self._path("scales.bin"), "ab") as f:
+                        f.write(scales.tobytes())
+                else:
+                    self._drop_codes_files()
+                if not self.ann:
+                    self._drop_ivf_files()
+                with open(self._path("rows.jsonl"), "a", encoding="utf-8") as f:
+                    for i, t, m in zip(ids, texts, metadatas):
+                        f.write(json.dumps({"id": i, "text": t, "metadata": m}, default=str) + "\n")
+            else:
+                self._memory = vectors if self._memory is None else np.vstack([self._memory, vectors])
+            if self.quantization:
+                self._append_codes(codes, scales)
+            self._ids.extend(ids)
+            self._texts.extend(texts)
+            self._metas.extend(dict(m) for m in metadatas)
+            self._index_fields(start)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for offset, i in enumerate(ids):
+                self._row_of[i] = start + offset
+            if self.ann:
+                self._index_new_rows(vectors, start)
+        return ids
+
+    def _index_fields(self, start: int) -> None:
+        """Add rows from `start` to the per-value row lists of INDEXED_FIELDS."""
+        for r in range(start, len(self._metas)):
+            meta = self._metas[r]
+            for field in INDEXED_FIELDS:
+                value = meta.get(field)
+                if value is not None and not isinstance(value, (list, dict)):
+                    self._field_rows[field].setdefault(value, array("q")).append(r)
+
+    def _index_new_rows(self, vectors: np.ndarray, start: int) -> None:
+        live = len(self._row_of)
+        if not self._ivf.trained:
+            if live >= self.ann_min_rows:
+                self._train_ivf()
+        elif live >= self.ann_retrain_growth * self._ivf.trained_rows:
+            self._train_ivf()
+        else:
+            labels = self._ivf.assign(vectors)
+            self._ivf.add(labels, start)
+            if self.persist_dir:
+                with open(self._path("ivf_labels.bin"), "ab") as f:
+                    f.write(labels.tobytes())
+
+    def add_documents(self, documents: List[LangchainDocument], **kwargs: Any) -> List[str]:
+        return self.add_texts(
+            [d.page_content for d in documents],
+            metadatas=[d.metadata for d in documents],
+            ids=[d.id for d in documents],
+        )
+
+    def _delete_rows(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        for r in rows:
+            self._alive[r] = False
+            self._row_of.pop(self._ids[r], None)
+        if self.persist_dir:
+            with open(self._path("deleted.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(f"{r}\n" for r in rows))
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        with self._lock:
+            self._delete_rows([self._row_of[i] for i in ids or [] if i in self._row_of])
+        return True
+
+    def get_ids(self, where: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Ids of live rows whose metadata matches `where` (see metadata_matches)."""
+        with self._lock:
+            if not where:
+                return list(self._row_of)
+            return [self._ids[r] for r in self._filter_rows(where)]
+
+    def _filter_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        """
+        Sorted live rows matching `where`. Equality conditions on indexed
+        fields select the candidate rows; only those are checked in full.
+        """
+        candidates: Optional[np.ndarray] = None
+        for field in INDEXED_FIELDS:
+            values = equality_values(where[field]) if field in where else None
+            if values is None:
+                continue
+            lists = [self._field_rows[field].get(v) for v in values]
+            parts = [np.frombuffer(rows, dtype=np.int64) for rows in lists if rows]
+            rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+        if candidates is None:
+            candidates = np.arange(len(self._ids), dtype=np.int64)
+        candidates = candidates[self._alive[candidates]]
+        return np.asarray(
+            [r for r in candidates if metadata_matches(self._metas[r], where)], dtype=np.int64
+        )
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts and sizes from the in-memory bookkeeping (no scan)."""
+        with self._lock:
+            per_doc = {}
+            for doc_id, rows in self._field_rows["doc_id"].items():
+                live = int(self._alive[np.frombuffer(rows, dtype=np.int64)].sum())
+                if live:
+                    per_doc[doc_id] = live
+            size = (
+                sum(p.stat().st_size for p in self._path("").iterdir() if p.is_file())
+                if self.persist_dir else self.memory_bytes()
+            )
+            return {
+                "count": self.count(),
+                "deleted": self.deleted_count(),
+                "dimensions": self.dim,
+                "bytes": size,
+                "resident_bytes": self.memory_bytes(),
+                "per_doc": per_doc,
+            }
+
+    def deleted_count(self) -> int:
+        return len(self._ids) - len(self._row_of)
+
+    def compact(self) -> None:
+        """Rewrite the files without deleted rows."""
+        with self._lock:
+            keep = np.flatnonzero(self._alive)
+            matrix = np.asarray(self._matrix()[keep]) if len(keep) else np.zeros((0, self.dim or 0), self.dtype)
+            ids = [self._ids[r] for r in keep]
+            texts = [self._texts[r] for r in keep]
+            metas = [self._metas[r] for r in keep]
+            codes, scales = (self._codes[keep], self._scales[keep]) if self.quantization else (None, None)
+            # Same cells, rows renumbered
+            labels = self._ivf.assign(matrix) if self.ann and self._ivf.trained else None
+            if self.persist_dir:
+                self._write_generation(matrix, ids, texts, metas, codes, scales, labels)
+            else:
+                self._memory = matrix
+            if self.quantization:
+                self._set_codes(codes, scales)
+            self._ids, self._texts, self._metas = ids, texts, metas
+            self._alive = np.ones(len(ids), dtype=bool)
+            self._row_of = {i: r for r, i in enumerate(ids)}
+            self._field_rows = {f: {} for f in INDEXED_FIELDS}
+            self._index_fields(0)
+            if labels is not None:
+                self._ivf.set_labels(labels)
+
+    def _write_generation(
+        self,
+        matrix: np.ndarray,
+        ids: List[str],
+        texts: List[str],
+        metas: List[Dict[str, Any]],
+        codes: Optional[np.ndarray],
+        scales: Optional[np.ndarray],
+        labels: Optional[np.ndarray]
+    ) -> None:
+        """Write the compacted files to a new generation, then make it CURRENT."""
+        previous = self._generation
+        number = int(previous[1:]) + 1 if previous else 1
+        generation = f"g{number}"
+        target = self.persist_dir / generation
+        shutil.rmtree(target, ignore_errors=True)
+        target.mkdir()
+        if self.dim is not None:
+            self._write_synced(
+                target / "index.json",
+                json.dumps({"dim": self.dim, "dtype": self.dtype.name}).encode("utf-8"),
+            )
+        self._write_synced(target / "vectors.bin", matrix.tobytes())
+        self._write_synced(target / "rows.jsonl", "".join(
+            json.dumps({"id": i, "text": t, "metadata": m}, default=str) + "\n"
+            for i, t, m in zip(ids, texts, metas)
+        ).encode("utf-8"))
+        if codes is not None:
+            self._write_synced(target / "codes.bin", codes.tobytes())
+            self._write_synced(target / "scales.bin", scales.tobytes())
+        if labels is not None:
+            np.save(target / "ivf_centroids.npy", self._ivf.centroids)
+            self._write_synced(target / "ivf_labels.bin", labels.tobytes())
+
+        # The switch: one rename of the pointer file
+        tmp = self.persist_dir / "CURRENT.tmp"
+        self._write_synced(tmp, generation.encode("utf-8"))
+        os.replace(tmp, self.persist_dir / "CURRENT")
+        self._mm = None
+        self._generation = generation
+        if previous:
+            shutil.rmtree(self.persist_dir / previous, ignore_errors=True)
+        else:
+            for name in INDEX_FILES:
+                (self.persist_dir / name).unlink(missing_ok=True)
+
+    def _drop_codes_files(self) -> None:
+        # Codes written by a quantized run would no longer match the vectors
+        for name in ("codes.bin", "scales.bin"):
+            self._path(name).unlink(missing_ok=True)
+
+    def drop(self) -> None:
+        """Delete every vector and the index files."""
+        with self._lock:
+            self._mm = None
+            self._memory = None
+            self._ids, self._texts, self._metas = [], [], []
+            self._alive = np.zeros(0, dtype=bool)
+            self._row_of = {}
+            self._field_rows = {f: {} for f in INDEXED_FIELDS}
+            self._codes = np.zeros((0, 0), dtype=np.int8)
+            self._scales = np.zeros(0, dtype=np.float32)
+            if self.ann:
+                self._ivf = IVFLists(self._ivf.nlist)
+            self.dim = None
+            if self.persist_dir:
+                for name in INDEX_FILES:
+                    self._path(name).unlink(missing_ok=True)
+
+    # ---- Search ----
+    def _top_k(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[Tuple[int, float]]:
+        q = np.asarray(query_vector, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        with self._lock:
+            matrix = self._matrix()
+            n = matrix.shape[0]
+            alive = self._alive[:n].copy()
+            if self.quantization:
+                codes, scales = self._codes[:n], self._scales[:n]
+            if where or ids is not None:
+                # Filtered: only the matching rows are scored, exactly (no IVF)
+                rows = self._filter_rows(where) if where else None
+                if ids is not None:
+                    id_rows = np.asarray(sorted({self._row_of[i] for i in ids if i in self._row_of}), dtype=np.int64)
+                    rows = id_rows if rows is None else np.intersect1d(rows, id_rows, assume_unique=True)
+                rows = rows[rows < n]
+            elif self.ann and self._ivf.trained:
+                # IVF: only the rows of the closest cells are candidates
+                rows = self._ivf.probe(q, nprobe or self.nprobe)
+            else:
+                rows = None
+        if n == 0 or k <= 0:
+            return []
+        if rows is not None:
+            rows = rows[alive[rows]]
+        else:
+            rows = np.flatnonzero(alive) if not alive.all() else None
+        candidates = n if rows is None else len(rows)
+        k = min(k, candidates)
+        if k == 0:
+            return []
+
+        if not self.quantization:
+            scores = self._scan(matrix if rows is None else matrix[rows], q)
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            # Compressed scan, then exact re-scoring of the shortlist only
+            if rows is None:
+                approx = self._scan(codes, q) * scales
+            else:
+                approx = self._scan(codes[rows], q) * scales[rows]
+            m = min(max(k, self.rescore_factor * k), candidates)
+            shortlist = np.sort(np.argpartition(-approx, m - 1)[:m])
+            exact_rows = shortlist if rows is None else rows[shortlist]
+            scores = np.asarray(matrix[exact_rows], dtype=np.float32) @ q
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows = exact_rows
+        top = top[np.argsort(-scores[top])]
+        found = top if rows is None else rows[top]
+        return [(int(r), float(s)) for r, s in zip(found, scores[top])]
+
+    def _scan(self, matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], self.score_batch_rows):
+            block = matrix[start:start + self.score_batch_rows]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ q
+        return scores
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any
+    ) -> List[Tuple[LangchainDocument, float]]:
+        """(document, cosine similarity) pairs, best first."""
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[LangchainDocument, float]]:
+        """
+        `nprobe` overrides the index default for this query (IVF only);
+        `filter` restricts the scan to rows whose metadata matches it and
+        `ids` to those chunk ids (as Chroma's query(ids=...)).
+        """
+        return [
+            (LangchainDocument(page_content=self._texts[r], metadata=dict(self._metas[r]), id=self._ids[r]), s)
+            for r, s in self._top_k(np.asarray(embedding), k, nprobe=nprobe, where=filter, ids=ids)
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[LangchainDocument]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        **kwargs: Any
+    ) -> List[LangchainDocument]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_dir: Optional[str] = None,
+        **kwargs: Any
+    ) -> "NumpyVectorIndex":
+        index = cls(embedding, persist_dir=persist_dir, **kwargs)
+        index.add_texts(texts, metadatas=metadatas, ids=ids)
+        return index
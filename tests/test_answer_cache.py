@@ -0,0 +1,58 @@
+from core.answer_cache import SemanticAnswerCache
+
+
+def _cache(tmp_path, **kwargs):
+    return SemanticAnswerCache(db_path=tmp_path / "answers.sqlite3", **kwargs)
+
+
+def test_threshold_hit_and_miss(tmp_path):
+    cache = _cache(tmp_path, threshold=0.95)
+    cache.store(1, 0, "m", "q", [1.0, 0.0], "answer")
+    assert cache.lookup(1, 0, "m", [0.99, 0.05]) == "answer"
+    assert cache.lookup(1, 0, "m", [0.7, 0.7]) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_scope_isolation(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store(1, 0, "m", "q", [1.0, 0.0], "answer", doc_id=5)
+    assert cache.lookup(1, 0, "m", [1.0, 0.0], doc_id=5) == "answer"
+    assert cache.lookup(2, 0, "m", [1.0, 0.0], doc_id=5) is None
+    assert cache.lookup(1, 1, "m", [1.0, 0.0], doc_id=5) is None
+    assert cache.lookup(1, 0, "m", [1.0, 0.0], doc_id=6) is None
+    assert cache.lookup(1, 0, "m", [1.0, 0.0]) is None
+    assert cache.lookup(1, 0, "other", [1.0, 0.0], doc_id=5) is None
+
+
+def test_bump_version_invalidates_owner_only(tmp_path):
+    cache = _cache(tmp_path)
+    cache.store(1, cache.version(1), "m", "q", [1.0, 0.0], "mine")
+    cache.store(2, cache.version(2), "m", "q", [1.0, 0.0], "theirs")
+    cache.bump_version(1)
+    assert cache.version(1) == 1
+    assert cache.lookup(1, 0, "m", [1.0, 0.0]) is None
+    assert cache.lookup(1, 1, "m", [1.0, 0.0]) is None
+    assert cache.lookup(2, 0, "m", [1.0, 0.0]) == "theirs"
+
+
+def test_lru_eviction(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.store(1, 0, "m", "a", [1.0, 0.0, 0.0], "A")
+    cache.store(1, 0, "m", "b", [0.0, 1.0, 0.0], "B")
+    assert cache.lookup(1, 0, "m", [1.0, 0.0, 0.0]) == "A"   # "a" is now the most recent
+    cache.store(1, 0, "m", "c", [0.0, 0.0, 1.0], "C")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(1, 0, "m", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(1, 0, "m", [1.0, 0.0, 0.0]) == "A"
+
+
+def test_cached_query_keeps_version_read_at_ask_time(tmp_path):
+    cache = _cache(tmp_path)
+    query = cache.query(1, "m", "q", [1.0, 0.0])
+    assert query.get() is None
+    cache.bump_version(1)   # upload finished while the answer was generated
+    query.put("stale answer")
+    assert cache.query(1, "m", "q", [1.0, 0.0]).get() is None
+    fresh = cache.query(1, "m", "q", [1.0, 0.0])
+    fresh.put("fresh answer")
+    assert cache.query(1, "m", "q", [1.0, 0.0]).get() == "fresh answer"
@@ -0,0 +1,59 @@
+from langchain_core.documents import Document
+
+from core.bm25 import BM25Index
+from core.retrieval import reciprocal_rank_fusion
+
+
+def _chunk(chunk_id, text, doc_id, **meta):
+    return Document(page_content=text, metadata={"doc_id": doc_id, **meta}, id=chunk_id)
+
+
+def _library():
+    return [
+        _chunk("a1", "invoice X-200 total amount due", 1, page=1),
+        _chunk("a2", "shipping terms for the X-200 order", 1, page=2),
+        _chunk("b1", "employee handbook holiday policy", 2, page=1),
+        _chunk("b2", "handbook section on remote work", 2, page=5),
+        _chunk("c1", "meeting notes quarterly budget review", 3, page=1),
+    ]
+
+
+def test_add_replaces_id_and_remove_document(tmp_path):
+    index = BM25Index(1, root=tmp_path)
+    index.add(_library())
+    index.add([_chunk("a1", "credit note for a refund", 1)])
+    assert index.count() == 5
+    assert [d.id for d, _ in index.search("refund")] == ["a1"]
+    assert index.search("invoice") == []
+
+    index.remove_document(1)
+    assert index.count() == 3
+    assert index.search("shipping") == []
+
+
+def test_doc_id_pushdown_and_metadata_post_filter(tmp_path):
+    index = BM25Index(1, root=tmp_path)
+    index.add(_library())
+    hits = index.search("handbook policy shipping", where={"doc_id": 2})
+    assert {d.id for d, _ in hits} == {"b1", "b2"}
+    hits = index.search("handbook policy", where={"doc_id": {"$in": [2, 3]}, "page": {"$gte": 2}})
+    assert [d.id for d, _ in hits] == ["b2"]
+    hits = index.search("shipping handbook", where={"doc_id": 2}, include_ids=["a2"])
+    assert {d.id for d, _ in hits} == {"a2", "b1", "b2"}
+
+
+def test_terms_in_most_chunks_are_ignored(tmp_path):
+    index = BM25Index(1, root=tmp_path)
+    index.add([_chunk(f"c{i}", f"report page {i}", 1) for i in range(4)])
+    # "report" is in every chunk: near-zero IDF, no hit on it alone
+    assert index.search("report") == []
+    assert [d.id for d, _ in index.search("report 2")] == ["c2"]
+
+
+def test_reciprocal_rank_fusion_orders_and_dedups():
+    a, b, c, d = (Document(page_content=t, id=t) for t in "abcd")
+    fused = reciprocal_rank_fusion([[a, b, c], [b, d, a]], k=3)
+    assert [doc.id for doc in fused] == ["b", "a", "d"]
+    # Without ids, identical texts are the same document
+    same = [Document(page_content="x"), Document(page_content="x")]
+    assert len(reciprocal_rank_fusion([same[:1], same[1:]], k=5)) == 1
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+
+from core.cache import ChunkCache, SQLiteLRUCache
+from core.document import DocumentProcessor
+
+
+def test_running_total_follows_puts_replaces_and_deletes(tmp_path):
+    cache = SQLiteLRUCache(tmp_path / "c.sqlite3", table="blobs", max_bytes=1000)
+    cache.put_blob("a", b"x" * 100)
+    cache.put_blobs({"b": b"x" * 200, "c": b"x" * 50})
+    cache.put_blob("a", b"x" * 10)   # replaced, not added
+    cache.delete("c")
+    assert cache.stats()["bytes"] == 210
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_evicts_least_recently_used_in_batches(tmp_path):
+    cache = SQLiteLRUCache(tmp_path / "c.sqlite3", table="blobs", max_bytes=1000)
+    cache.evict_batch = 3
+    for i in range(10):
+        cache.put_blob(f"k{i}", b"x" * 100)
+        time.sleep(0.002)
+    assert cache.get_blob("k0") is not None   # k0 becomes the most recent
+    cache.put_blob("big", b"x" * 700)
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000 and stats["evictions"] == 7
+    assert {k for k in ["k0", "k8", "k9", "big"] if cache.get_blob(k) is not None} == {"k0", "k8", "k9", "big"}
+    assert cache.get_blob("k1") is None
+
+
+def test_existing_database_gets_its_total_once(tmp_path):
+    path = tmp_path / "c.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE blobs (key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                 " size INTEGER NOT NULL, last_access REAL NOT NULL)")
+    conn.executemany("INSERT INTO blobs VALUES (?, ?, ?, ?)",
+                     [(f"k{i}", b"x" * 100, 100, float(i)) for i in range(4)])
+    conn.commit()
+    conn.close()
+
+    cache = SQLiteLRUCache(path, table="blobs", max_bytes=1000)
+    assert cache.stats()["bytes"] == 400
+    reopened = SQLiteLRUCache(path, table="blobs", max_bytes=1000)
+    reopened.put_blob("k4", b"x" * 100)
+    assert reopened.stats()["bytes"] == 500
+
+
+def test_chunk_cache_key_is_content_plus_splitter_settings(tmp_path):
+    cache = ChunkCache(tmp_path / "chunks.sqlite3")
+    text = "id,note\n" + "".join(f"{i},note number {i}\n" for i in range(60))
+    (tmp_path / "a.csv").write_text(text)
+    (tmp_path / "copy.csv").write_text(text)
+
+    processor = DocumentProcessor(chunk_size=64, cache=cache)
+    first = processor.process_file(tmp_path / "a.csv")
+    # Renamed copy: same content hash, served from the cache under its own path
+    copy = processor.process_file(tmp_path / "copy.csv")
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert [c.page_content for c in copy] == [c.page_content for c in first]
+    assert {c.metadata["source"] for c in copy} == {str(tmp_path / "copy.csv")}
+
+    # Other splitter settings, other content or another page window: new entries
+    DocumentProcessor(chunk_size=32, cache=cache).process_file(tmp_path / "a.csv")
+    (tmp_path / "a.csv").write_text(text + "60,changed\n")
+    processor.process_file(tmp_path / "a.csv")
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert ChunkCache.make_key("d", "s", "pages:0-16") != ChunkCache.make_key("d", "s", "pages:16-32")
@@ -0,0 +1,35 @@
+from langchain_core.documents import Document
+
+from core.chunk_store import ChunkStore
+
+
+def _chunks(prefix, n):
+    return [Document(page_content=f"{prefix} {i}", metadata={"page": i}) for i in range(n)]
+
+
+def test_writer_commits_groups_in_order(tmp_path):
+    store = ChunkStore(tmp_path)
+    w = store.writer(1)
+    w.append(_chunks("second", 2), order=1)
+    w.append(_chunks("first", 2), order=0)
+    assert w.commit() == 4
+    assert [c.page_content for c in store.iter_chunks(1)] == ["first 0", "first 1", "second 0", "second 1"]
+    store.delete(1)
+    assert not store.has(1)
+
+
+def test_concurrent_writers_of_one_document(tmp_path):
+    store = ChunkStore(tmp_path)
+    worker, ui = store.writer(1), store.writer(1)
+    worker.append(_chunks("worker", 3))
+    ui.append(_chunks("ui", 3))
+    # Both commits succeed; the last one wins as a whole
+    assert worker.commit() == 3
+    assert ui.commit() == 3
+    assert [c.page_content for c in store.read(1)] == ["ui 0", "ui 1", "ui 2"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["doc_1.bin", "doc_1.idx"]
+
+    aborted = store.writer(1)
+    aborted.append(_chunks("aborted", 1))
+    aborted.abort()
+    assert [c.page_content for c in store.read(1)][0] == "ui 0"
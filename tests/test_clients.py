@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from core.clients import ClientRegistry
+
+
+class FakeOllama:
+    """Stands in for ollama.Client: records warm-up calls, reports loaded models."""
+
+    def __init__(self, loaded=(), fail=False):
+        self.loaded = loaded
+        self.fail = fail
+        self.calls = []
+
+    def generate(self, model, keep_alive):
+        self.calls.append(("generate", model, keep_alive))
+        if self.fail:
+            raise ConnectionError("connection refused")
+
+    def embed(self, model, input, keep_alive):
+        self.calls.append(("embed", model, keep_alive))
+
+    def ps(self):
+        if self.fail:
+            raise ConnectionError("connection refused")
+        return SimpleNamespace(models=[SimpleNamespace(model=m) for m in self.loaded])
+
+
+def test_chat_clients_are_shared_per_model_and_options():
+    registry = ClientRegistry(keep_alive="5m")
+    llm = registry.chat_model("llama3.2:latest", temperature=0.3, num_ctx=2048)
+    assert registry.chat_model("llama3.2:latest", num_ctx=2048, temperature=0.3) is llm
+    assert registry.chat_model("llama3.2:latest", temperature=0.0, num_ctx=2048) is not llm
+    assert llm.keep_alive == "5m"
+
+
+def test_warm_up_and_health_track_model_status():
+    registry = ClientRegistry(keep_alive="5m")
+    registry._client = FakeOllama(loaded=["llama3.2:latest"])
+    registry.warm_all(["llama3.2", "embed:nomic-embed-text"], background=False)
+    registry.warm_all(["llama3.2"], background=False)   # once per process
+    assert registry._client.calls == [("generate", "llama3.2", "5m"), ("embed", "nomic-embed-text", "5m")]
+
+    health = registry.health()
+    assert health["server"]["ok"] is True
+    assert {m["model"]: m["loaded"] for m in health["models"]} == {"llama3.2": True, "nomic-embed-text": False}
+
+    registry._client = FakeOllama(fail=True)
+    assert registry.warm("llama3.2").last_error == "connection refused"
+    health = registry.health()
+    assert health["server"]["ok"] is False and "connection refused" in health["server"]["error"]
@@ -0,0 +1,71 @@
+from langchain_core.documents import Document
+
+from core.context import pack_context
+from core.tokens import TokenTextSplitter, count_tokens
+
+
+def test_pack_context_removes_chunk_overlap():
+    text = " ".join(f"word{i}." for i in range(400))
+    chunks = TokenTextSplitter(chunk_size=64, chunk_overlap=16).create_documents(
+        [text], metadatas=[{"source": "a.pdf", "page": 1}]
+    )
+    packed = pack_context(chunks, budget=10_000)
+    assert packed.overlap_tokens > 0
+    assert packed.tokens == count_tokens(text)
+
+
+def test_pack_context_respects_budget_in_relevance_order():
+    docs = [Document(page_content=f"passage {i}. " + "filler text. " * 40) for i in range(5)]
+    packed = pack_context(docs, budget=150)
+    assert packed.tokens <= 150
+    assert packed.passages[0].page_content.startswith("passage 0")
+    assert packed.dropped_tokens > 0
+
+
+def _span(text, first, last):
+    start = text.index(f"w{first} ")
+    end = text.index(f"w{last} ") + len(f"w{last}")
+    return Document(page_content=text[start:end], metadata={"source": "b.txt", "start_index": start})
+
+
+def test_pack_context_overlap_independent_of_rank_order():
+    text = " ".join(f"w{i}" for i in range(100)) + " "
+    prev, mid, nxt = _span(text, 0, 14), _span(text, 5, 34), _span(text, 15, 24)
+    packed = pack_context([nxt, prev, mid], budget=10_000)
+    words = packed.text.split()
+    assert len(words) == len(set(words))
+    assert sorted(words) == sorted(f"w{i}" for i in range(35))
+
+
+def test_pack_context_removes_covered_span_inside_chunk():
+    text = " ".join(f"w{i}" for i in range(100)) + " "
+    inner, outer = _span(text, 40, 59), _span(text, 0, 99)
+    packed = pack_context([inner, outer], budget=10_000)
+    kept = packed.passages[1].page_content.split()
+    assert "w39" in kept and "w60" in kept
+    assert not set(kept) & set(inner.page_content.split())
+
+
+def test_pack_context_keeps_csv_row_groups_and_docx_files(tmp_path):
+    from docx import Document as Docx
+
+    from core.document import DocumentProcessor
+
+    processor = DocumentProcessor(chunk_size=64, use_cache=False)
+    (tmp_path / "rows.csv").write_text(
+        "id,name,city\n" + "".join(f"{i},name{i},city{i}\n" for i in range(40))
+    )
+    for name in ("a.docx", "b.docx"):
+        docx = Docx()
+        docx.add_paragraph(f"{name} " + " ".join(f"para{i}" for i in range(20)))
+        docx.save(tmp_path / name)
+
+    # Every row group (and every single-chunk file) has start_index 0
+    csv_chunks = processor.process_file(tmp_path / "rows.csv")
+    docx_chunks = processor.process_file(tmp_path / "a.docx") + processor.process_file(tmp_path / "b.docx")
+    assert len(csv_chunks) >= 3
+    for c in csv_chunks:
+        c.metadata["doc_id"] = 1
+    packed = pack_context(csv_chunks + docx_chunks, budget=10_000)
+    assert len(packed.passages) == len(csv_chunks) + 2
+    assert packed.overlap_tokens == 0
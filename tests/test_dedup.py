@@ -0,0 +1,56 @@
+from langchain_core.documents import Document
+
+from core.dedup import NearDuplicateIndex
+
+BASE = " ".join(f"word{i}" for i in range(100))
+
+
+def _chunk(chunk_id, text, doc_id):
+    return Document(page_content=text, metadata={"doc_id": doc_id}, id=chunk_id)
+
+
+def test_near_duplicates_are_aliased(tmp_path):
+    index = NearDuplicateIndex(1, root=tmp_path)
+    keep, dups = index.filter([
+        _chunk("a1", BASE, 1),
+        _chunk("a2", "an unrelated chunk about quarterly budget reviews and travel", 1),
+    ])
+    assert [c.id for c in keep] == ["a1", "a2"]
+
+    # Last word changed: estimated Jaccard well above the 0.85 threshold
+    keep, dups = index.filter([
+        _chunk("b1", BASE.replace("word99", "other"), 2),
+        _chunk("b2", " ".join(f"term{i}" for i in range(100)), 2),
+    ])
+    assert [c.id for c in keep] == ["b2"]
+    assert [(c.id, canonical) for c, canonical in dups] == [("b1", "a1")]
+    assert index.canonical_ids(2) == ["a1"]
+    assert index.canonical_ids(1) == []
+    assert index.stats() == {"checked": 4, "skipped": 1, "indexed": 3, "aliases": 1}
+
+
+def test_reindexing_a_chunk_does_not_alias_it_to_itself(tmp_path):
+    index = NearDuplicateIndex(1, root=tmp_path)
+    index.filter([_chunk("a1", BASE, 1)])
+    keep, dups = index.filter([_chunk("a1", BASE, 1)])
+    assert [c.id for c in keep] == ["a1"] and dups == []
+
+
+def test_remove_document_promotes_first_alias(tmp_path):
+    index = NearDuplicateIndex(1, root=tmp_path)
+    index.filter([_chunk("a1", BASE, 1)])
+    index.filter([_chunk("b1", BASE, 2)])
+    index.filter([_chunk("c1", BASE, 3)])
+    assert index.canonical_ids(3) == ["a1"]
+
+    promoted = index.remove_document(1)
+    assert [(d.id, d.metadata["doc_id"]) for d in promoted] == [("b1", 2)]
+    # Remaining aliases follow the new canonical, which is indexed for future uploads
+    assert index.canonical_ids(3) == ["b1"]
+    assert index.canonical_ids(2) == []
+    keep, dups = index.filter([_chunk("d1", BASE, 4)])
+    assert keep == [] and dups[0][1] == "b1"
+
+    # Nothing aliased to it: removing the document promotes nothing
+    assert index.remove_document(4) == []
+    assert index.stats()["aliases"] == 1
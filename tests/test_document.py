@@ -0,0 +1,82 @@
+import sys
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from core.document import DocumentProcessor, TieredPDFExtractor
+from core.tokens import count_tokens
+
+
+def _blank_pdf(path, pages):
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_blank_page(width=100 + i, height=100)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def _text_pdf(path, pages):
+    """One line of text per page, in the text layer."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for i in range(pages):
+        page = writer.add_blank_page(width=600, height=200)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+        })
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 20 100 Td (Page {i + 1} talks about topic number {i + 1}.) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def test_pdf_pages_stream_in_windows(tmp_path):
+    _text_pdf(tmp_path / "r.pdf", 7)
+    extractor = TieredPDFExtractor(batch_pages=3)
+    pages = list(extractor.iter_pages(tmp_path / "r.pdf", start=2, end=6))
+    assert [p.metadata["page"] for p in pages] == [3, 4, 5, 6]
+    assert pages[0].page_content == "Page 3 talks about topic number 3."
+    assert extractor.take_stats()["fast_pages"] == 4
+
+    processor = DocumentProcessor(chunk_size=64, use_cache=False)
+    assert processor.count_pdf_pages(tmp_path / "r.pdf") == 7
+    chunks = processor.process_file(tmp_path / "r.pdf", pages=(0, 2))
+    assert {c.metadata["page"] for c in chunks} == {1, 2}
+
+
+def test_write_subset_keeps_only_wanted_pages(tmp_path):
+    _blank_pdf(tmp_path / "a.pdf", 5)
+    subset = TieredPDFExtractor._write_subset(tmp_path / "a.pdf", [1, 3], tmp_path)
+    widths = [float(p.mediabox.width) for p in PdfReader(str(subset)).pages]
+    assert widths == [101.0, 103.0]
+
+
+def test_layout_tier_needs_pypdf(tmp_path, monkeypatch, caplog):
+    _blank_pdf(tmp_path / "a.pdf", 2)
+    monkeypatch.setitem(sys.modules, "pypdf", None)
+    assert TieredPDFExtractor()._layout_pages(tmp_path / "a.pdf", [0, 1]) == {}
+    assert "keeping text layer" in caplog.text
+
+
+def test_csv_row_groups_repeat_header_and_fit_a_chunk(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_text("id,city,comment\n" + "".join(f'{i},City {i},"note, with comma {i}"\n' for i in range(200)))
+    processor = DocumentProcessor(chunk_size=64, use_cache=False)
+    # Small pandas chunks: groups must carry over across reads
+    groups = list(processor.iter_csv(path, read_rows=7))
+
+    assert len(groups) > 1
+    assert groups[0].metadata["row_start"] == 1 and groups[-1].metadata["row_end"] == 200
+    for prev, cur in zip(groups, groups[1:]):
+        assert cur.metadata["row_start"] == prev.metadata["row_end"] + 1
+    for g in groups:
+        assert g.page_content.startswith("id,city,comment\n")
+        assert count_tokens(g.page_content) <= 64
+    assert '"note, with comma 0"' in groups[0].page_content
+    # Each group is already a chunk: splitting keeps them whole
+    assert [c.page_content for c in processor.process_file(path)] == [g.page_content.strip() for g in groups]
@@ -0,0 +1,118 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from core.cache import EmbeddingCache, MemoryLRUCache, QueryEmbeddingCache
+from core.embeddings import CachedEmbeddings, EmbeddingExecutor
+
+
+class CountingEmbeddings(Embeddings):
+    """Vector derived from the text length; records every text it embeds."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _cached(tmp_path, model, inner):
+    return CachedEmbeddings(
+        inner, model, cache=EmbeddingCache(tmp_path / "emb.sqlite3"), query_cache=QueryEmbeddingCache()
+    )
+
+
+def test_only_missing_texts_reach_the_model(tmp_path):
+    inner = CountingEmbeddings()
+    cached = _cached(tmp_path, "m1", inner)
+    assert cached.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert cached.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert inner.calls == [["a", "bb"], ["ccc"]]
+
+    # Survives a restart; another model never reuses these vectors
+    assert _cached(tmp_path, "m1", inner).embed_documents(["a", "ccc"]) == [[1.0, 1.0], [3.0, 1.0]]
+    assert len(inner.calls) == 2
+    _cached(tmp_path, "m2", inner).embed_documents(["a"])
+    assert inner.calls[-1] == ["a"]
+
+
+def test_memory_lru_evicts_and_expires(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("core.cache.time", SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    cache = MemoryLRUCache(max_entries=2, ttl_seconds=10)
+    cache.put("m", "a", 1)
+    cache.put("m", "b", 2)
+    assert cache.get("m", "a") == 1   # "b" becomes the least recently used
+    cache.put("m", "c", 3)
+    assert (cache.get("m", "b"), cache.get("m", "c")) == (None, 3)
+    assert cache.get("other", "a") is None
+
+    now[0] = 11.0
+    assert cache.get("m", "a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expired"]) == (2, 3, 1, 1)
+    assert stats["entries"] == 1
+
+
+def test_repeated_queries_are_embedded_once(tmp_path):
+    inner = CountingEmbeddings()
+    cached = _cached(tmp_path, "m1", inner)
+    for _ in range(3):
+        assert cached.embed_query("what is the budget?") == [19.0, 1.0]
+    assert inner.calls == [["what is the budget?"]]
+    assert cached.query_cache.stats()["hits"] == 2
+
+
+class FlakyEmbeddings(CountingEmbeddings):
+    """Fails the first `failures` calls, tracks how many calls overlap."""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("server busy")
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.02)
+        try:
+            return super().embed_documents(texts)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_executor_batches_in_order_with_bounded_concurrency():
+    inner = FlakyEmbeddings()
+    executor = EmbeddingExecutor(inner, batch_size=3, max_concurrency=2)
+    texts = ["x" * n for n in range(1, 11)]
+    assert executor.embed_documents(texts) == [[float(n), 1.0] for n in range(1, 11)]
+    assert sorted(len(c) for c in inner.calls) == [1, 3, 3, 3]
+    assert inner.peak == 2
+    stats = executor.stats()
+    assert (stats["chunks"], stats["batches"], stats["retries"]) == (10, 4, 0)
+
+
+def test_executor_retries_failed_batches():
+    inner = FlakyEmbeddings(failures=2)
+    executor = EmbeddingExecutor(inner, batch_size=8, max_concurrency=1, max_retries=2, backoff=0.001)
+    assert executor.embed_documents(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+    assert executor.stats()["retries"] == 2
+
+    inner.failures = 3
+    with pytest.raises(ConnectionError):
+        executor.embed_documents(["a"])
+    assert executor.stats()["failures"] == 1
@@ -0,0 +1,86 @@
+import threading
+import zlib
+
+import pytest
+from docx import Document as Docx
+from langchain_core.embeddings import Embeddings
+
+from core import bm25, dedup
+from core.chunk_store import ChunkStore
+from core.document import DocumentProcessor
+from core.ingest import IngestionPipeline, IngestItem
+from core.vector_index import NumpyVectorIndex
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        h = zlib.crc32(text.encode("utf-8"))
+        return [float((h >> (4 * i)) & 15) + 1.0 for i in range(8)]
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    # Dedup and BM25 indexes live under ./data, one process-wide instance per user
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bm25, "_indexes", {})
+    monkeypatch.setattr(dedup, "_indexes", {})
+    for name, rows in (("a.csv", 80), ("b.csv", 30)):
+        (tmp_path / name).write_text(
+            "id,city,comment\n" + "".join(f"{i},{name}-city{i},comment {i} for {name}\n" for i in range(rows))
+        )
+    docx = Docx()
+    for i in range(30):
+        docx.add_paragraph(f"Paragraph {i} of the handbook, section {i % 4}.")
+    docx.save(tmp_path / "c.docx")
+    (tmp_path / "broken.csv").write_text('id,name\n1,"unterminated\n')
+    return tmp_path
+
+
+def _items(root):
+    names = ["a.csv", "b.csv", "c.docx", "broken.csv"]
+    return [IngestItem(path=root / n, doc_id=i + 1, owner_id=1) for i, n in enumerate(names)]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_pipeline_ingests_files_and_isolates_failures(library, max_workers):
+    index = NumpyVectorIndex(HashEmbeddings())
+    store = ChunkStore(library / "chunks")
+    pipeline = IngestionPipeline(
+        index,
+        processor=DocumentProcessor(chunk_size=64, use_cache=False),
+        chunk_store=store,
+        max_workers=max_workers,
+        embed_batch_size=4,
+    )
+    progress = []
+    results = pipeline.run(_items(library), on_progress=lambda r: progress.append(r.item.doc_id))
+
+    assert [r.ok for r in results] == [True, True, True, False]
+    assert results[3].error.startswith("parse:")
+    for res in results[:3]:
+        assert res.chunks > 0 and res.embedded == res.chunks
+        assert store.count(res.item.doc_id) == res.chunks
+        assert len(index.get_ids({"doc_id": res.item.doc_id})) == res.chunks
+    assert not store.has(4)
+    assert set(progress) == {1, 2, 3}
+    # Deterministic ids: chunks read back in file order
+    assert store.read(1)[0].page_content.startswith("id,city,comment\n0,")
+
+
+def test_rerun_upserts_and_cancel_stops_indexing(library):
+    index = NumpyVectorIndex(HashEmbeddings())
+    processor = DocumentProcessor(chunk_size=64, use_cache=False)
+    items = _items(library)[:2]
+    first = IngestionPipeline(index, processor=processor, max_workers=1, deduplicate=False).run(items)
+    IngestionPipeline(index, processor=processor, max_workers=1, deduplicate=False).run(items)
+    assert index.count() == sum(r.chunks for r in first)
+
+    cancel = threading.Event()
+    cancel.set()
+    res = IngestionPipeline(NumpyVectorIndex(HashEmbeddings()), processor=processor, max_workers=1).run(
+        items, cancel=cancel
+    )
+    assert [r.error for r in res] == ["cancelled", "cancelled"]
@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # core.auth opens ./data/users.db on import
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    from core.auth import models
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _statuses(db, owner_id):
+    from core.auth import crud
+    return {job.document_id: job.status for job in crud.list_user_jobs(db, owner_id)}
+
+
+def test_jobs_are_claimed_oldest_first(db):
+    from core.auth import crud
+
+    first = crud.enqueue_ingestion(db, document_id=1, owner_id=7, path="a.pdf")
+    crud.enqueue_ingestion(db, document_id=2, owner_id=7, path="b.pdf")
+    job = crud.claim_next_job(db)
+    assert (job.id, job.status, job.attempts) == (first.id, "running", 1)
+    assert crud.claim_next_job(db).document_id == 2
+    assert crud.claim_next_job(db) is None
+    assert [j.document_id for j in crud.list_user_jobs(db, 7, active_only=True)] == [2, 1]
+
+
+def test_interrupted_jobs_are_requeued_and_retried(db):
+    from core.auth import crud
+
+    crud.enqueue_ingestion(db, document_id=1, owner_id=7, path="a.pdf")
+    crud.enqueue_ingestion(db, document_id=2, owner_id=7, path="b.pdf")
+    done = crud.claim_next_job(db)
+    crud.update_job(db, done.id, status="done")
+    crud.claim_next_job(db)
+
+    # Process restart: only the job left 'running' goes back to the queue
+    assert crud.requeue_interrupted_jobs(db) == 1
+    assert _statuses(db, 7) == {1: "done", 2: "queued"}
+    job = crud.claim_next_job(db)
+    db.refresh(job)
+    assert (job.document_id, job.attempts) == (2, 2)
+
+
+def test_cancelled_jobs_keep_their_status(db):
+    from core.auth import crud
+
+    running = crud.enqueue_ingestion(db, document_id=1, owner_id=7, path="a.pdf")
+    crud.enqueue_ingestion(db, document_id=2, owner_id=7, path="b.pdf")
+    crud.enqueue_ingestion(db, document_id=3, owner_id=8, path="c.pdf")
+    crud.claim_next_job(db)
+
+    assert crud.cancel_jobs(db, document_id=1) == 1
+    # The worker finishing a cancelled job must not overwrite the status
+    assert crud.update_job(db, running.id, expect_status="running", status="done") == 0
+    assert crud.cancel_jobs(db, owner_id=7) == 1
+    assert _statuses(db, 7) == {1: "cancelled", 2: "cancelled"}
+    assert crud.claim_next_job(db).document_id == 3
+    assert crud.requeue_interrupted_jobs(db) == 1
+    assert _statuses(db, 7) == {1: "cancelled", 2: "cancelled"}
+
+
+def test_jobs_interrupted_too_often_are_failed(db):
+    from core.auth import crud
+
+    crud.enqueue_ingestion(db, document_id=1, owner_id=7, path="a.pdf")
+    crud.enqueue_ingestion(db, document_id=2, owner_id=7, path="b.pdf")
+    for _ in range(2):
+        crud.claim_next_job(db)
+        crud.requeue_interrupted_jobs(db)
+    # Third claim of document 1, first of document 2, then another restart
+    crud.claim_next_job(db)
+    crud.claim_next_job(db)
+
+    exhausted = crud.fail_exhausted_jobs(db, max_attempts=3)
+    assert [(j.document_id, j.attempts) for j in exhausted] == [(1, 3)]
+    assert crud.requeue_interrupted_jobs(db) == 1
+    assert _statuses(db, 7) == {1: "failed", 2: "queued"}
+
+
+def test_worker_start_rolls_back_exhausted_jobs(db, monkeypatch):
+    from core import jobs
+    from core.auth import crud
+
+    crud.enqueue_ingestion(db, document_id=1, owner_id=7, path="a.pdf")
+    crud.claim_next_job(db)
+    purged = []
+    monkeypatch.setattr(jobs.database, "SessionLocal", lambda: db)
+    monkeypatch.setattr(jobs, "_purge_index", lambda doc_id, owner_id: purged.append((doc_id, owner_id)))
+    bumped = []
+    monkeypatch.setattr(jobs.get_answer_cache(), "bump_version", bumped.append)
+
+    worker = jobs.IngestionWorker(num_threads=0, max_attempts=1)
+    worker.start()
+    assert purged == [(1, 7)] and bumped == [7]
+    assert _statuses(db, 7) == {1: "failed"}
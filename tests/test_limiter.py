@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.clients import FairLimiter
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_threads_are_served_in_arrival_order():
+    limiter = FairLimiter(slots=1)
+    limiter.acquire()
+    order = []
+
+    def worker(i):
+        with limiter.slot(timeout=5):
+            order.append(i)
+
+    threads = []
+    for i in range(5):
+        threads.append(threading.Thread(target=worker, args=(i,)))
+        threads[-1].start()
+        _wait_until(lambda: limiter.stats()["waiting"] == i + 1)
+    # A newcomer must not jump the queue while waiters exist
+    assert limiter.try_acquire() is None
+    limiter.release()
+    for t in threads:
+        t.join(5)
+    assert order == [0, 1, 2, 3, 4]
+    assert limiter.stats()["active"] == 0
+
+
+def test_acquire_timeout_leaves_the_queue():
+    limiter = FairLimiter(slots=1)
+    limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout=0.05)
+    stats = limiter.stats()
+    assert (stats["waiting"], stats["active"]) == (0, 1)
+    limiter.release()
+    assert limiter.try_acquire() is not None
+
+
+def test_tasks_are_served_in_arrival_order():
+    async def main():
+        limiter = FairLimiter(slots=1)
+        await limiter.aacquire()
+        order = []
+
+        async def worker(i):
+            async with limiter.aslot():
+                order.append(i)
+                await asyncio.sleep(0)
+
+        tasks = []
+        for i in range(5):
+            tasks.append(asyncio.create_task(worker(i)))
+            await asyncio.sleep(0)
+        assert limiter.stats()["waiting"] == 5
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(main())
+    assert order == [0, 1, 2, 3, 4]
+    assert stats["active"] == 0
+
+
+def test_cancelled_waiter_releases_a_granted_slot():
+    async def main():
+        limiter = FairLimiter(slots=1)
+        await limiter.aacquire()
+        first = asyncio.create_task(limiter.aacquire())
+        second = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0)
+        # The slot is handed to `first`, which is cancelled before it resumes
+        limiter.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1)
+        limiter.release()
+        # A cancelled task still queued simply leaves the queue
+        await limiter.aacquire()
+        queued = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["active"], stats["waiting"]) == (0, 0)
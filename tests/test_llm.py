@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+from langchain_core.documents import Document
+
+from core.answer_cache import CachedQuery
+from core.clients import FairLimiter
+from core.llm import LLMManager, TimedStream
+
+
+class FakeChat:
+    """Streams the prompt back as fixed pieces; records the prompts."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.prompts = []
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        for p in self.pieces:
+            yield SimpleNamespace(content=p)
+
+
+class FakeAnswerCache:
+    def __init__(self, answer=None):
+        self.answer = answer
+        self.stored = []
+
+    def lookup(self, owner_id, version, model, vector, doc_id):
+        return self.answer
+
+    def store(self, owner_id, version, model, question, vector, answer, doc_id):
+        self.stored.append(answer)
+
+
+def _query(cache):
+    return CachedQuery(cache, owner_id=1, version=0, model="m", question="q?", vector=[1.0])
+
+
+def test_stream_holds_a_slot_and_records_timings():
+    limiter = FairLimiter(slots=1)
+    done = []
+    stream = TimedStream(iter(["Hel", "", "lo"]), on_complete=done.append, limiter=limiter)
+    it = iter(stream)
+    assert next(it) == "Hel"
+    assert limiter.stats()["active"] == 1 and stream.total_ms is None
+    assert list(it) == ["lo"]
+    assert limiter.stats()["active"] == 0
+    assert (stream.text, done) == ("Hello", ["Hello"])
+    timings = stream.timings()
+    assert timings["queue_ms"] == 0.0 and 0 <= timings["ttft_ms"] <= timings["generation_ms"]
+
+
+def test_async_stream_yields_the_same_pieces():
+    async def pieces():
+        for p in ["a", "b", "c"]:
+            yield p
+
+    async def main():
+        stream = TimedStream(pieces(), limiter=FairLimiter(slots=1))
+        return [p async for p in stream], stream
+
+    out, stream = asyncio.run(main())
+    assert out == ["a", "b", "c"] and stream.text == "abc" and stream.ttft_ms is not None
+
+
+def test_stream_answer_caches_the_full_answer():
+    manager = LLMManager()
+    manager.llm = FakeChat(["The budget ", "is 3 M€."])
+    cache = FakeAnswerCache()
+    stream = manager.stream_answer([Document(page_content="Budget: 3 M€", metadata={})], "budget?", _query(cache))
+    assert cache.stored == []   # nothing generated before the UI iterates
+    assert "".join(stream) == "The budget is 3 M€."
+    assert cache.stored == ["The budget is 3 M€."]
+    assert "Budget: 3 M€" in manager.llm.prompts[0]
+
+    # Cache hit: served as a single piece, the model is not called
+    hit = manager.stream_answer([], "budget?", _query(FakeAnswerCache("cached answer")))
+    assert list(hit) == ["cached answer"] and len(manager.llm.prompts) == 1
@@ -0,0 +1,64 @@
+import threading
+
+from langchain_core.documents import Document
+
+from core.cache import MemoryLRUCache
+from core.retrieval import MultiQueryRetriever
+
+
+class FakeManager:
+    """expand_query stand-in; `delay` simulates a slow model, stopped by `cancel`."""
+
+    model_name = "fake"
+
+    def __init__(self, variants, delay=0.0):
+        self.variants = variants
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = threading.Event()
+
+    def expand_query(self, question, cancel=None):
+        self.calls += 1
+        if self.delay and cancel.wait(self.delay):
+            self.cancelled.set()
+            return [question]
+        return [question] + self.variants
+
+
+def _search(log):
+    corpus = {
+        "budget?": ["b1", "b2"],
+        "annual spending": ["b2", "b3"],
+        "cost plan": ["b3", "b2"],
+    }
+
+    def search(query, k):
+        log.append(query)
+        return [Document(page_content=t, id=t) for t in corpus.get(query, [])][:k]
+    return search
+
+
+def test_variants_are_searched_and_fused():
+    searched = []
+    manager = FakeManager(["annual spending", "cost plan"])
+    retriever = MultiQueryRetriever(_search(searched), manager, cache=MemoryLRUCache())
+    docs = retriever.search("budget?", k=3)
+    assert [d.id for d in docs] == ["b2", "b3", "b1"]
+    assert sorted(searched) == ["annual spending", "budget?", "cost plan"]
+    assert (retriever.last_timings["expansion"], retriever.last_timings["variants"]) == ("llm", 3)
+
+    # Same question again: the expansion comes from the cache
+    retriever.search("budget?", k=3)
+    assert manager.calls == 1 and retriever.last_timings["expansion"] == "cached"
+
+
+def test_slow_expansion_is_dropped_and_cancelled():
+    searched = []
+    manager = FakeManager(["annual spending"], delay=5.0)
+    retriever = MultiQueryRetriever(_search(searched), manager, expansion_timeout=0.05, cache=MemoryLRUCache())
+    docs = retriever.search("budget?", k=2)
+    assert [d.id for d in docs] == ["b1", "b2"]
+    assert searched == ["budget?"] and retriever.last_timings["expansion"] == "timeout"
+    assert manager.cancelled.wait(1)
+    # A dropped expansion is not cached
+    assert retriever.cache.get("fake", "budget?") is None
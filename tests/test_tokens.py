@@ -0,0 +1,36 @@
+from core.tokens import TokenTextSplitter, chunk_budget, count_tokens, usable_context
+
+
+def test_chunk_budget_fits_k_chunks():
+    size = chunk_budget(num_ctx=2048, k=3, prompt_tokens=100, answer_tokens=256)
+    assert 3 * size + 100 + 256 <= 2048
+
+
+def test_token_splitter_respects_budget_and_offsets():
+    text = ("First sentence here. Second one follows.\n\n" * 50) + "tail " * 300
+    splitter = TokenTextSplitter(chunk_size=64, chunk_overlap=8)
+    pieces = splitter.split_with_offsets(text)
+    assert len(pieces) > 1
+    for start, chunk in pieces:
+        assert count_tokens(chunk) <= 64
+        assert text[start:start + len(chunk)] == chunk
+
+
+def test_create_documents_sets_start_index():
+    docs = TokenTextSplitter(chunk_size=16, chunk_overlap=0).create_documents(
+        ["alpha beta gamma. " * 20], metadatas=[{"source": "x"}]
+    )
+    assert docs[0].metadata == {"source": "x", "start_index": 0}
+    assert all(d.metadata["start_index"] >= 0 for d in docs)
+
+
+def test_count_tokens_splits_digit_runs_and_cjk():
+    # Llama 3 BPE: digits in groups of 3, about one token per CJK character
+    assert count_tokens("1234567890") == 4
+    assert count_tokens("東京都の天気") == 6
+    assert count_tokens("Hello, world") == 3
+
+
+def test_chunk_budget_keeps_safety_margin():
+    size = chunk_budget(num_ctx=4096, k=4, prompt_tokens=0, answer_tokens=0)
+    assert 4 * size <= usable_context(4096) < 4096
@@ -0,0 +1,162 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.vector_index import NumpyVectorIndex, quantize_int8
+
+
+class TableEmbeddings(Embeddings):
+    """Texts "t<i>" map to row i of a fixed matrix."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(t[1:])].tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.vectors[int(text[1:])].tolist()
+
+
+def _clustered(n=2000, dim=32, centers=40, seed=0):
+    rng = np.random.RandomState(seed)
+    c = rng.normal(size=(centers, dim))
+    return (c[rng.randint(centers, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _fill(index, n):
+    index.add_texts(
+        [f"t{i}" for i in range(n)],
+        metadatas=[{"doc_id": i % 10, "page": i % 7} for i in range(n)],
+        ids=[f"c{i}" for i in range(n)],
+    )
+
+
+def _top_ids(index, q, k=10, **kwargs):
+    return [d.id for d, _ in index.similarity_search_by_vector_with_score(q, k, **kwargs)]
+
+
+def test_int8_and_ivf_recall_against_exact():
+    vectors = _clustered()
+    queries = np.random.RandomState(1).choice(len(vectors), 20, replace=False)
+    emb = TableEmbeddings(vectors)
+    exact = NumpyVectorIndex(emb)
+    int8 = NumpyVectorIndex(emb, quantization="int8")
+    ivf = NumpyVectorIndex(emb, ann="ivf", nprobe=8, ann_min_rows=500)
+    for index in (exact, int8, ivf):
+        _fill(index, len(vectors))
+
+    def recall(index):
+        hits = sum(
+            len(set(_top_ids(index, vectors[q])) & set(_top_ids(exact, vectors[q]))) for q in queries
+        )
+        return hits / (10 * len(queries))
+
+    assert _top_ids(exact, vectors[5], k=1) == ["c5"]
+    assert recall(int8) >= 0.95
+    assert recall(ivf) >= 0.8
+
+
+def test_int8_codes_are_a_quarter_of_the_matrix_and_persisted(tmp_path):
+    vectors = _clustered(n=300)
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8 and np.abs(codes).max() == 127
+    assert np.abs(codes * scales[:, None] - vectors).max() <= scales.max() / 2 + 1e-6
+
+    emb = TableEmbeddings(vectors)
+    exact = NumpyVectorIndex(emb, persist_dir=tmp_path)
+    _fill(exact, 300)
+    int8 = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    # Codes rebuilt from an index created unquantized, then reused as they are
+    assert int8._path("codes.bin").stat().st_size == 300 * 32
+    assert int8.memory_bytes() == 300 * (32 + 4) < exact.memory_bytes() / 3
+    assert _top_ids(int8, vectors[7], k=3) == _top_ids(exact, vectors[7], k=3)
+    reopened = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    assert np.array_equal(reopened._codes[:300], int8._codes[:300])
+
+
+def test_delete_upsert_compact_and_reopen(tmp_path):
+    vectors = _clustered(n=200)
+    emb = TableEmbeddings(vectors)
+    index = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    _fill(index, 100)
+    index.delete(ids=["c1", "c2"])
+    # Upsert: re-adding an id replaces its text and vector
+    index.add_texts(["t150"], metadatas=[{"doc_id": 99}], ids=["c3"])
+    assert index.count() == 98
+    assert _top_ids(index, vectors[150], k=1) == ["c3"]
+    assert "c1" not in _top_ids(index, vectors[1], k=5)
+
+    reopened = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    assert reopened.count() == 98
+    assert reopened.deleted_count() == index.deleted_count() > 0
+    assert _top_ids(reopened, vectors[150], k=1) == ["c3"]
+
+    reopened.compact()
+    assert reopened.deleted_count() == 0
+    after = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    assert after.count() == 98
+    assert _top_ids(after, vectors[40], k=1) == ["c40"]
+    assert after.get_ids({"doc_id": 99}) == ["c3"]
+
+
+def test_ivf_probing_every_cell_is_exact_and_retrains_on_growth():
+    vectors = _clustered(n=2000)
+    emb = TableEmbeddings(vectors)
+    exact = NumpyVectorIndex(emb)
+    ivf = NumpyVectorIndex(emb, ann="ivf", nlist=16, nprobe=1, ann_min_rows=200, ann_retrain_growth=2.0)
+    _fill(exact, 2000)
+    ivf.add_texts([f"t{i}" for i in range(300)], ids=[f"c{i}" for i in range(300)])
+    assert ivf._ivf.trained_rows == 300
+    ivf.add_texts([f"t{i}" for i in range(300, 2000)], ids=[f"c{i}" for i in range(300, 2000)])
+    assert ivf._ivf.trained_rows == 2000
+
+    for q in (3, 500, 1999):
+        assert _top_ids(ivf, vectors[q], nprobe=16) == _top_ids(exact, vectors[q])
+        # A single cell scans a fraction of the rows but still finds the row itself
+        assert _top_ids(ivf, vectors[q], k=1) == [f"c{q}"]
+        assert len(ivf._ivf.probe(vectors[q] / np.linalg.norm(vectors[q]), 1)) < 2000
+
+
+def test_where_filter_scores_matching_rows_only():
+    vectors = _clustered(n=300)
+    index = NumpyVectorIndex(TableEmbeddings(vectors))
+    _fill(index, 300)
+    where = {"doc_id": {"$in": [2, 3]}, "page": {"$gte": 2, "$lte": 4}}
+    hits = index.similarity_search_by_vector_with_score(vectors[0], 50, filter=where)
+    assert hits
+    for doc, _ in hits:
+        assert doc.metadata["doc_id"] in (2, 3) and 2 <= doc.metadata["page"] <= 4
+    assert sorted(index.get_ids(where)) == sorted(d.id for d, _ in hits)
+    assert _top_ids(index, vectors[0], filter={"doc_id": 3, "page": 0}, ids=["c3", "c63"]) == ["c63"]
+
+
+def test_interrupted_compaction_keeps_the_previous_generation(tmp_path, monkeypatch):
+    vectors = _clustered(n=100)
+    emb = TableEmbeddings(vectors)
+    index = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    _fill(index, 50)
+    index.delete(ids=["c1"])
+    index.compact()
+    assert (tmp_path / "CURRENT").read_text() == "g1"
+    assert NumpyVectorIndex.exists(tmp_path)
+    assert not (tmp_path / "vectors.bin").exists()
+
+    index.delete(ids=["c2", "c3"])
+    index.add_texts(["t60"], metadatas=[{"doc_id": 99}], ids=["c60"])
+
+    def crash(src, dst):
+        raise OSError("killed")
+
+    monkeypatch.setattr("core.vector_index.os.replace", crash)
+    try:
+        index.compact()
+    except OSError:
+        pass
+    monkeypatch.undo()
+
+    reopened = NumpyVectorIndex(emb, persist_dir=tmp_path, quantization="int8")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["CURRENT", "g1"]
+    assert reopened.count() == 48
+    assert _top_ids(reopened, vectors[60], k=1) == ["c60"]
+    assert _top_ids(reopened, vectors[40], k=1) == ["c40"]
+    assert not {"c1", "c2", "c3"} & set(reopened.get_ids())
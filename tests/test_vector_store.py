@@ -0,0 +1,137 @@
+import threading
+import time
+import zlib
+
+import chromadb
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from core.embeddings import VectorStore, _chroma_where
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic 8-d vectors, no embedding server needed."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        h = zlib.crc32(text.encode("utf-8"))
+        return [float((h >> (4 * i)) & 15) + 1.0 for i in range(8)]
+
+
+@pytest.fixture
+def make_store(tmp_path, monkeypatch):
+    # The embedding cache lives under ./data
+    monkeypatch.chdir(tmp_path)
+
+    def make(backend="chroma"):
+        store = VectorStore(collection_name="user-1", persist_dir=str(tmp_path / "vectors"), backend=backend)
+        store.embeddings = HashEmbeddings()
+        return store
+    return make
+
+
+def _chunks(doc_id, n):
+    return [
+        Document(page_content=f"doc {doc_id} chunk {i}", metadata={"doc_id": doc_id}, id=f"doc{doc_id}:0:{i}")
+        for i in range(n)
+    ]
+
+
+def _collections(store):
+    return sorted(c.name for c in chromadb.PersistentClient(path=store.persist_dir).list_collections())
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_restarted_store_appends_to_the_persisted_collection(make_store, backend):
+    assert make_store(backend).load() is None
+    make_store(backend).add_documents(_chunks(1, 3))
+
+    # New process: appending must extend the collection, not start a new one
+    store = make_store(backend)
+    store.add_documents(_chunks(2, 2))
+    assert store.stats()["per_doc"] == {1: 3, 2: 2}
+    reopened = make_store(backend)
+    assert reopened.load() is not None and not reopened.is_empty()
+    hits = reopened.similarity_search("doc 1 chunk 2", k=1)
+    assert hits[0].page_content == "doc 1 chunk 2"
+
+
+def test_compaction_switches_generation_and_reloads(make_store):
+    store = make_store()
+    store.add_documents(_chunks(1, 5) + _chunks(2, 3))
+    assert store.delete_document(1) == 5
+    store.compact()
+    assert _collections(store) == ["user-1.g1"]
+    store.add_documents(_chunks(3, 2))
+
+    reopened = make_store()
+    assert reopened.load() is not None
+    stats = reopened.stats()
+    assert stats["per_doc"] == {2: 3, 3: 2}
+    assert (stats["count"], stats["dimensions"]) == (5, 8) and stats["bytes"] > 0
+    hits = reopened.similarity_search("doc 2 chunk 1", k=1, where={"doc_id": 2})
+    assert hits[0].page_content == "doc 2 chunk 1"
+
+
+def test_interrupted_copy_is_not_reopened(make_store):
+    store = make_store()
+    store.add_documents(_chunks(1, 4))
+    store.compact()
+    # A crash during the next compaction leaves a partial copy behind
+    client = store.vector_db._client
+    client.create_collection("user-1.g2.partial").add(
+        ids=["doc1:0:0"], embeddings=[HashEmbeddings().embed_query("x")], metadatas=[{"doc_id": 1}]
+    )
+
+    reopened = make_store()
+    reopened.load()
+    assert reopened.vector_db._collection.name == "user-1.g1"
+    assert reopened.stats()["count"] == 4
+    reopened.compact()
+    assert _collections(reopened) == ["user-1.g2"]
+    assert reopened.stats()["count"] == 4
+
+
+def test_delete_waits_for_compaction(make_store):
+    store = make_store()
+    store.add_documents(_chunks(1, 2) + _chunks(2, 2))
+    with store._writes:
+        store._compacting = True
+    deleted = []
+    t = threading.Thread(target=lambda: deleted.append(store.delete_document(1)))
+    t.start()
+    time.sleep(0.2)
+    assert deleted == []
+    with store._writes:
+        store._compacting = False
+        store._writes.notify_all()
+    t.join(5)
+    assert deleted == [2]
+
+
+def test_where_translates_to_chroma_clauses():
+    assert _chroma_where({"doc_id": 3}) == {"doc_id": {"$eq": 3}}
+    assert _chroma_where({"doc_id": {"$in": [1, 2]}, "page": {"$gte": 2, "$lte": 4}}) == {"$and": [
+        {"doc_id": {"$in": [1, 2]}}, {"page": {"$gte": 2}}, {"page": {"$lte": 4}},
+    ]}
+
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_filters_are_pushed_down_to_the_store(make_store, backend):
+    store = make_store(backend)
+    store.add_documents([
+        Document(page_content=f"doc {d} page {p}", metadata={"doc_id": d, "page": p, "file_type": "pdf"},
+                 id=f"doc{d}:{p}:0")
+        for d in (1, 2) for p in range(1, 6)
+    ])
+    hits = store.similarity_search("doc 2 page 3", k=10, where={"doc_id": 1, "page": {"$gte": 2, "$lte": 3}})
+    assert sorted(h.page_content for h in hits) == ["doc 1 page 2", "doc 1 page 3"]
+    assert store.similarity_search("doc 1 page 1", k=10, where={"doc_id": 3}) == []
+
+    # A document whose chunks were aliased to canonicals of another document
+    hits = store.similarity_search("doc 2 page 4", k=10, where={"doc_id": 3, "page": {"$lte": 4}},
+                                   include_ids=["doc2:4:0", "doc2:5:0"])
+    assert [h.page_content for h in hits] == ["doc 2 page 4"]